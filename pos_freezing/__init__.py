@@ -0,0 +1,9 @@
+"""
+Reusable building blocks for the partial-freezing PoS tagging study.
+
+The notebooks under ``notebooks/`` remain the reference experiments. This
+package factors their data loading, layer freezing and evaluation code out
+so that it can be imported, benchmarked and reused outside of Colab.
+"""
+
+__version__ = "0.1.0"
@@ -0,0 +1,250 @@
+"""
+Vectorized mapping between subwords and words.
+
+``tokenize_and_align`` walks ``word_ids()`` token by token in Python. Here
+the word ids of a whole padded batch are turned into one ``(batch, seq)``
+integer array (-1 for special tokens and padding) and everything else, i.e.
+first-subword masks, label alignment and pooling subword logits back to
+words, is done with array operations over that matrix.
+
+Sentences longer than ``max_length`` subwords can be split into
+overlapping windows (``stride`` subwords of overlap, the tokenizer's
+``return_overflowing_tokens``) instead of being truncated. Every word is
+then owned by exactly one window, the one in which its first subword has
+the most context on both sides; labels are aligned and predictions read
+only in the owning window, so windows batch like ordinary sentences and
+merge back without double counting.
+"""
+
+import numpy as np
+
+POOLING = ("first", "mean", "max")
+
+
+def batch_word_ids(encoded):
+    """
+    Word index of every position of a padded fast-tokenizer batch.
+
+    ``None`` entries become NaN under a float conversion, which numpy does in
+    C, so no per-token Python branch is needed.
+
+    Returns:
+        An int64 array of shape ``(batch, seq)`` with -1 for special tokens
+        and padding.
+    """
+    word_ids = np.array([encoding.word_ids for encoding in encoded.encodings], dtype=np.float64)
+    return np.nan_to_num(word_ids, nan=-1).astype(np.int64)
+
+
+def first_subword_mask(word_ids):
+    """
+    True at the first subword of every word.
+    """
+    previous = np.full_like(word_ids, -1)
+    previous[:, 1:] = word_ids[:, :-1]
+    return (word_ids >= 0) & (word_ids != previous)
+
+
+def word_label_matrix(labels, tag2id):
+    """
+    Pad per-sentence tag lists into a ``(batch, max_words)`` id matrix
+    (-100 for padding).
+    """
+    lengths = np.fromiter((len(tags) for tags in labels), dtype=np.int64, count=len(labels))
+    flat = np.fromiter((tag2id[tag] for tags in labels for tag in tags), dtype=np.int64, count=int(lengths.sum()))
+    matrix = np.full((len(labels), max(int(lengths.max(initial=0)), 1)), -100, dtype=np.int64)
+    matrix[np.arange(matrix.shape[1]) < lengths[:, None]] = flat
+    return matrix
+
+
+def align_labels(word_ids, word_labels, label_all_tokens=False):
+    """
+    Subword labels from word labels, the batched equivalent of the loop in
+    ``tokenize_and_align``.
+
+    Args:
+        word_ids: ``(batch, seq)`` matrix from ``batch_word_ids``.
+        word_labels: ``(batch, max_words)`` matrix from ``word_label_matrix``.
+        label_all_tokens: Label continuation subwords too.
+    """
+    rows = np.arange(word_ids.shape[0])[:, None]
+    gathered = word_labels[rows, np.clip(word_ids, 0, None)]
+    keep = word_ids >= 0 if label_all_tokens else first_subword_mask(word_ids)
+    return np.where(keep, gathered, -100)
+
+
+def window_starts(n_pieces, width, stride):
+    """
+    Start offsets (in content subwords) of the windows covering a sentence
+    of ``n_pieces`` subwords, as the tokenizer's overflow produces them.
+    """
+    starts = [0]
+    while starts[-1] + width < n_pieces:
+        starts.append(starts[-1] + width - stride)
+    return starts
+
+
+def overflow_starts(sample_mapping, width, stride):
+    """
+    Start offsets of the windows of a tokenizer overflow batch, from its
+    ``overflow_to_sample_mapping``.
+    """
+    sample_mapping = np.asarray(sample_mapping)
+    first = np.concatenate([[True], sample_mapping[1:] != sample_mapping[:-1]])
+    group_start = np.maximum.accumulate(np.where(first, np.arange(len(sample_mapping)), 0))
+    return (np.arange(len(sample_mapping)) - group_start) * (width - stride)
+
+
+def window_owner_word_ids(word_ids, sample_mapping, starts):
+    """
+    Word ids restricted to the owning window of each word.
+
+    Args:
+        word_ids: ``(windows, seq)`` matrix from ``batch_word_ids``.
+        sample_mapping: Sentence index of every window.
+        starts: Content offset of every window within its sentence.
+
+    Returns:
+        A copy of ``word_ids`` with -1 wherever the word belongs to another
+        window. A word is owned by the window holding its true first
+        subword (not a continuation cut at the window edge) with the most
+        context on its shorter side.
+    """
+    sample_mapping = np.asarray(sample_mapping)
+    window, position = np.nonzero(first_subword_mask(word_ids))
+    sample = sample_mapping[window]
+    word = word_ids[window, position]
+    n_content = (word_ids >= 0).sum(axis=1)
+    context = np.minimum(position - 1, n_content[window] - position)
+    offset = np.asarray(starts)[window] + position - 1
+
+    # per (sentence, word): smallest global offset (the true first subword), then most context
+    order = np.lexsort((-context, offset, word, sample))
+    sample, word, window = sample[order], word[order], window[order]
+    owner = np.ones(len(order), dtype=bool)
+    owner[1:] = (sample[1:] != sample[:-1]) | (word[1:] != word[:-1])
+
+    owns = np.zeros((word_ids.shape[0], max(int(word_ids.max(initial=-1)) + 1, 1)), dtype=bool)
+    owns[window[owner], word[owner]] = True
+    rows = np.arange(word_ids.shape[0])[:, None]
+    keep = (word_ids >= 0) & owns[rows, np.clip(word_ids, 0, None)]
+    return np.where(keep, word_ids, -1)
+
+
+def tokenize_and_align_batch(batch, tokenizer, tag2id, label_all_tokens=False, max_length=128, stride=None):
+    """
+    Batched ``tokenize_and_align`` for ``Dataset.map(batched=True)``.
+
+    The batch is tokenized with padding so alignment is one array operation,
+    then padding is stripped again so the stored rows match the per-example
+    version exactly (the collator pads per training batch).
+
+    With ``stride``, sentences longer than ``max_length`` become several
+    overlapping windows (so the output can have more rows than the input)
+    and each word is labelled in its owning window only.
+    """
+    windowed = stride is not None
+    encoded = tokenizer(batch["tokens"],
+                        is_split_into_words=True,
+                        truncation=True,
+                        max_length=max_length,
+                        padding=True,
+                        **(dict(stride=stride, return_overflowing_tokens=True) if windowed else {}))
+    word_ids = batch_word_ids(encoded)
+    word_labels = word_label_matrix(batch["upos"], tag2id)
+    if windowed:
+        sample_mapping = np.asarray(encoded.pop("overflow_to_sample_mapping"))
+        width = max_length - tokenizer.num_special_tokens_to_add()
+        word_ids = window_owner_word_ids(word_ids, sample_mapping, overflow_starts(sample_mapping, width, stride))
+        word_labels = word_labels[sample_mapping]
+    labels = align_labels(word_ids, word_labels, label_all_tokens)
+
+    lengths = [sum(mask) for mask in encoded["attention_mask"]]
+    out = {key: [row[:n] for row, n in zip(values, lengths)] for key, values in encoded.items()}
+    out["labels"] = [row[:n].tolist() for row, n in zip(labels, lengths)]
+    return out
+
+
+def aggregate_subwords(logits, word_ids, pooling="first"):
+    """
+    Pool subword logits into word logits.
+
+    Args:
+        logits: ``(batch, seq, num_labels)`` tensor.
+        word_ids: ``(batch, seq)`` matrix from ``batch_word_ids``.
+        pooling: "first" (the first subword, as training labels are aligned),
+            "mean" or "max" over all subwords of the word.
+
+    Returns:
+        (word_logits, word_mask): a ``(batch, max_words, num_labels)`` tensor
+        and a boolean ``(batch, max_words)`` tensor that is False for words
+        with no subword (padding or truncated away).
+    """
+    import torch
+
+    if pooling not in POOLING:
+        raise ValueError(f"Unknown pooling: {pooling}")
+
+    batch, _, num_labels = logits.shape
+    ids = torch.as_tensor(word_ids, device=logits.device)
+    n_words = max(int(ids.max()) + 1, 1) if ids.numel() else 1
+    valid = ids >= 0
+    if pooling == "first":
+        valid = torch.as_tensor(first_subword_mask(np.asarray(word_ids)), device=logits.device)
+
+    rows = torch.arange(batch, device=logits.device)[:, None].expand_as(ids)
+    flat_index = (rows * n_words + ids.clamp(min=0))[valid]
+    values = logits[valid]
+
+    word_logits = torch.zeros(batch * n_words, num_labels, dtype=logits.dtype, device=logits.device)
+    if pooling == "first":
+        # exactly one position per word, so a scatter is enough
+        word_logits[flat_index] = values
+    else:
+        reduce = "mean" if pooling == "mean" else "amax"
+        index = flat_index[:, None].expand(-1, num_labels)
+        word_logits.scatter_reduce_(0, index, values, reduce, include_self=False)
+    word_mask = torch.zeros(batch * n_words, dtype=torch.bool, device=logits.device)
+    word_mask[flat_index] = True
+    return word_logits.view(batch, n_words, num_labels), word_mask.view(batch, n_words)
+
+
+def merge_windows(word_logits, word_mask, sample_mapping, n_sentences):
+    """
+    Combine per-window word logits (from ``aggregate_subwords`` over
+    ``window_owner_word_ids``) into per-sentence word logits. Each word is
+    present in exactly one window, so the merge is a sum.
+    """
+    import torch
+
+    index = torch.as_tensor(np.asarray(sample_mapping), device=word_logits.device)
+    merged = torch.zeros((n_sentences,) + tuple(word_logits.shape[1:]), dtype=word_logits.dtype,
+                         device=word_logits.device)
+    merged.index_add_(0, index, word_logits)
+    present = torch.zeros((n_sentences, word_mask.shape[1]), dtype=torch.long, device=word_mask.device)
+    present.index_add_(0, index, word_mask.long())
+    return merged, present > 0
+
+
+def decode_words(logits, word_ids, id2tag, n_words, pooling="first", sample_mapping=None, starts=None):
+    """
+    Per-word tags from subword logits; words with no subword get ``None``.
+
+    Args:
+        n_words: Number of words of each sentence, to size the output lists.
+        sample_mapping, starts: For a batch of overflow windows, the
+            sentence and content offset of each window; predictions are
+            then read from each word's owning window.
+    """
+    if sample_mapping is None:
+        word_logits, word_mask = aggregate_subwords(logits, word_ids, pooling)
+    else:
+        owned = window_owner_word_ids(word_ids, sample_mapping, starts)
+        word_logits, word_mask = merge_windows(*aggregate_subwords(logits, owned, pooling),
+                                               sample_mapping, len(n_words))
+    preds = word_logits.argmax(dim=-1).tolist()
+    present = word_mask.tolist()
+    return [
+        [id2tag[preds[i][w]] if w < len(present[i]) and present[i][w] else None for w in range(n)]
+        for i, n in enumerate(n_words)
+    ]
@@ -0,0 +1,470 @@
+"""
+Repeatable benchmarks for the training and inference hot paths.
+
+Everything runs offline on CPU: the corpus is generated by
+``pos_freezing.synthetic`` with a fixed seed and the model is a small local
+DistilBERT config with the real 6-layer depth. Results are written as JSON
+so that two runs (e.g. before and after a change) can be compared:
+
+    python -m pos_freezing.bench --output bench-main.json
+    python -m pos_freezing.bench --output bench-new.json --compare bench-main.json
+
+``--compare`` exits with status 1 if any benchmark's median time regressed
+by more than ``--threshold``.
+"""
+
+import argparse
+import json
+import os
+import platform
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+import numpy as np
+
+from .alignment import tokenize_and_align_batch
+from .checkpointing import apply_checkpointing, saved_activation_bytes
+from .data import build_tag_maps, load_conllu_sentences, tokenize_and_align, tokenize_split
+from .freezing import STRATEGIES, count_parameters, freeze_layers
+from .metrics import compute_metrics
+from .packed import PackedDataset, pack_conllu
+from .synthetic import (
+    build_local_tokenizer,
+    build_small_model,
+    make_synthetic_sentences,
+    seed_everything,
+    write_conllu,
+)
+
+BENCHMARKS = {}
+
+
+def benchmark(name):
+    """
+    Register ``fn(ctx)`` under ``name``. The function returns a list of
+    (name, result) pairs so one benchmark can report several cases.
+    """
+    def decorator(fn):
+        BENCHMARKS[name] = fn
+        return fn
+    return decorator
+
+
+def measure(fn, items, unit, repeats=5, warmup=1, setup=None):
+    """
+    Time ``fn()`` ``repeats`` times after ``warmup`` untimed calls.
+
+    Args:
+        fn: Zero-argument callable doing one unit of work, or, with
+            ``setup``, a callable taking what ``setup()`` returned.
+        items: How many ``unit`` one call processes, for the throughput.
+        unit: Label of the throughput unit, e.g. "tokens".
+        setup: Untimed zero-argument callable run before every call, for
+            per-call state such as a fresh model.
+    """
+    times = []
+    for i in range(warmup + repeats):
+        args = (setup(),) if setup else ()
+        start = time.perf_counter()
+        fn(*args)
+        if i >= warmup:
+            times.append(time.perf_counter() - start)
+    median = statistics.median(times)
+    return {
+        "median_s": median,
+        "min_s": min(times),
+        "mean_s": statistics.fmean(times),
+        "repeats": repeats,
+        "items": items,
+        "unit": unit,
+        "throughput": items / median if median > 0 else None,
+    }
+
+
+class BenchContext:
+    """
+    Shared fixtures built once per run: corpus, CoNLL-U file, tokenizer,
+    tokenized splits and padded batches.
+    """
+
+    def __init__(self, workdir, n_train=512, n_eval=128, batch_size=16, repeats=5, seed=42):
+        from transformers import DataCollatorForTokenClassification
+
+        seed_everything(seed)
+        self.workdir = workdir
+        self.repeats = repeats
+        self.seed = seed
+        self.batch_size = batch_size
+
+        self.train_sentences = make_synthetic_sentences(n_train, seed=seed)
+        self.eval_sentences = make_synthetic_sentences(n_eval, seed=seed + 1)
+        self.conllu_path = os.path.join(workdir, "synthetic-ud-train.conllu")
+        write_conllu(self.train_sentences, self.conllu_path)
+
+        self.tokenizer = build_local_tokenizer(self.train_sentences, os.path.join(workdir, "tokenizer"))
+        self.tag2id, self.id2tag = build_tag_maps(self.train_sentences + self.eval_sentences)
+        self.train_tok = tokenize_split(self.train_sentences, self.tokenizer, self.tag2id)
+        self.eval_tok = tokenize_split(self.eval_sentences, self.tokenizer, self.tag2id)
+
+        self.data_collator = DataCollatorForTokenClassification(self.tokenizer, return_tensors="pt")
+        self.train_features = [dict(row) for row in self.train_tok]
+        self.eval_features = [dict(row) for row in self.eval_tok]
+        self.train_batches = self.batches(self.train_features)
+        self.eval_batches = self.batches(self.eval_features)
+
+    def batches(self, features):
+        return [
+            self.data_collator(features[i:i + self.batch_size])
+            for i in range(0, len(features), self.batch_size)
+        ]
+
+    def model(self):
+        return build_small_model(self.tag2id, len(self.tokenizer), seed=self.seed)
+
+
+def count_tokens(batches):
+    return int(sum(batch["attention_mask"].sum().item() for batch in batches))
+
+
+@benchmark("parse_conllu")
+def bench_parse_conllu(ctx):
+    result = measure(lambda: load_conllu_sentences(ctx.conllu_path),
+                     len(ctx.train_sentences), "sentences", ctx.repeats)
+    return [("parse_conllu", result)]
+
+
+@benchmark("tokenize_and_align")
+def bench_tokenize_and_align(ctx):
+    def run():
+        for example in ctx.train_sentences:
+            tokenize_and_align(example, ctx.tokenizer, ctx.tag2id)
+
+    result = measure(run, len(ctx.train_sentences), "sentences", ctx.repeats)
+    return [("tokenize_and_align", result)]
+
+
+@benchmark("tokenize_and_align_batch")
+def bench_tokenize_and_align_batch(ctx):
+    batch = {
+        "tokens": [tokens for tokens, _ in ctx.train_sentences],
+        "upos": [upos for _, upos in ctx.train_sentences],
+    }
+
+    def run():
+        for start in range(0, len(ctx.train_sentences), 1000):
+            tokenize_and_align_batch({k: v[start:start + 1000] for k, v in batch.items()},
+                                     ctx.tokenizer, ctx.tag2id)
+
+    result = measure(run, len(ctx.train_sentences), "sentences", ctx.repeats)
+    return [("tokenize_and_align_batch", result)]
+
+
+@benchmark("collate")
+def bench_collate(ctx):
+    result = measure(lambda: ctx.batches(ctx.train_features),
+                     len(ctx.train_features), "sentences", ctx.repeats)
+    return [("collate", result)]
+
+
+@benchmark("dataset_startup")
+def bench_dataset_startup(ctx):
+    """
+    Time from a training file on disk to the first padded batch: parsing
+    and tokenizing the CoNLL-U file vs opening its packed arrays.
+    """
+    packed_dir = os.path.join(ctx.workdir, "packed-train")
+    packed = pack_conllu(ctx.conllu_path, ctx.tokenizer, ctx.tag2id, packed_dir)
+    indices = list(range(ctx.batch_size))
+
+    def from_conllu():
+        dataset = tokenize_split(load_conllu_sentences(ctx.conllu_path), ctx.tokenizer, ctx.tag2id)
+        ctx.data_collator([dict(dataset[i]) for i in indices])
+
+    def from_packed():
+        PackedDataset(packed_dir).collate(indices, ctx.tokenizer.pad_token_id)
+
+    return [
+        ("dataset_startup/conllu", measure(from_conllu, 1, "startups", ctx.repeats)),
+        ("dataset_startup/packed", measure(from_packed, 1, "startups", ctx.repeats)),
+        ("collate/packed", measure(
+            lambda: [packed.collate(range(i, min(i + ctx.batch_size, len(packed))), ctx.tokenizer.pad_token_id)
+                     for i in range(0, len(packed), ctx.batch_size)],
+            len(ctx.train_features), "sentences", ctx.repeats)),
+    ]
+
+
+@benchmark("train_step")
+def bench_train_step(ctx):
+    """
+    One pass of forward, backward and AdamW step over the training batches,
+    once per freezing strategy.
+    """
+    import torch
+
+    results = []
+    n_tokens = count_tokens(ctx.train_batches)
+    for name, strat, k in STRATEGIES:
+        model = ctx.model()
+        freeze_layers(model, strat, k)
+        model.train()
+        optimizer = torch.optim.AdamW(
+            [p for p in model.parameters() if p.requires_grad], lr=5e-5, weight_decay=0.01
+        )
+
+        def run():
+            for batch in ctx.train_batches:
+                loss = model(**batch).loss
+                loss.backward()
+                optimizer.step()
+                optimizer.zero_grad(set_to_none=True)
+
+        result = measure(run, n_tokens, "tokens", ctx.repeats)
+        result["trainable_params"] = count_parameters(model)[1]
+        results.append((f"train_step/{strat or 'none'}" + (f"_{k}" if k else ""), result))
+    return results
+
+
+@benchmark("lean_train")
+def bench_lean_train(ctx):
+    """
+    One training epoch with ``transformers.Trainer`` and with
+    ``lean.LeanTrainer``, once per freezing strategy, in optimizer steps/s.
+    """
+    from transformers import Trainer, TrainingArguments
+
+    from .lean import LeanTrainer
+
+    args = TrainingArguments(
+        output_dir=os.path.join(ctx.workdir, "lean_train"), per_device_train_batch_size=ctx.batch_size,
+        num_train_epochs=1, save_strategy="no", logging_steps=50, report_to="none", disable_tqdm=True,
+        use_cpu=True, seed=ctx.seed,
+    )
+    n_steps = -(-len(ctx.train_tok) // ctx.batch_size)
+    engines = {
+        "trainer": lambda model: Trainer(model=model, args=args, train_dataset=ctx.train_tok,
+                                         processing_class=ctx.tokenizer, data_collator=ctx.data_collator),
+        "lean": lambda model: LeanTrainer(model, args, ctx.train_tok, processing_class=ctx.tokenizer),
+    }
+    results = []
+    for name, strat, k in STRATEGIES:
+        for engine, make_trainer in engines.items():
+            def setup():
+                model = ctx.model()
+                freeze_layers(model, strat, k)
+                return make_trainer(model)
+
+            result = measure(lambda trainer: trainer.train(), n_steps, "steps", ctx.repeats, setup=setup)
+            results.append((f"lean_train/{engine}/{strat or 'none'}" + (f"_{k}" if k else ""), result))
+    return results
+
+
+@benchmark("checkpointing")
+def bench_checkpointing(ctx, batch_size=64, policies=(None, "trainable", "all")):
+    """
+    Training throughput and saved-activation memory at a large batch size,
+    per freezing strategy and freeze-aware checkpointing policy.
+    """
+    import torch
+
+    batches = [
+        ctx.data_collator(ctx.train_features[i:i + batch_size])
+        for i in range(0, min(len(ctx.train_features), 2 * batch_size), batch_size)
+    ]
+    n_tokens = count_tokens(batches)
+    results = []
+    for name, strat, k in STRATEGIES:
+        for policy in policies:
+            model = ctx.model()
+            freeze_layers(model, strat, k)
+            if policy:
+                apply_checkpointing(model, policy)
+            model.train()
+            activation_mb = saved_activation_bytes(model, batches[0]) / 2**20
+            optimizer = torch.optim.AdamW(
+                [p for p in model.parameters() if p.requires_grad], lr=5e-5, weight_decay=0.01
+            )
+
+            def run():
+                for batch in batches:
+                    model(**batch).loss.backward()
+                    optimizer.step()
+                    optimizer.zero_grad(set_to_none=True)
+
+            result = measure(run, n_tokens, "tokens", ctx.repeats)
+            result["batch_size"] = batch_size
+            result["activation_mb"] = round(activation_mb, 2)
+            case = f"checkpointing/{strat or 'none'}" + (f"_{k}" if k else "") + f"/{policy or 'off'}"
+            results.append((case, result))
+    return results
+
+
+@benchmark("eval")
+def bench_eval(ctx):
+    """
+    ``Trainer.evaluate`` with the shared ``compute_metrics``, as run after
+    every epoch in the notebooks.
+    """
+    from transformers import Trainer, TrainingArguments
+
+    training_args = TrainingArguments(
+        output_dir=os.path.join(ctx.workdir, "eval"),
+        per_device_eval_batch_size=ctx.batch_size,
+        report_to="none",
+        use_cpu=True,
+        disable_tqdm=True,
+        seed=ctx.seed,
+    )
+    trainer = Trainer(
+        model=ctx.model(),
+        args=training_args,
+        eval_dataset=ctx.eval_tok,
+        processing_class=ctx.tokenizer,
+        data_collator=ctx.data_collator,
+        compute_metrics=compute_metrics,
+    )
+    result = measure(trainer.evaluate, len(ctx.eval_features), "sentences", ctx.repeats)
+    return [("eval", result)]
+
+
+@benchmark("inference")
+def bench_inference(ctx):
+    import torch
+
+    model = ctx.model()
+    model.eval()
+    inputs = [
+        {"input_ids": b["input_ids"], "attention_mask": b["attention_mask"]} for b in ctx.eval_batches
+    ]
+
+    def run():
+        with torch.inference_mode():
+            for batch in inputs:
+                model(**batch).logits.argmax(dim=-1)
+
+    result = measure(run, count_tokens(ctx.eval_batches), "tokens", ctx.repeats)
+    return [("inference", result)]
+
+
+def git_revision():
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "HEAD"], capture_output=True, text=True, check=True,
+            cwd=os.path.dirname(os.path.abspath(__file__)),
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def run_benchmarks(names=None, n_train=512, n_eval=128, batch_size=16, repeats=5, seed=42, threads=1):
+    """
+    Run the selected benchmarks (all by default) and return the JSON payload.
+    """
+    import datasets
+    import torch
+    import transformers
+
+    datasets.disable_progress_bars()
+    if threads:
+        torch.set_num_threads(threads)
+    names = names or list(BENCHMARKS)
+    unknown = [n for n in names if n not in BENCHMARKS]
+    if unknown:
+        raise ValueError(f"Unknown benchmark(s): {', '.join(unknown)}")
+
+    with tempfile.TemporaryDirectory() as workdir:
+        ctx = BenchContext(workdir, n_train, n_eval, batch_size, repeats, seed)
+        results = {}
+        for name in names:
+            seed_everything(seed)
+            for case, result in BENCHMARKS[name](ctx):
+                results[case] = result
+
+    return {
+        "meta": {
+            "git_revision": git_revision(),
+            "python": platform.python_version(),
+            "torch": torch.__version__,
+            "transformers": transformers.__version__,
+            "numpy": np.__version__,
+            "machine": platform.machine(),
+            "threads": torch.get_num_threads(),
+            "seed": seed,
+            "n_train": n_train,
+            "n_eval": n_eval,
+            "batch_size": batch_size,
+            "repeats": repeats,
+        },
+        "results": results,
+    }
+
+
+def compare(baseline, current, threshold=0.10):
+    """
+    Compare two payloads by median time.
+
+    Returns:
+        A list of (case, baseline_s, current_s, relative_change) for every
+        case present in both, and the subset that regressed by more than
+        ``threshold``.
+    """
+    rows = []
+    for case, result in current["results"].items():
+        if case not in baseline["results"]:
+            continue
+        old = baseline["results"][case]["median_s"]
+        new = result["median_s"]
+        rows.append((case, old, new, (new - old) / old if old else 0.0))
+    regressions = [row for row in rows if row[3] > threshold]
+    return rows, regressions
+
+
+def format_results(payload):
+    lines = [f"{'benchmark':<40} {'median (s)':>11} {'throughput':>22}"]
+    for case, r in payload["results"].items():
+        throughput = f"{r['throughput']:.1f} {r['unit']}/s" if r["throughput"] else "-"
+        lines.append(f"{case:<40} {r['median_s']:>11.4f} {throughput:>22}")
+    return "\n".join(lines)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--output", help="write the JSON results to this path")
+    parser.add_argument("--compare", help="baseline JSON to compare against")
+    parser.add_argument("--threshold", type=float, default=0.10,
+                        help="relative slowdown that counts as a regression (default: 0.10)")
+    parser.add_argument("--only", nargs="+", choices=sorted(BENCHMARKS), help="run a subset")
+    parser.add_argument("--n-train", type=int, default=512)
+    parser.add_argument("--n-eval", type=int, default=128)
+    parser.add_argument("--batch-size", type=int, default=16)
+    parser.add_argument("--repeats", type=int, default=5)
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--threads", type=int, default=1,
+                        help="torch intra-op threads; pin this for comparable numbers (0 = leave as is)")
+    args = parser.parse_args(argv)
+
+    payload = run_benchmarks(args.only, args.n_train, args.n_eval, args.batch_size,
+                             args.repeats, args.seed, args.threads)
+    print(format_results(payload))
+
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump(payload, f, indent=2)
+
+    if args.compare:
+        with open(args.compare, "r", encoding="utf-8") as f:
+            baseline = json.load(f)
+        rows, regressions = compare(baseline, payload, args.threshold)
+        print()
+        for case, old, new, change in rows:
+            flag = "  REGRESSION" if change > args.threshold else ""
+            print(f"{case:<40} {old:>9.4f}s -> {new:>9.4f}s ({change:+.1%}){flag}")
+        if regressions:
+            return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
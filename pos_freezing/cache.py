@@ -0,0 +1,195 @@
+"""
+Caches in front of the tagger for repeated sentences and words.
+
+Real text and UD corpora repeat a lot (short Naija utterances, boilerplate
+lines, and the loader lowercases everything), so two caches sit in front of
+inference:
+
+- ``SentenceCache`` maps a normalized sentence hash to its tags. Hits skip
+  tokenization, batching and the forward pass entirely.
+- ``WordPieceCache`` maps a word to its subword ids, so sentences that miss
+  the first cache are assembled from cached pieces instead of re-running
+  the tokenizer on every word.
+
+Both are LRU caches bounded by entry count and report hits, misses and
+evictions through ``stats()``.
+"""
+
+import collections
+import hashlib
+import threading
+
+import numpy as np
+
+
+class LRUCache:
+    """
+    A thread-safe least-recently-used mapping with hit/miss/eviction counts.
+    """
+
+    def __init__(self, max_entries=100_000):
+        if max_entries <= 0:
+            raise ValueError(f"max_entries must be positive, got {max_entries}")
+        self.max_entries = max_entries
+        self._data = collections.OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def get(self, key, default=None):
+        with self._lock:
+            try:
+                value = self._data[key]
+            except KeyError:
+                self.misses += 1
+                return default
+            self._data.move_to_end(key)
+            self.hits += 1
+            return value
+
+    def put(self, key, value):
+        with self._lock:
+            self._data[key] = value
+            self._data.move_to_end(key)
+            while len(self._data) > self.max_entries:
+                self._data.popitem(last=False)
+                self.evictions += 1
+
+    def __len__(self):
+        return len(self._data)
+
+    def __contains__(self, key):
+        return key in self._data
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+
+    def stats(self):
+        lookups = self.hits + self.misses
+        return {
+            "entries": len(self._data),
+            "max_entries": self.max_entries,
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": self.hits / lookups if lookups else None,
+            "evictions": self.evictions,
+        }
+
+
+def normalize_sentence(words, lowercase=True):
+    """
+    The form a sentence is tagged in: stripped and, like the training data,
+    lowercased.
+    """
+    return [w.strip().lower() if lowercase else w.strip() for w in words]
+
+
+def sentence_key(words):
+    """
+    A compact hash of a normalized sentence, used as the cache key.
+    """
+    return hashlib.blake2b("\x1f".join(words).encode("utf-8"), digest_size=16).digest()
+
+
+class SentenceCache(LRUCache):
+    """
+    Tags of previously seen sentences, keyed by ``sentence_key``.
+    """
+
+    def __init__(self, max_entries=100_000, lowercase=True):
+        super().__init__(max_entries)
+        self.lowercase = lowercase
+
+    def key(self, words):
+        return sentence_key(normalize_sentence(words, self.lowercase))
+
+
+class WordPieceCache(LRUCache):
+    """
+    Subword ids per word, used to encode batches without calling the
+    tokenizer on words seen before.
+
+    Encoding a word on its own gives the same pieces as encoding it inside
+    a sentence with ``is_split_into_words=True``, because pre-tokenization
+    never crosses word boundaries. Only BERT-style ``[CLS] ... [SEP]``
+    tokenizers are supported.
+    """
+
+    def __init__(self, tokenizer, max_entries=200_000):
+        super().__init__(max_entries)
+        if tokenizer.cls_token_id is None or tokenizer.sep_token_id is None:
+            raise ValueError("WordPieceCache needs a tokenizer with [CLS] and [SEP] tokens")
+        self.tokenizer = tokenizer
+
+    def pieces(self, words):
+        """
+        Subword ids of each word, tokenizing only the cache misses in one call.
+        """
+        result = [self.get(w) for w in words]
+        missing = list(dict.fromkeys(w for w, ids in zip(words, result) if ids is None))
+        if missing:
+            encoded = self.tokenizer(missing, add_special_tokens=False)["input_ids"]
+            fresh = dict(zip(missing, encoded))
+            for word, ids in fresh.items():
+                self.put(word, ids)
+            result = [fresh[w] if ids is None else ids for w, ids in zip(words, result)]
+        return result
+
+    def encode(self, sentences, max_length=128):
+        """
+        Build a padded batch for pre-split, normalized sentences.
+
+        Returns:
+            (input_ids, attention_mask, word_ids): two long tensors and the
+            ``(batch, seq)`` int matrix ``alignment.decode_words`` expects.
+            Pieces beyond ``max_length`` are truncated as the tokenizer would.
+        """
+        input_ids, attention_mask, word_ids, _, _ = self._encode(sentences, max_length)
+        return input_ids, attention_mask, word_ids
+
+    def encode_windows(self, sentences, max_length=128, stride=32):
+        """
+        Like ``encode``, but long sentences become overlapping windows as
+        with the tokenizer's ``return_overflowing_tokens``.
+
+        Returns:
+            (input_ids, attention_mask, word_ids, sample_mapping, starts),
+            the last two as ``alignment.decode_words`` takes them.
+        """
+        return self._encode(sentences, max_length, stride)
+
+    def _encode(self, sentences, max_length, stride=None):
+        import torch
+
+        from .alignment import window_starts
+
+        cls_id, sep_id = self.tokenizer.cls_token_id, self.tokenizer.sep_token_id
+        pad_id = self.tokenizer.pad_token_id or 0
+        width = max_length - 2
+        flat = self.pieces([w for s in sentences for w in s])
+
+        rows, row_word_ids, sample_mapping, starts, start = [], [], [], [], 0
+        for sentence_idx, sentence in enumerate(sentences):
+            ids, word_ids = [], []
+            for word_idx, pieces in enumerate(flat[start:start + len(sentence)]):
+                ids.extend(pieces)
+                word_ids.extend([word_idx] * len(pieces))
+            start += len(sentence)
+            for offset in (window_starts(len(ids), width, stride) if stride is not None else [0]):
+                rows.append([cls_id] + ids[offset:offset + width] + [sep_id])
+                row_word_ids.append([-1] + word_ids[offset:offset + width] + [-1])
+                sample_mapping.append(sentence_idx)
+                starts.append(offset)
+
+        width = max(len(r) for r in rows)
+        input_ids = np.full((len(rows), width), pad_id, dtype=np.int64)
+        word_ids = np.full((len(rows), width), -1, dtype=np.int64)
+        attention_mask = np.zeros((len(rows), width), dtype=np.int64)
+        for i, (ids, wids) in enumerate(zip(rows, row_word_ids)):
+            input_ids[i, :len(ids)] = ids
+            word_ids[i, :len(wids)] = wids
+            attention_mask[i, :len(ids)] = 1
+        return (torch.from_numpy(input_ids), torch.from_numpy(attention_mask), word_ids,
+                np.array(sample_mapping), np.array(starts))
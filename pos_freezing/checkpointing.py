@@ -0,0 +1,128 @@
+"""
+Activation recomputation that follows the freeze mask.
+
+The encoder is treated as a stack ``[embeddings, layer[0], ..., layer[5]]``.
+Two things are applied to it:
+
+- Every module below the lowest one holding a trainable parameter runs
+  under ``torch.no_grad()``: nothing below it needs a gradient, so it keeps
+  no activations and costs nothing in backward. Note that the freezing
+  strategies in the notebooks keep the embeddings trainable, so gradients
+  must flow through every block and this prefix is empty for them. It pays
+  off once the embeddings are frozen as well, e.g. with LoRA.
+- Above that prefix, selected blocks are checkpointed: only their input is
+  kept and their activations are recomputed during backward. The policy sets
+  the memory/compute trade-off:
+
+  - "trainable": checkpoint only blocks with trainable parameters;
+  - "all": checkpoint every block above the frozen prefix (least memory);
+  - a list of layer indices.
+
+Blocks are patched on the instance (``forward`` is wrapped), so parameter
+names and checkpoints are unchanged; ``remove_checkpointing`` undoes it.
+"""
+
+import functools
+
+import torch
+from torch.utils.checkpoint import checkpoint
+
+POLICIES = ("trainable", "all")
+
+
+def _has_trainable(module):
+    return any(p.requires_grad for p in module.parameters())
+
+
+def _no_grad_forward(forward, *args, **kwargs):
+    with torch.no_grad():
+        return forward(*args, **kwargs)
+
+
+def _checkpointed_forward(module, forward, *args, **kwargs):
+    if not (module.training and torch.is_grad_enabled()):
+        return forward(*args, **kwargs)
+    return checkpoint(forward, *args, use_reentrant=False, **kwargs)
+
+
+def encoder_stack(model):
+    distilbert = model.distilbert
+    return [distilbert.embeddings] + list(distilbert.transformer.layer)
+
+
+def apply_checkpointing(model, policy="trainable"):
+    """
+    Patch the encoder for freeze-aware recomputation (see module docstring).
+
+    Returns:
+        A dict with the ``no_grad`` prefix and ``checkpointed`` layer indices
+        (-1 stands for the embeddings).
+    """
+    remove_checkpointing(model)
+    stack = encoder_stack(model)
+    trainable = [_has_trainable(module) for module in stack]
+    first_trainable = trainable.index(True) if any(trainable) else len(stack)
+
+    if policy == "trainable":
+        selected = {i for i in range(len(stack) - 1) if trainable[i + 1]}
+    elif policy == "all":
+        selected = set(range(len(stack) - 1))
+    elif isinstance(policy, (list, tuple, set)):
+        selected = set(policy)
+    else:
+        raise ValueError(f"Unknown checkpointing policy: {policy}")
+
+    summary = {"no_grad": [], "checkpointed": []}
+    for position, module in enumerate(stack):
+        layer_idx = position - 1
+        if position < first_trainable:
+            module.forward = functools.partial(_no_grad_forward, module.forward)
+            summary["no_grad"].append(layer_idx)
+        elif layer_idx in selected and layer_idx >= 0:
+            module.forward = functools.partial(_checkpointed_forward, module, module.forward)
+            summary["checkpointed"].append(layer_idx)
+    return summary
+
+
+def remove_checkpointing(model):
+    """
+    Restore the original ``forward`` of every patched module.
+    """
+    for module in encoder_stack(model):
+        module.__dict__.pop("forward", None)
+
+
+def saved_activation_bytes(model, batch):
+    """
+    Bytes kept alive for backward by one training forward pass.
+
+    Counts tensors saved by autograd (excluding parameters, which are only
+    referenced) and, for checkpointed blocks, the input each keeps for
+    recomputation.
+    """
+    param_ptrs = {p.data_ptr() for p in model.parameters()}
+    seen = set()
+    total = [0]
+
+    def pack(tensor):
+        key = (tensor.data_ptr(), tensor.numel(), tensor.dtype)
+        if tensor.data_ptr() not in param_ptrs and key not in seen:
+            seen.add(key)
+            total[0] += tensor.numel() * tensor.element_size()
+        return tensor
+
+    was_training = model.training
+    model.train()
+    with torch.autograd.graph.saved_tensors_hooks(pack, lambda tensor: tensor):
+        outputs = model(**batch)
+
+    checkpointed = sum(
+        1 for module in model.distilbert.transformer.layer
+        if isinstance(module.__dict__.get("forward"), functools.partial)
+        and module.__dict__["forward"].func is _checkpointed_forward
+    )
+    batch_size, seq_len = batch["input_ids"].shape
+    hidden_bytes = batch_size * seq_len * model.config.dim * outputs.logits.element_size()
+    del outputs
+    model.train(was_training)
+    return total[0] + checkpointed * hidden_bytes
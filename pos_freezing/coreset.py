@@ -0,0 +1,225 @@
+"""
+Training on a representative subset of the training split, optionally in
+short-to-long order.
+
+Every sentence gets a cheap embedding: the pretrained model's frozen
+embeddings and first ``depth`` layers (``search.prefix_forward``),
+mean-pooled over its subwords and L2-normalized. A subset is then picked
+in that space until a sentence or token budget is spent:
+
+- ``"k_center"``: greedy k-center, each pick the sentence farthest from
+  everything picked so far, so the subset covers the whole split;
+- ``"diversity"``: k-means++ style D² sampling, each pick drawn with
+  probability proportional to its squared distance from the subset, which
+  covers the split without chasing single outliers;
+- ``"random"``: a uniform sample, the baseline.
+
+The curriculum (``CurriculumSampler``, or ``train_strategy(...,
+curriculum_epochs=1)``) orders the first epochs from short to long
+sentences, shuffling within length buckets, and shuffles fully afterwards.
+
+    embeddings = sentence_embeddings(model_init(), train_tok, tokenizer)
+    subset = train_tok.select(select_coreset(embeddings, 0.2, "k_center", costs=lengths(train_tok)))
+    rows = coreset_curve(model_init, train_tok, dev_tok, tokenizer, strategy="first_k", k=4)
+"""
+
+import time
+
+import numpy as np
+
+METHODS = ("k_center", "diversity", "random")
+
+
+def lengths(dataset):
+    """
+    Subword count of every sentence.
+    """
+    if hasattr(dataset, "lengths"):
+        return np.asarray(dataset.lengths)
+    return np.array([len(ids) for ids in dataset["input_ids"]], dtype=np.int64)
+
+
+def sentence_embeddings(model, dataset, tokenizer, depth=2, batch_size=64):
+    """
+    Mean-pooled, L2-normalized hidden states after the frozen embeddings and
+    first ``depth`` layers, one float32 row per sentence in dataset order.
+    """
+    import torch
+    from transformers import DataCollatorForTokenClassification
+
+    from .search import prefix_forward
+
+    data_collator = DataCollatorForTokenClassification(tokenizer, return_tensors="pt")
+    embeddings = np.empty((len(dataset), model.config.dim), dtype=np.float32)
+    order = np.argsort(-lengths(dataset), kind="stable")
+    model.eval()
+    with torch.inference_mode():
+        for start in range(0, len(order), batch_size):
+            idx = order[start:start + batch_size]
+            rows = [dataset[int(i)] for i in idx]
+            batch = data_collator([{"input_ids": r["input_ids"], "labels": r["labels"]} for r in rows])
+            hidden = prefix_forward(model, batch["input_ids"], batch["attention_mask"], depth)
+            mask = batch["attention_mask"].unsqueeze(-1).to(hidden.dtype)
+            pooled = (hidden * mask).sum(1) / mask.sum(1)
+            embeddings[idx] = torch.nn.functional.normalize(pooled.float(), dim=-1).numpy()
+    return embeddings
+
+
+def select_coreset(embeddings, budget, method="k_center", costs=None, seed=42):
+    """
+    Indices of a subset of rows of ``embeddings``, in selection order.
+
+    Args:
+        budget: A fraction (<= 1) of the total cost, or an absolute cost.
+        costs: Per-row cost counted against the budget, e.g. ``lengths``
+            to budget tokens rather than sentences (default 1 per row).
+    """
+    import torch
+
+    if method not in METHODS:
+        raise ValueError(f"Unknown coreset method: {method}")
+    n = len(embeddings)
+    costs = np.ones(n) if costs is None else np.asarray(costs, dtype=np.float64)
+    if budget <= 1:
+        budget = budget * costs.sum()
+    rng = np.random.default_rng(seed)
+    if method == "random":
+        order = rng.permutation(n)
+        return order[:int(np.searchsorted(np.cumsum(costs[order]), budget)) + 1][:n]
+
+    x = torch.from_numpy(np.ascontiguousarray(embeddings, dtype=np.float32))
+    sq_norms = (x * x).sum(1)
+    min_dist = torch.full((n,), float("inf"))
+    selected = []
+    spent = 0.0
+    pick = int(rng.integers(n))
+    while spent < budget and len(selected) < n:
+        selected.append(pick)
+        spent += costs[pick]
+        dist = (sq_norms - 2 * (x @ x[pick]) + sq_norms[pick]).clamp_(min=0)
+        torch.minimum(min_dist, dist, out=min_dist)
+        min_dist[pick] = 0
+        total = float(min_dist.sum())
+        if total <= 0:
+            # every remaining row duplicates a picked one: fill up at random
+            rest = np.setdiff1d(rng.permutation(n), selected, assume_unique=True)
+            fill = rest[:int(np.searchsorted(np.cumsum(costs[rest]), budget - spent)) + 1]
+            return np.concatenate([np.array(selected, dtype=np.int64), fill])
+        if method == "k_center":
+            pick = int(min_dist.argmax())
+        else:
+            weights = min_dist.double().numpy()
+            pick = int(rng.choice(n, p=weights / weights.sum()))
+    return np.array(selected, dtype=np.int64)
+
+
+def curriculum_order(lengths, rng, n_buckets=10):
+    """
+    Short-to-long order: sentences grouped into ``n_buckets`` length
+    quantiles, buckets in increasing length, shuffled within each bucket.
+    """
+    lengths = np.asarray(lengths)
+    n = len(lengths)
+    rank = np.empty(n, dtype=np.int64)
+    rank[np.lexsort((rng.random(n), lengths))] = np.arange(n)
+    bucket = rank * n_buckets // max(n, 1)
+    return np.lexsort((rng.random(n), bucket))
+
+
+def _curriculum_sampler_class():
+    import torch
+
+    class CurriculumSampler(torch.utils.data.Sampler):
+        """
+        Short-to-long order (``curriculum_order``) for the first
+        ``curriculum_epochs`` epochs, a plain shuffle afterwards.
+        """
+
+        def __init__(self, lengths, curriculum_epochs=1, n_buckets=10, seed=42):
+            self.lengths = np.asarray(lengths)
+            self.curriculum_epochs = curriculum_epochs
+            self.n_buckets = n_buckets
+            self.seed = seed
+            self.epoch = 0
+
+        def set_epoch(self, epoch):
+            self.epoch = epoch
+
+        def __len__(self):
+            return len(self.lengths)
+
+        def __iter__(self):
+            rng = np.random.default_rng(self.seed + self.epoch)
+            if self.epoch < self.curriculum_epochs:
+                order = curriculum_order(self.lengths, rng, self.n_buckets)
+            else:
+                order = rng.permutation(len(self.lengths))
+            self.epoch += 1
+            return iter(order.tolist())
+
+    return CurriculumSampler
+
+
+def curriculum_sampler(lengths, curriculum_epochs=1, n_buckets=10, seed=42):
+    return _curriculum_sampler_class()(lengths, curriculum_epochs, n_buckets, seed)
+
+
+def _curriculum_trainer_class():
+    from transformers import Trainer
+
+    class CurriculumTrainer(Trainer):
+        """
+        ``Trainer`` drawing training batches from a ``CurriculumSampler``.
+        """
+
+        def __init__(self, *args, curriculum_epochs=1, n_buckets=10, **kwargs):
+            super().__init__(*args, **kwargs)
+            self.curriculum_epochs = curriculum_epochs
+            self.n_buckets = n_buckets
+
+        def _get_train_sampler(self, train_dataset=None):
+            train_dataset = self.train_dataset if train_dataset is None else train_dataset
+            return curriculum_sampler(lengths(train_dataset), self.curriculum_epochs, self.n_buckets, self.args.seed)
+
+    return CurriculumTrainer
+
+
+def coreset_curve(model_init, train_tok, dev_tok, tokenizer, strategy=None, k=0, fractions=(0.1, 0.2, 0.5),
+                  methods=METHODS, depth=2, by_tokens=True, curriculum_epochs=0, output_dir="coreset",
+                  seed=42, **kwargs):
+    """
+    Train one freezing strategy on the full split and on subsets of it.
+
+    Returns:
+        ``train_strategy`` rows, the full-data run first, each with its
+        "Subset" method, "Subset (%)" of training tokens and the seconds
+        spent embedding and selecting ("Selection Time (s)"). Keyword
+        arguments go to ``train_strategy``.
+    """
+    from .incremental import _subset
+    from .sweep import count_tokens, train_strategy
+
+    start = time.perf_counter()
+    embeddings = sentence_embeddings(model_init(), train_tok, tokenizer, depth)
+    embed_time = time.perf_counter() - start
+    costs = lengths(train_tok) if by_tokens else None
+    total_tokens = count_tokens(train_tok)
+
+    rows = []
+    runs = [("full", 1.0)] + [(method, fraction) for method in methods for fraction in fractions]
+    for method, fraction in runs:
+        subset, selection_time = train_tok, 0.0
+        if method != "full":
+            start = time.perf_counter()
+            indices = np.sort(select_coreset(embeddings, fraction, method, costs, seed))
+            selection_time = time.perf_counter() - start + (embed_time if method != "random" else 0.0)
+            # PackedDataset has no select()
+            subset = _subset(train_tok, indices)
+        name = "Full" if method == "full" else f"{method} {fraction:g}"
+        row = train_strategy(name, strategy, k, model_init, subset, dev_tok, tokenizer,
+                             output_dir=output_dir, curriculum_epochs=curriculum_epochs, **kwargs)
+        row["Subset"] = method
+        row["Subset (%)"] = round(100 * count_tokens(subset) / total_tokens, 1)
+        row["Selection Time (s)"] = round(selection_time, 2)
+        rows.append(row)
+    return rows
@@ -0,0 +1,91 @@
+"""
+Loading Universal Dependencies treebanks and preparing them for token
+classification.
+"""
+
+from conllu import parse_incr
+
+
+def load_conllu_sentences(path):
+    """
+    Read a CoNLL-U file into a list of (tokens, upos) pairs.
+
+    Multi-word token ranges and empty nodes are skipped and every form is
+    lowercased, exactly as in the notebooks.
+    """
+    data = []
+    with open(path, "r", encoding="utf-8") as f:
+        for tokenlist in parse_incr(f):
+            tokens = [token["form"].lower() for token in tokenlist if type(token["id"]) == int]
+            upos   = [token["upos"] for token in tokenlist if type(token["id"]) == int]
+            data.append((tokens, upos))
+    return data
+
+
+def build_tag_maps(sentences):
+    """
+    Build the UPOS vocabulary of a split.
+
+    Returns:
+        (tag2id, id2tag) with tags sorted alphabetically.
+    """
+    all_tags = sorted({tag for _, tags in sentences for tag in tags})
+    tag2id = {tag: i for i, tag in enumerate(all_tags)}
+    id2tag = {i: tag for tag, i in tag2id.items()}
+    return tag2id, id2tag
+
+
+def tokenize_and_align(example, tokenizer, tag2id, label_all_tokens=False, max_length=128):
+    """
+    Tokenize one pre-split sentence and align its UPOS labels to subwords.
+
+    Args:
+        example: A (tokens, labels) pair.
+        tokenizer: A fast HuggingFace tokenizer.
+        tag2id: Mapping from UPOS tag to label id.
+        label_all_tokens: Label every subword of a word instead of only the first.
+        max_length: Truncation length in subwords.
+    """
+    tokens, labels = example
+    tokenized = tokenizer(tokens,
+                          is_split_into_words=True,
+                          truncation=True,
+                          max_length=max_length)
+
+    word_ids = tokenized.word_ids()
+    aligned_labels = []
+    previous_word_idx = None
+
+    for word_idx in word_ids:
+        if word_idx is None:
+            aligned_labels.append(-100)
+        elif word_idx != previous_word_idx:
+            aligned_labels.append(tag2id[labels[word_idx]])
+        else:
+            aligned_labels.append(tag2id[labels[word_idx]] if label_all_tokens else -100)
+        previous_word_idx = word_idx
+
+    tokenized["labels"] = aligned_labels
+    return tokenized
+
+
+def tokenize_split(sentences, tokenizer, tag2id, batch_size=1000, **kwargs):
+    """
+    Wrap a split into a HuggingFace Dataset and tokenize it, as the notebooks
+    do for ``train_tok``, ``dev_tok`` and ``test_tok``.
+
+    Rows are identical to mapping ``tokenize_and_align`` over the split, but
+    labels are aligned a batch at a time with ``tokenize_and_align_batch``.
+    Extra keyword arguments are forwarded to it.
+    """
+    from datasets import Dataset
+
+    from .alignment import tokenize_and_align_batch
+
+    dataset = Dataset.from_list([{"tokens": t, "upos": u} for t, u in sentences])
+    return dataset.map(
+        lambda batch: tokenize_and_align_batch(batch, tokenizer, tag2id, **kwargs),
+        batched=True,
+        batch_size=batch_size,
+        remove_columns=["tokens", "upos"],
+    )
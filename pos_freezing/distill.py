@@ -0,0 +1,256 @@
+"""
+Distilling the best freezing configuration into a shallow student tagger.
+
+The teacher (usually the best row of a sweep, saved with
+``save_model=True``) is run once over the training split and its UPOS
+logits at the labelled subwords are stored as float16 in a memory-mapped
+``(n_tokens, num_labels)`` array, with per-sentence offsets. The student is
+a copy of the teacher with only a few ``transformer.layer`` blocks kept; it
+is trained on a mix of the soft-target KL loss and the usual cross-entropy.
+
+    teacher = AutoModelForTokenClassification.from_pretrained(best_row(rows)["Model Dir"])
+    rows += distill(teacher, train_tok, dev_tok, tokenizer, "distill")
+    results_table(rows)
+"""
+
+import copy
+import json
+import os
+import time
+
+import numpy as np
+
+from .freezing import count_parameters
+from .metrics import compute_metrics
+from .sweep import DEFAULT_TRAINING_ARGS, epoch_history, inference_throughput
+
+
+def store_teacher_logits(teacher, dataset, tokenizer, path, batch_size=32, dtype=np.float16):
+    """
+    Run the teacher once and store its logits at labelled positions.
+
+    Rows are written in dataset order; sentence ``i`` owns rows
+    ``offsets[i]:offsets[i + 1]``, saved next to ``path`` with an
+    ``.offsets.npy`` suffix.
+
+    Returns:
+        (logits, offsets): a read-only memmap and an int64 array.
+    """
+    import torch
+    from transformers import DataCollatorForTokenClassification
+
+    counts = [sum(1 for label in labels if label != -100) for labels in dataset["labels"]]
+    offsets = np.concatenate([[0], np.cumsum(counts)]).astype(np.int64)
+    num_labels = teacher.config.num_labels
+
+    os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+    logits = np.lib.format.open_memmap(path, mode="w+", dtype=dtype, shape=(int(offsets[-1]), num_labels))
+
+    data_collator = DataCollatorForTokenClassification(tokenizer, return_tensors="pt")
+    teacher.eval()
+    with torch.inference_mode():
+        for start in range(0, len(dataset), batch_size):
+            rows = dataset[start:start + batch_size]
+            batch = data_collator([
+                {"input_ids": ids, "labels": labels} for ids, labels in zip(rows["input_ids"], rows["labels"])
+            ])
+            out = teacher(input_ids=batch["input_ids"], attention_mask=batch["attention_mask"]).logits
+            mask = batch["labels"] != -100
+            logits[offsets[start]:offsets[min(start + batch_size, len(dataset))]] = out[mask].numpy().astype(dtype)
+
+    logits.flush()
+    np.save(_offsets_path(path), offsets)
+    del logits
+    return np.load(path, mmap_mode="r"), offsets
+
+
+def _offsets_path(path):
+    return (path[:-len(".npy")] if path.endswith(".npy") else path) + ".offsets.npy"
+
+
+def load_teacher_logits(path):
+    return np.load(path, mmap_mode="r"), np.load(_offsets_path(path))
+
+
+def _key_path(path):
+    return (path[:-len(".npy")] if path.endswith(".npy") else path) + ".key.json"
+
+
+def teacher_logits_key(teacher, dataset):
+    """
+    What stored teacher logits depend on: the teacher's name and weights
+    and the content of the split.
+    """
+    from .results_store import dataset_digest, model_digest
+
+    return {
+        "teacher": getattr(teacher.config, "_name_or_path", None),
+        "weights": model_digest(teacher),
+        "data": dataset_digest(dataset),
+    }
+
+
+def build_student(teacher, layers=(0, 2, 5)):
+    """
+    Copy the teacher, keeping only the given ``transformer.layer`` blocks
+    (in order) together with its embeddings and classifier.
+    """
+    from torch import nn
+
+    student = copy.deepcopy(teacher)
+    blocks = teacher.distilbert.transformer.layer
+    student.distilbert.transformer.layer = nn.ModuleList(copy.deepcopy(blocks[i]) for i in layers)
+    student.distilbert.transformer.n_layers = len(layers)
+    student.config.n_layers = len(layers)
+    for param in student.parameters():
+        param.requires_grad = True
+    return student
+
+
+class TeacherLogitsCollator:
+    """
+    Pads features like ``DataCollatorForTokenClassification`` and carries
+    each sentence's index (when present, i.e. for the training split) so the
+    loss can fetch its teacher logits.
+    """
+
+    def __init__(self, tokenizer):
+        from transformers import DataCollatorForTokenClassification
+
+        self.data_collator = DataCollatorForTokenClassification(tokenizer, return_tensors="pt")
+
+    def __call__(self, features):
+        import torch
+
+        if "sentence_idx" not in features[0]:
+            return self.data_collator(features)
+        sentence_idx = torch.tensor([f["sentence_idx"] for f in features])
+        batch = self.data_collator([{k: v for k, v in f.items() if k != "sentence_idx"} for f in features])
+        batch["sentence_idx"] = sentence_idx
+        return batch
+
+
+def _distillation_trainer_class():
+    import torch
+    import torch.nn.functional as F
+    from transformers import Trainer
+
+    class DistillationTrainer(Trainer):
+        """
+        ``Trainer`` whose loss mixes KL to the stored teacher logits with
+        cross-entropy on the gold labels.
+        """
+
+        def __init__(self, *args, teacher_logits=None, teacher_offsets=None,
+                     temperature=2.0, alpha=0.5, **kwargs):
+            super().__init__(*args, **kwargs)
+            self.teacher_logits = teacher_logits
+            self.teacher_offsets = teacher_offsets
+            self.temperature = temperature
+            self.alpha = alpha
+
+        def compute_loss(self, model, inputs, return_outputs=False, num_items_in_batch=None):
+            sentence_idx = inputs.pop("sentence_idx", None)
+            outputs = model(**inputs)
+            if sentence_idx is None or not model.training:
+                return (outputs.loss, outputs) if return_outputs else outputs.loss
+
+            mask = inputs["labels"] != -100
+            student = outputs.logits[mask]
+            teacher = torch.from_numpy(np.concatenate([
+                self.teacher_logits[self.teacher_offsets[i]:self.teacher_offsets[i + 1]]
+                for i in sentence_idx.tolist()
+            ]).astype(np.float32)).to(student.device)
+
+            t = self.temperature
+            kd = F.kl_div(
+                F.log_softmax(student / t, dim=-1), F.softmax(teacher / t, dim=-1), reduction="batchmean"
+            ) * (t * t)
+            loss = self.alpha * kd + (1 - self.alpha) * outputs.loss
+            return (loss, outputs) if return_outputs else loss
+
+    return DistillationTrainer
+
+
+def distill(teacher, train_tok, dev_tok, tokenizer, output_dir, layers=(0, 2, 5),
+            temperature=2.0, alpha=0.5, training_args=None, teacher_name="Teacher"):
+    """
+    Store teacher logits (reusing them if already on disk for the same
+    teacher weights and split, see ``teacher_logits_key``), train the
+    student and return teacher and student rows for ``results_table``.
+    """
+    from transformers import DataCollatorForTokenClassification, Trainer, TrainingArguments
+
+    logits_path = os.path.join(output_dir, "teacher_logits.npy")
+    key = teacher_logits_key(teacher, train_tok)
+    stored_key = None
+    if os.path.exists(_key_path(logits_path)):
+        with open(_key_path(logits_path), "r", encoding="utf-8") as f:
+            stored_key = json.load(f)
+    if stored_key == key and os.path.exists(logits_path) and os.path.exists(_offsets_path(logits_path)):
+        teacher_logits, offsets = load_teacher_logits(logits_path)
+    else:
+        if stored_key is not None:
+            os.remove(_key_path(logits_path))
+        teacher_logits, offsets = store_teacher_logits(teacher, train_tok, tokenizer, logits_path)
+        with open(_key_path(logits_path), "w", encoding="utf-8") as f:
+            json.dump(key, f, indent=2)
+
+    student = build_student(teacher, layers)
+    total_params, trainable_params = count_parameters(student)
+    train_with_idx = train_tok.add_column("sentence_idx", list(range(len(train_tok))))
+
+    args = dict(DEFAULT_TRAINING_ARGS)
+    args.update(training_args or {})
+    args.update(remove_unused_columns=False)
+    args.setdefault("output_dir", os.path.join(output_dir, "student"))
+
+    trainer = _distillation_trainer_class()(
+        model=student,
+        args=TrainingArguments(**args),
+        train_dataset=train_with_idx,
+        eval_dataset=dev_tok,
+        processing_class=tokenizer,
+        data_collator=TeacherLogitsCollator(tokenizer),
+        compute_metrics=compute_metrics,
+        teacher_logits=teacher_logits,
+        teacher_offsets=offsets,
+        temperature=temperature,
+        alpha=alpha,
+    )
+
+    start = time.perf_counter()
+    trainer.train()
+    train_time = time.perf_counter() - start
+    history = epoch_history(trainer.state.log_history)
+    student_metrics = trainer.evaluate(eval_dataset=dev_tok)
+
+    teacher_trainer = Trainer(
+        model=teacher,
+        args=TrainingArguments(**dict(args, output_dir=os.path.join(output_dir, "teacher"))),
+        eval_dataset=dev_tok,
+        processing_class=tokenizer,
+        data_collator=DataCollatorForTokenClassification(tokenizer),
+        compute_metrics=compute_metrics,
+    )
+    teacher_metrics = teacher_trainer.evaluate()
+    teacher_total, _ = count_parameters(teacher)
+
+    return [
+        {
+            "Strategy": teacher_name,
+            "Dev Accuracy (%)": round(100 * teacher_metrics["eval_accuracy"], 1),
+            "Total Params (M)": round(teacher_total / 1e6, 2),
+            "Inference Tokens/s": round(inference_throughput(teacher, dev_tok, tokenizer)),
+        },
+        {
+            "Strategy": f"Student ({len(layers)} layers)",
+            "Dev Accuracy (%)": round(100 * student_metrics["eval_accuracy"], 1),
+            "Trainable Params (M)": round(trainable_params / 1e6, 2),
+            "Total Params (M)": round(total_params / 1e6, 2),
+            "Trainable (%)": trainable_params / total_params * 100,
+            "Training Time (s)": round(train_time, 1),
+            "Inference Tokens/s": round(inference_throughput(trainer.model, dev_tok, tokenizer)),
+            "History": history,
+        },
+    ]
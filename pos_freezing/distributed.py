@@ -0,0 +1,251 @@
+"""
+Deterministic data-parallel training over several CPU processes or nodes.
+
+Each process holds a full replica, trains on its own shard of every epoch
+and averages gradients with ``torch.distributed`` on the gloo backend.
+Only trainable parameters are communicated, packed into one flat buffer
+per step. The word embeddings get special handling: their gradient is
+non-zero only in the rows of the subwords in the current batches, so the
+ranks first agree on the union of touched rows and then reduce just those
+rows. This keeps the embedding traffic small even when the 92M-parameter
+matrix is trainable, as it is in every ``freeze_layers`` strategy.
+
+Sharding uses ``DistributedSampler`` with a fixed seed and ``set_epoch``,
+model replicas start from rank 0's weights, and dropout is seeded per rank,
+so a run is reproducible for a given world size.
+
+Launch locally with several processes:
+
+    python -m pos_freezing.distributed --world-size 4 --strategy all_encoder
+
+or across nodes with ``torchrun``, which sets ``RANK``/``WORLD_SIZE``/
+``MASTER_ADDR``; the same entry point then joins the existing group.
+"""
+
+import argparse
+import json
+import os
+import socket
+import time
+
+import torch
+import torch.distributed as dist
+
+from .metrics import evaluate_accuracy
+
+
+def free_port():
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+def broadcast_parameters(model, src=0):
+    """
+    Make every replica start from ``src``'s weights.
+    """
+    for tensor in list(model.parameters()) + list(model.buffers()):
+        dist.broadcast(tensor.data, src)
+
+
+class GradientReducer:
+    """
+    Averages gradients of trainable parameters across ranks.
+
+    Dense trainable parameters are reduced through one flat buffer. The
+    word-embedding gradient, if trainable, is reduced only on the rows that
+    any rank touched in this step.
+    """
+
+    def __init__(self, model, sparse_embeddings=True):
+        self.world_size = dist.get_world_size()
+        embedding = model.distilbert.embeddings.word_embeddings.weight
+        self.embedding = embedding if sparse_embeddings and embedding.requires_grad else None
+        self.dense = [p for p in model.parameters() if p.requires_grad and p is not self.embedding]
+        self.bytes_sent = 0
+
+    def reduce(self, input_ids):
+        if self.dense:
+            grads = [p.grad if p.grad is not None else torch.zeros_like(p) for p in self.dense]
+            flat = torch.cat([g.reshape(-1) for g in grads])
+            dist.all_reduce(flat)
+            flat /= self.world_size
+            self.bytes_sent += flat.numel() * flat.element_size()
+            offset = 0
+            for param, grad in zip(self.dense, grads):
+                n = grad.numel()
+                param.grad = flat[offset:offset + n].view_as(grad)
+                offset += n
+
+        if self.embedding is not None:
+            self._reduce_embedding_rows(input_ids)
+
+    def _reduce_embedding_rows(self, input_ids):
+        local_rows = torch.unique(input_ids)
+        counts = [torch.zeros(1, dtype=torch.long) for _ in range(self.world_size)]
+        dist.all_gather(counts, torch.tensor([local_rows.numel()]))
+        width = int(max(c.item() for c in counts))
+        padded = torch.full((width,), -1, dtype=torch.long)
+        padded[:local_rows.numel()] = local_rows
+        gathered = [torch.empty_like(padded) for _ in range(self.world_size)]
+        dist.all_gather(gathered, padded)
+        rows = torch.unique(torch.cat(gathered))
+        rows = rows[rows >= 0]
+
+        grad = self.embedding.grad
+        if grad is None:
+            grad = self.embedding.grad = torch.zeros_like(self.embedding)
+        block = grad.index_select(0, rows)
+        dist.all_reduce(block)
+        block /= self.world_size
+        grad.index_copy_(0, rows, block)
+        self.bytes_sent += block.numel() * block.element_size() + self.world_size * width * 8
+
+
+def train_worker(rank, world_size, model_init, strategy, k, train_tok, dev_tok, tokenizer,
+                 output_dir, epochs=5, learning_rate=5e-5, weight_decay=0.01, batch_size=16,
+                 seed=42, sparse_embeddings=True, init_method=None):
+    """
+    One rank of a data-parallel run. Rank 0 evaluates on ``dev_tok``, saves
+    the model and writes ``metrics.json`` to ``output_dir``.
+
+    Args:
+        model_init: Picklable zero-argument model factory.
+        strategy, k: Passed to ``sweep.prepare_model``.
+        batch_size: Per-process batch size; the global batch is
+            ``batch_size * world_size``.
+    """
+    from torch.utils.data import DataLoader, DistributedSampler
+    from transformers import DataCollatorForTokenClassification, get_linear_schedule_with_warmup
+
+    from .freezing import count_parameters
+    from .sweep import prepare_model
+
+    if not dist.is_initialized():
+        dist.init_process_group("gloo", init_method=init_method, rank=rank, world_size=world_size)
+    torch.set_num_threads(max(1, (os.cpu_count() or 1) // world_size))
+
+    torch.manual_seed(seed)
+    model = prepare_model(model_init(), strategy, k)
+    broadcast_parameters(model)
+    torch.manual_seed(seed + rank)  # distinct, reproducible dropout per rank
+
+    sampler = DistributedSampler(train_tok, num_replicas=world_size, rank=rank, shuffle=True, seed=seed)
+    loader = DataLoader(
+        train_tok.with_format(columns=["input_ids", "attention_mask", "labels"]),
+        batch_size=batch_size,
+        sampler=sampler,
+        collate_fn=DataCollatorForTokenClassification(tokenizer, return_tensors="pt"),
+    )
+    optimizer = torch.optim.AdamW(
+        [p for p in model.parameters() if p.requires_grad], lr=learning_rate, weight_decay=weight_decay
+    )
+    scheduler = get_linear_schedule_with_warmup(optimizer, 0, epochs * len(loader))
+    reducer = GradientReducer(model, sparse_embeddings)
+
+    history = []
+    model.train()
+    start = time.perf_counter()
+    for epoch in range(epochs):
+        sampler.set_epoch(epoch)
+        for batch in loader:
+            loss = model(**batch).loss
+            loss.backward()
+            reducer.reduce(batch["input_ids"])
+            optimizer.step()
+            scheduler.step()
+            optimizer.zero_grad(set_to_none=True)
+        if rank == 0:
+            history.append(round(100 * evaluate_accuracy(model, dev_tok, tokenizer)["accuracy"], 1))
+        dist.barrier()
+    train_time = time.perf_counter() - start
+
+    if rank == 0:
+        total_params, trainable_params = count_parameters(model)
+        os.makedirs(output_dir, exist_ok=True)
+        model.save_pretrained(output_dir)
+        metrics = {
+            "Strategy": strategy or "none",
+            "World Size": world_size,
+            "Dev Accuracy (%)": history[-1] if history else None,
+            "Trainable Params (M)": round(trainable_params / 1e6, 2),
+            "Total Params (M)": round(total_params / 1e6, 2),
+            "Training Time (s)": round(train_time, 1),
+            "Comm MB/step": round(reducer.bytes_sent / max(1, epochs * len(loader)) / 2**20, 3),
+            "History": history,
+        }
+        with open(os.path.join(output_dir, "metrics.json"), "w", encoding="utf-8") as f:
+            json.dump(metrics, f, indent=2)
+    dist.barrier()
+    dist.destroy_process_group()
+
+
+def run_data_parallel(world_size, model_init, strategy, k, train_tok, dev_tok, tokenizer, output_dir, **kwargs):
+    """
+    Spawn ``world_size`` local processes for ``train_worker`` and return
+    rank 0's metrics row.
+    """
+    import torch.multiprocessing as mp
+
+    init_method = f"tcp://127.0.0.1:{free_port()}"
+    mp.spawn(
+        _spawn_entry,
+        args=(world_size, model_init, strategy, k, train_tok, dev_tok, tokenizer, output_dir, kwargs, init_method),
+        nprocs=world_size,
+        join=True,
+    )
+    with open(os.path.join(output_dir, "metrics.json"), "r", encoding="utf-8") as f:
+        return json.load(f)
+
+
+def _spawn_entry(rank, world_size, model_init, strategy, k, train_tok, dev_tok, tokenizer, output_dir,
+                 kwargs, init_method):
+    train_worker(rank, world_size, model_init, strategy, k, train_tok, dev_tok, tokenizer, output_dir,
+                 init_method=init_method, **kwargs)
+
+
+def _synthetic_setup(workdir, n_train, n_dev, seed):
+    import functools
+
+    from .data import build_tag_maps, tokenize_split
+    from .synthetic import build_local_tokenizer, build_small_model, make_synthetic_sentences
+
+    train_sentences = make_synthetic_sentences(n_train, seed=seed)
+    dev_sentences = make_synthetic_sentences(n_dev, seed=seed + 1)
+    tokenizer = build_local_tokenizer(train_sentences, os.path.join(workdir, "tokenizer"))
+    tag2id, _ = build_tag_maps(train_sentences + dev_sentences)
+    model_init = functools.partial(build_small_model, tag2id, len(tokenizer), seed)
+    return (model_init, tokenize_split(train_sentences, tokenizer, tag2id),
+            tokenize_split(dev_sentences, tokenizer, tag2id), tokenizer)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Data-parallel training on synthetic data (smoke test).")
+    parser.add_argument("--world-size", type=int, default=2)
+    parser.add_argument("--strategy", default="all_encoder")
+    parser.add_argument("--k", type=int, default=0)
+    parser.add_argument("--epochs", type=int, default=1)
+    parser.add_argument("--batch-size", type=int, default=16)
+    parser.add_argument("--n-train", type=int, default=256)
+    parser.add_argument("--n-dev", type=int, default=64)
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--output-dir", default="dp_run")
+    args = parser.parse_args(argv)
+
+    strategy = None if args.strategy == "none" else args.strategy
+    setup = _synthetic_setup(args.output_dir, args.n_train, args.n_dev, args.seed)
+    kwargs = dict(epochs=args.epochs, batch_size=args.batch_size, seed=args.seed)
+
+    if "RANK" in os.environ and "WORLD_SIZE" in os.environ:
+        # launched by torchrun: join the group it describes
+        dist.init_process_group("gloo")
+        model_init, train_tok, dev_tok, tokenizer = setup
+        train_worker(dist.get_rank(), dist.get_world_size(), model_init, strategy, args.k,
+                     train_tok, dev_tok, tokenizer, args.output_dir, **kwargs)
+        return
+    print(json.dumps(run_data_parallel(args.world_size, setup[0], strategy, args.k, *setup[1:],
+                                       args.output_dir, **kwargs), indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,233 @@
+"""
+Early-exit tagging with linear classifier heads on intermediate layers.
+
+A fine-tuned tagger gets a light ``Linear(dim, num_labels)`` head after
+some of its ``transformer.layer`` blocks. The heads are fitted on the
+frozen model's hidden states (extracted once and cached by
+``probe.cached_hidden_states``, the same files ``run_probes`` reuses) with
+softmax cross-entropy, so the tagger itself is unchanged. At inference
+the encoder runs layer by layer and stops for a sentence as soon as it is
+confident:
+
+- ``mode="sentence"``: a sentence exits at the first head whose softmax
+  confidence reaches ``threshold`` on all of its words, and all its words
+  take that head's predictions;
+- ``mode="token"``: each word keeps the prediction of the first head that
+  is confident about it; the sentence exits once every word has one.
+
+Exited sentences are removed from the batch, so easy inputs really cost
+fewer layers. Sentences that never become confident use the model's own
+classifier after the last layer.
+
+    heads = train_exit_heads(model, train_tok, tokenizer, "exit_cache")
+    pd.DataFrame(exit_curve(model, heads, test_tok, tokenizer))
+"""
+
+import time
+
+import numpy as np
+import torch
+from torch import nn
+
+MODES = ("sentence", "token")
+
+
+def train_exit_heads(model, train_tok, tokenizer, cache_dir, layers=None, epochs=3, learning_rate=1e-2,
+                     batch_size=4096, seed=42):
+    """
+    Fit one linear head per exit layer on the frozen model's hidden states.
+
+    Args:
+        layers: Layer counts after which to exit (default every layer but
+            the last, i.e. ``1 .. n_layers - 1``).
+
+    Returns:
+        An ``nn.ModuleDict`` mapping ``str(layer)`` to its head.
+    """
+    from .probe import cached_hidden_states
+
+    n_layers = model.config.n_layers
+    layers = list(layers or range(1, n_layers))
+    features, labels = cached_hidden_states(model, train_tok, tokenizer, cache_dir, "train")
+
+    layer_index = np.array(layers)[:, None]
+    generator = torch.Generator().manual_seed(seed)
+    heads = nn.ModuleDict({str(layer): nn.Linear(model.config.dim, model.config.num_labels) for layer in layers})
+    for head in heads.values():
+        nn.init.zeros_(head.weight)
+        nn.init.zeros_(head.bias)
+    optimizer = torch.optim.Adam(heads.parameters(), lr=learning_rate)
+    targets = torch.from_numpy(labels)
+    for _ in range(epochs):
+        order = torch.randperm(len(labels), generator=generator).numpy()
+        for start in range(0, len(order), batch_size):
+            # sorted indices keep memmap reads sequential
+            idx = np.sort(order[start:start + batch_size])
+            x = torch.from_numpy(np.asarray(features[layer_index, idx[None, :]], dtype=np.float32))
+            y = targets[idx]
+            loss = sum(nn.functional.cross_entropy(heads[str(layer)](x[i]), y) for i, layer in enumerate(layers))
+            optimizer.zero_grad()
+            loss.backward()
+            optimizer.step()
+    return heads.eval()
+
+
+class EarlyExitTagger:
+    """
+    Runs a token classifier layer by layer with exit heads.
+
+    Args:
+        model: The fine-tuned tagger.
+        heads: Output of ``train_exit_heads``.
+        threshold: Softmax confidence needed to exit.
+        mode: "sentence" or "token" (see module docstring).
+    """
+
+    def __init__(self, model, heads, threshold=0.9, mode="sentence"):
+        if mode not in MODES:
+            raise ValueError(f"Unknown early-exit mode: {mode}")
+        self.model = model.eval()
+        self.heads = heads.eval()
+        self.threshold = threshold
+        self.mode = mode
+
+    @torch.inference_mode()
+    def predict(self, input_ids, attention_mask, positions):
+        """
+        Predictions for a padded batch.
+
+        Args:
+            positions: Boolean ``(batch, seq)`` tensor of the positions whose
+                prediction matters (first subwords); the exit decision only
+                looks at these.
+
+        Returns:
+            (preds, exit_layer): ``(batch, seq)`` long tensors with the label
+            and the number of layers run for every position.
+        """
+        from .search import _attention_mask
+
+        distilbert = self.model.distilbert
+        blocks = distilbert.transformer.layer
+        batch, seq = input_ids.shape
+        preds = torch.zeros(batch, seq, dtype=torch.long)
+        exit_layer = torch.full((batch, seq), len(blocks), dtype=torch.long)
+        done = torch.zeros(batch, seq, dtype=torch.bool)
+
+        active = torch.arange(batch)
+        hidden = distilbert.embeddings(input_ids)
+        for depth, block in enumerate(blocks, start=1):
+            mask = attention_mask[active]
+            hidden = block(hidden, _attention_mask(self.model, hidden, mask))
+            head = self.heads[str(depth)] if str(depth) in self.heads and depth < len(blocks) else None
+            if head is None:
+                continue
+            confidence, label = head(hidden).softmax(-1).max(-1)
+            wanted = positions[active]
+            confident = confidence >= self.threshold
+            if self.mode == "token":
+                newly = wanted & confident & ~done[active]
+                rows, cols = newly.nonzero(as_tuple=True)
+                preds[active[rows], cols] = label[rows, cols]
+                exit_layer[active[rows], cols] = depth
+                done[active[rows], cols] = True
+                finished = (done[active] | ~wanted).all(-1)
+            else:
+                finished = (confident | ~wanted).all(-1)
+                preds[active[finished]] = label[finished]
+                exit_layer[active[finished]] = depth
+            active, hidden = active[~finished], hidden[~finished]
+            if not len(active):
+                break
+
+        if len(active):
+            final = self.model.classifier(hidden).argmax(-1)
+            if self.mode == "token":
+                keep = ~done[active]
+                preds[active] = torch.where(keep, final, preds[active])
+            else:
+                preds[active] = final
+        return preds, exit_layer
+
+    def tag(self, tokenizer, sentences, id2tag=None, max_length=128, lowercase=True):
+        """
+        Per-word tags for pre-split sentences, read at first subwords as in
+        ``inference.tag_sentences``; words beyond ``max_length`` get ``None``.
+        """
+        from .alignment import batch_word_ids, first_subword_mask
+
+        if not sentences:
+            return []
+        id2tag = id2tag or self.model.config.id2label
+        words = [[w.lower() for w in s] if lowercase else list(s) for s in sentences]
+        encoded = tokenizer(words, is_split_into_words=True, truncation=True, max_length=max_length,
+                            padding=True, return_tensors="pt")
+        word_ids = batch_word_ids(encoded)
+        first = first_subword_mask(word_ids)
+        preds, _ = self.predict(encoded["input_ids"], encoded["attention_mask"], torch.from_numpy(first))
+        tags = [[None] * len(s) for s in words]
+        for row, col in zip(*np.nonzero(first)):
+            tags[row][word_ids[row, col]] = id2tag[int(preds[row, col])]
+        return tags
+
+
+def evaluate_early_exit(tagger, dataset, tokenizer, batch_size=32):
+    """
+    Accuracy, expected layers (per labelled token and per sentence) and
+    throughput of ``tagger`` on a labelled split.
+    """
+    from transformers import DataCollatorForTokenClassification
+
+    data_collator = DataCollatorForTokenClassification(tokenizer, return_tensors="pt")
+    batches = []
+    for start in range(0, len(dataset), batch_size):
+        rows = dataset[start:start + batch_size]
+        batches.append(data_collator([
+            {"input_ids": ids, "labels": labels} for ids, labels in zip(rows["input_ids"], rows["labels"])
+        ]))
+    n_tokens = sum(int(batch["attention_mask"].sum()) for batch in batches)
+
+    correct = total = layer_sum = 0
+    sentence_layers = []
+    start = time.perf_counter()
+    for batch in batches:
+        positions = batch["labels"] != -100
+        preds, exit_layer = tagger.predict(batch["input_ids"], batch["attention_mask"], positions)
+        correct += int((preds[positions] == batch["labels"][positions]).sum())
+        total += int(positions.sum())
+        layer_sum += int(exit_layer[positions].sum())
+        sentence_layers.extend(exit_layer.masked_fill(~positions, 0).max(-1).values.tolist())
+    elapsed = time.perf_counter() - start
+    return {
+        "accuracy": correct / total if total else 0.0,
+        "expected_layers": layer_sum / total if total else 0.0,
+        "expected_sentence_layers": float(np.mean(sentence_layers)) if sentence_layers else 0.0,
+        "tokens_per_second": n_tokens / elapsed,
+    }
+
+
+def exit_curve(model, heads, dataset, tokenizer, thresholds=(0.5, 0.7, 0.8, 0.9, 0.95, 0.99),
+               modes=MODES, batch_size=32):
+    """
+    The accuracy/throughput trade-off over thresholds and modes, with the
+    full model (no exits) as the first row.
+    """
+    reference = evaluate_early_exit(EarlyExitTagger(model, nn.ModuleDict(), 1.0), dataset, tokenizer, batch_size)
+    rows = [_row("none", None, reference, reference)]
+    for mode in modes:
+        for threshold in thresholds:
+            result = evaluate_early_exit(EarlyExitTagger(model, heads, threshold, mode), dataset, tokenizer, batch_size)
+            rows.append(_row(mode, threshold, result, reference))
+    return rows
+
+
+def _row(mode, threshold, result, reference):
+    return {
+        "Mode": mode,
+        "Threshold": threshold,
+        "Accuracy (%)": round(100 * result["accuracy"], 2),
+        "Expected Layers": round(result["expected_layers"], 2),
+        "Expected Sentence Layers": round(result["expected_sentence_layers"], 2),
+        "Tokens/s": round(result["tokens_per_second"]),
+        "Speedup": round(result["tokens_per_second"] / reference["tokens_per_second"], 2),
+    }
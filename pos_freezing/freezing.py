@@ -0,0 +1,64 @@
+"""
+Layer freezing strategies for DistilBERT token classifiers.
+"""
+
+# (display name, freeze_strategy, k) for every configuration in the study
+STRATEGIES = [
+    ("Baseline", None, 0),
+    ("Freeze All", "all_encoder", 0),
+    ("Freeze First 2", "first_k", 2),
+    ("Freeze First 4", "first_k", 4),
+    ("Alternating Freeze", "alternating", 0),
+]
+
+
+def frozen_layer_indices(num_layers, freeze_strategy, k=0):
+    """
+    Return the indices of the ``transformer.layer`` blocks a strategy freezes.
+    """
+    if freeze_strategy is None:
+        return []
+    if freeze_strategy == "all_encoder":
+        return list(range(num_layers))
+    if freeze_strategy == "first_k":
+        return [i for i in range(num_layers) if i < k]
+    if freeze_strategy == "last_k":
+        return [i for i in range(num_layers) if i >= num_layers - k]
+    if freeze_strategy == "alternating":
+        return [i for i in range(num_layers) if i % 2 == 0]
+    raise ValueError(f"Unknown freeze_strategy: {freeze_strategy}")
+
+
+def freeze_layers(model, freeze_strategy="first_k", k=2):
+    """
+    Freeze layers of a DistilBERT model based on the given strategy.
+
+    Every parameter is unfrozen first, so a model can be re-frozen with a
+    different strategy.
+
+    Args:
+        model: An instance of AutoModelForTokenClassification based on DistilBERT.
+        freeze_strategy: Strategy to freeze layers. Options:
+            - None: Train everything (baseline).
+            - "all_encoder": Freeze all encoder layers.
+            - "first_k": Freeze the first k encoder layers.
+            - "last_k": Freeze the last k encoder layers.
+            - "alternating": Freeze alternating layers (even-indexed).
+        k: Number of layers to freeze for "first_k" or "last_k" strategies.
+    """
+    for param in model.parameters():
+        param.requires_grad = True
+
+    layers = model.distilbert.transformer.layer
+    for i in frozen_layer_indices(len(layers), freeze_strategy, k):
+        for param in layers[i].parameters():
+            param.requires_grad = False
+
+
+def count_parameters(model):
+    """
+    Return (total, trainable) parameter counts.
+    """
+    total_params = sum(p.numel() for p in model.parameters())
+    trainable_params = sum(p.numel() for p in model.parameters() if p.requires_grad)
+    return total_params, trainable_params
@@ -0,0 +1,229 @@
+"""
+Scoring and pruning attention heads of a fine-tuned tagger.
+
+Importance is mask sensitivity (Michel et al., 2019): every head's output
+is multiplied by a gate fixed at 1, and a head's score is the accumulated
+absolute gradient of the dev loss with respect to its gate, normalized per
+layer. The gates are applied by a forward pre-hook on ``out_lin``, where
+the input is still laid out as ``(batch, seq, heads * head_size)``.
+
+Pruning slices the head's rows out of ``q_lin``/``k_lin``/``v_lin`` and its
+columns out of ``out_lin``, so the model really gets smaller. The attention
+reshape infers the head count (``view(..., -1, head_size)``), so only
+``n_heads`` and ``dim`` on the attention module need updating. The pruned
+heads are recorded in ``config.pruned_heads``; ``load_pruned_model``
+rebuilds the shapes before loading weights, since ``from_pretrained``
+cannot.
+
+    importance = head_importance(model, dev_tok, tokenizer)
+    rows = pruning_curve(model, importance, dev_tok, tokenizer, train_tok=train_tok, fine_tune_steps=200)
+"""
+
+import copy
+import functools
+import os
+
+import numpy as np
+import torch
+from torch import nn
+
+
+def _attention_modules(model):
+    return [layer.attention for layer in model.distilbert.transformer.layer]
+
+
+def _gate_hook(gate, module, args):
+    hidden = args[0]
+    heads = gate.shape[0]
+    shaped = hidden.view(*hidden.shape[:-1], heads, hidden.shape[-1] // heads)
+    return ((shaped * gate[:, None].to(hidden.dtype)).view_as(hidden),) + tuple(args[1:])
+
+
+def head_importance(model, dataset, tokenizer, batch_size=32, normalize=True):
+    """
+    Mask-sensitivity score of every head on a labelled split.
+
+    Returns:
+        A ``(n_layers, n_heads)`` float array (ragged layers after pruning
+        are padded with NaN). Parameters' ``requires_grad`` and gradients
+        are left as they were.
+    """
+    from transformers import DataCollatorForTokenClassification
+
+    attentions = _attention_modules(model)
+    gates = [torch.ones(a.n_heads, requires_grad=True) for a in attentions]
+    handles = [a.out_lin.register_forward_pre_hook(functools.partial(_gate_hook, gate))
+               for a, gate in zip(attentions, gates)]
+    saved = [(p, p.requires_grad) for p in model.parameters()]
+    for param, _ in saved:
+        param.requires_grad_(False)
+
+    data_collator = DataCollatorForTokenClassification(tokenizer, return_tensors="pt")
+    was_training = model.training
+    model.eval()
+    scores = [torch.zeros(a.n_heads) for a in attentions]
+    try:
+        for start in range(0, len(dataset), batch_size):
+            rows = dataset[start:start + batch_size]
+            batch = data_collator([
+                {"input_ids": ids, "labels": labels} for ids, labels in zip(rows["input_ids"], rows["labels"])
+            ])
+            loss = model(**batch).loss
+            grads = torch.autograd.grad(loss, gates)
+            for score, grad in zip(scores, grads):
+                score += grad.abs()
+    finally:
+        for handle in handles:
+            handle.remove()
+        for param, requires_grad in saved:
+            param.requires_grad_(requires_grad)
+        model.train(was_training)
+
+    if normalize:
+        scores = [s / (s.norm() + 1e-20) for s in scores]
+    width = max(len(s) for s in scores)
+    importance = np.full((len(scores), width), np.nan)
+    for layer, s in enumerate(scores):
+        importance[layer, :len(s)] = s.numpy()
+    return importance
+
+
+def _keep_rows(linear, index, dim):
+    weight = linear.weight.index_select(dim, index).clone()
+    new = nn.Linear(weight.shape[1], weight.shape[0], bias=linear.bias is not None,
+                    dtype=weight.dtype, device=weight.device)
+    new.weight = nn.Parameter(weight, requires_grad=linear.weight.requires_grad)
+    if linear.bias is not None:
+        bias = linear.bias if dim == 1 else linear.bias.index_select(0, index)
+        new.bias = nn.Parameter(bias.clone(), requires_grad=linear.bias.requires_grad)
+    return new
+
+
+def prune_heads(model, heads):
+    """
+    Remove attention heads in place.
+
+    Args:
+        heads: ``{layer: [head indices]}``, indices relative to the layer's
+            current heads. At least one head per layer must remain.
+    """
+    pruned = {int(k): list(v) for k, v in (getattr(model.config, "pruned_heads", None) or {}).items()}
+    for layer_idx, layer_heads in heads.items():
+        layer_heads = sorted(set(int(h) for h in layer_heads))
+        if not layer_heads:
+            continue
+        attention = model.distilbert.transformer.layer[int(layer_idx)].attention
+        size = attention.attention_head_size
+        keep_heads = [h for h in range(attention.n_heads) if h not in layer_heads]
+        if not keep_heads:
+            raise ValueError(f"Cannot prune every head of layer {layer_idx}")
+        index = torch.tensor([h * size + i for h in keep_heads for i in range(size)])
+        attention.q_lin = _keep_rows(attention.q_lin, index, 0)
+        attention.k_lin = _keep_rows(attention.k_lin, index, 0)
+        attention.v_lin = _keep_rows(attention.v_lin, index, 0)
+        attention.out_lin = _keep_rows(attention.out_lin, index, 1)
+
+        # record original head numbers so the pruning can be replayed on a fresh model
+        original = [h for h in range(attention.n_heads + len(pruned.get(int(layer_idx), [])))
+                    if h not in pruned.get(int(layer_idx), [])]
+        pruned[int(layer_idx)] = sorted(pruned.get(int(layer_idx), []) + [original[h] for h in layer_heads])
+        attention.n_heads = len(keep_heads)
+        attention.dim = attention.n_heads * size
+    model.config.pruned_heads = {str(k): v for k, v in pruned.items()}
+    return model
+
+
+def heads_to_prune(importance, fraction):
+    """
+    The ``fraction`` of all heads with the lowest importance, as a
+    ``{layer: [heads]}`` dict, always keeping each layer's best head.
+    """
+    candidates = [
+        (importance[layer, head], layer, head)
+        for layer in range(importance.shape[0])
+        for head in range(importance.shape[1])
+        if not np.isnan(importance[layer, head]) and head != int(np.nanargmax(importance[layer]))
+    ]
+    n_total = int(np.sum(~np.isnan(importance)))
+    n_prune = min(int(round(fraction * n_total)), len(candidates))
+    heads = {}
+    for _, layer, head in sorted(candidates)[:n_prune]:
+        heads.setdefault(layer, []).append(head)
+    return heads
+
+
+def count_heads(model):
+    return sum(a.n_heads for a in _attention_modules(model))
+
+
+def load_pruned_model(model_dir):
+    """
+    Load a model saved after ``prune_heads``: build it from its config,
+    replay the pruning, then load the saved weights.
+    """
+    from safetensors.torch import load_file
+    from transformers import AutoConfig, AutoModelForTokenClassification
+
+    config = AutoConfig.from_pretrained(model_dir)
+    model = AutoModelForTokenClassification.from_config(config)
+    pruned = getattr(config, "pruned_heads", None) or {}
+    config.pruned_heads = {}
+    prune_heads(model, {int(layer): heads for layer, heads in pruned.items()})
+    model.load_state_dict(load_file(os.path.join(model_dir, "model.safetensors")))
+    return model.eval()
+
+
+def fine_tune(model, train_tok, tokenizer, max_steps=200, output_dir="pruned", training_args=None):
+    """
+    Briefly train the trainable part of a pruned model with ``Trainer``.
+    """
+    from transformers import DataCollatorForTokenClassification, Trainer, TrainingArguments
+
+    from .sweep import DEFAULT_TRAINING_ARGS
+
+    args = dict(DEFAULT_TRAINING_ARGS, eval_strategy="no", max_steps=max_steps, output_dir=output_dir)
+    args.update(training_args or {})
+    Trainer(
+        model=model,
+        args=TrainingArguments(**args),
+        train_dataset=train_tok,
+        processing_class=tokenizer,
+        data_collator=DataCollatorForTokenClassification(tokenizer),
+    ).train()
+    return model
+
+
+def pruning_curve(model, importance, dev_tok, tokenizer, fractions=(0.0, 0.1, 0.2, 0.3, 0.4, 0.5),
+                  train_tok=None, fine_tune_steps=0, output_dir="pruned", training_args=None, repeats=3):
+    """
+    Prune increasing fractions of heads from copies of ``model`` and measure
+    each one.
+
+    Returns:
+        One row per fraction with heads kept, parameters, dev accuracy (after
+        ``fine_tune_steps`` of ``fine_tune`` on ``train_tok`` if given),
+        inference tokens/s and per-sentence latency.
+    """
+    from .freezing import count_parameters
+    from .metrics import evaluate_accuracy
+    from .sweep import count_tokens, inference_throughput
+
+    tokens_per_sentence = count_tokens(dev_tok) / len(dev_tok)
+    rows = []
+    for fraction in fractions:
+        pruned = prune_heads(copy.deepcopy(model), heads_to_prune(importance, fraction))
+        if fine_tune_steps and train_tok is not None and fraction > 0:
+            fine_tune(pruned, train_tok, tokenizer, fine_tune_steps,
+                      os.path.join(output_dir, f"fraction_{fraction:g}"), training_args)
+        total_params, _ = count_parameters(pruned)
+        accuracy = evaluate_accuracy(pruned, dev_tok, tokenizer)["accuracy"]
+        tokens_per_second = inference_throughput(pruned, dev_tok, tokenizer, repeats=repeats)
+        rows.append({
+            "Pruned Heads (%)": round(100 * fraction, 1),
+            "Heads": count_heads(pruned),
+            "Total Params (M)": round(total_params / 1e6, 2),
+            "Dev Accuracy (%)": round(100 * accuracy, 1),
+            "Inference Tokens/s": round(tokens_per_second),
+            "Latency (ms/sentence)": round(1000 * tokens_per_sentence / tokens_per_second, 3),
+        })
+    return rows
@@ -0,0 +1,281 @@
+"""
+Continued training when a treebank grows, without redoing everything.
+
+A packed split (``packed.load_or_pack``) keeps a ``hashes.npy`` array with
+one 64-bit hash per sentence (forms and UPOS). When the CoNLL-U file
+changes, ``update_packed``:
+
+- re-parses it and hashes every sentence;
+- reuses the stored subwords and labels of sentences whose hash is already
+  in the cache;
+- tokenizes only the new or changed ones (the "delta");
+- rewrites the split in the file's new order.
+
+Sentences that disappeared are dropped. A different tokenizer, tag map or
+option set invalidates the cache, and the split is packed from scratch.
+
+``update_prefix_features`` does the same for features stored by
+``search.store_prefix_features``. Rows of reused sentences are copied and
+the frozen prefix runs on the delta only. That is valid as long as the
+prefix stays frozen, which is what made it cacheable in the first place.
+
+``continue_training`` loads the last saved model instead of the pretrained
+one. It trains on a replay mix of all delta sentences plus
+``replay_ratio`` times as many old ones sampled at random, which keeps the
+model from drifting towards the new data. ``incremental_update`` chains
+the three steps.
+
+    row = incremental_update("en_ewt-ud-train.conllu", tokenizer, tag2id, "cache/train",
+                             best["Model Dir"], "first_k", 4, dev_tok)
+"""
+
+import functools
+import json
+import os
+import shutil
+
+import numpy as np
+
+
+def _ranges(starts, lengths):
+    """
+    Concatenated ``arange(starts[i], starts[i] + lengths[i])`` for every ``i``.
+    """
+    cols = np.arange(int(lengths.sum())) - np.repeat(np.cumsum(lengths) - lengths, lengths)
+    return np.repeat(starts, lengths) + cols
+
+
+def _replace_dir_contents(tmp_dir, directory):
+    # per-file renames keep open memmaps of the old files valid
+    os.makedirs(directory, exist_ok=True)
+    for name in os.listdir(tmp_dir):
+        os.replace(os.path.join(tmp_dir, name), os.path.join(directory, name))
+    shutil.rmtree(tmp_dir)
+
+
+def _subset(dataset, indices):
+    if hasattr(dataset, "select"):
+        return dataset.select(indices)
+    from datasets import Dataset
+
+    rows = dataset[[int(i) for i in indices]]
+    return Dataset.from_dict({name: [np.asarray(v).tolist() for v in values] for name, values in rows.items()})
+
+
+def update_packed(conllu_path, tokenizer, tag2id, directory, **kwargs):
+    """
+    Bring the packed split in ``directory`` up to date with ``conllu_path``,
+    tokenizing only new or changed sentences. Keyword arguments go to
+    ``data.tokenize_split``; windowing (``stride``) is not supported,
+    since it maps a sentence to several rows.
+
+    Returns:
+        (dataset, old_index): the ``PackedDataset`` and, for every sentence,
+        its row in the previous version of the split or -1 if it was
+        tokenized now.
+    """
+    from .data import load_conllu_sentences, tokenize_split
+    from .packed import (
+        FORMAT_VERSION,
+        HASHES_FILE,
+        PackedDataset,
+        _flat_column,
+        _source_meta,
+        sentence_hashes,
+        write_packed_arrays,
+    )
+
+    if kwargs.get("stride") is not None:
+        raise ValueError("update_packed needs one row per sentence; windowed splits must be packed from scratch")
+    sentences = load_conllu_sentences(conllu_path)
+    hashes = sentence_hashes(sentences)
+    meta = _source_meta(conllu_path, tokenizer, tag2id, kwargs)
+
+    old = None
+    if os.path.exists(os.path.join(directory, "meta.json")):
+        old = PackedDataset(directory)
+        expected = json.loads(json.dumps(meta))
+        same_options = all(old.meta.get(key) == value for key, value in expected.items()
+                           if key not in ("source", "source_digest"))
+        if old.meta.get("format_version") != FORMAT_VERSION or not same_options:
+            old = None
+
+    old_index = np.full(len(sentences), -1, dtype=np.int64)
+    if old is not None:
+        if old.meta.get("source_digest") == meta["source_digest"]:
+            # up to date; a split packed before hashes were stored gets them now
+            np.save(os.path.join(directory, HASHES_FILE), hashes)
+            return old, np.arange(len(old), dtype=np.int64)
+        if not os.path.exists(os.path.join(directory, HASHES_FILE)):
+            old = None
+        else:
+            position = {h: i for i, h in enumerate(np.load(os.path.join(directory, HASHES_FILE)).tolist())}
+            old_index = np.array([position.get(h, -1) for h in hashes.tolist()], dtype=np.int64)
+
+    delta = np.flatnonzero(old_index < 0)
+    delta_ids = np.zeros(0, dtype=np.int64)
+    delta_labels = np.zeros(0, dtype=np.int64)
+    delta_offsets = np.zeros(1, dtype=np.int64)
+    if len(delta):
+        tokenized = tokenize_split([sentences[i] for i in delta], tokenizer, tag2id, **kwargs)
+        delta_ids, delta_offsets = _flat_column(tokenized, "input_ids")
+        delta_labels, _ = _flat_column(tokenized, "labels")
+
+    reused = old_index >= 0
+    lengths = np.zeros(len(sentences), dtype=np.int64)
+    starts = np.zeros(len(sentences), dtype=np.int64)
+    base = 0
+    if old is not None:
+        base = len(old.input_ids)
+        lengths[reused] = old.lengths[old_index[reused]]
+        starts[reused] = old.offsets[old_index[reused]]
+        pool_ids = np.concatenate([np.asarray(old.input_ids, dtype=np.int64), delta_ids])
+        pool_labels = np.concatenate([np.asarray(old.labels, dtype=np.int64), delta_labels])
+    else:
+        pool_ids, pool_labels = delta_ids, delta_labels
+    lengths[delta] = np.diff(delta_offsets)
+    starts[delta] = base + delta_offsets[:-1]
+
+    offsets = np.concatenate([[0], np.cumsum(lengths)]).astype(np.int64)
+    source = _ranges(starts, lengths)
+    input_ids, labels = pool_ids[source], pool_labels[source]
+    del old, pool_ids, pool_labels
+
+    tmp_dir = directory.rstrip(os.sep) + ".tmp"
+    write_packed_arrays(input_ids, labels, offsets, tmp_dir, meta)
+    np.save(os.path.join(tmp_dir, HASHES_FILE), hashes)
+    _replace_dir_contents(tmp_dir, directory)
+    return PackedDataset(directory), old_index
+
+
+def update_prefix_features(model, dataset, tokenizer, depth, path, old_index, batch_size=32, chunk_size=4096):
+    """
+    Rebuild the prefix features at ``path`` for the updated ``dataset``:
+    rows of sentences with ``old_index >= 0`` are copied from the existing
+    file, the rest are computed with ``search.store_prefix_features``.
+
+    Returns:
+        (features, offsets) as ``search.load_prefix_features``.
+    """
+    from .distill import _offsets_path
+    from .search import load_prefix_features, store_prefix_features
+
+    old_features, old_offsets = load_prefix_features(path)
+    delta = np.flatnonzero(old_index < 0)
+    tmp_path = path[:-len(".npy")] + ".delta.npy"
+    delta_features, delta_offsets = None, np.zeros(1, dtype=np.int64)
+    if len(delta):
+        delta_features, delta_offsets = store_prefix_features(model, _subset(dataset, delta), tokenizer, depth,
+                                                              tmp_path, batch_size, old_features.dtype)
+
+    if hasattr(dataset, "lengths"):
+        lengths = np.asarray(dataset.lengths, dtype=np.int64)
+    else:
+        lengths = np.array([len(ids) for ids in dataset["input_ids"]], dtype=np.int64)
+    offsets = np.concatenate([[0], np.cumsum(lengths)]).astype(np.int64)
+    new_path = path[:-len(".npy")] + ".new.npy"
+    features = np.lib.format.open_memmap(new_path, mode="w+", dtype=old_features.dtype,
+                                         shape=(int(offsets[-1]), old_features.shape[1]))
+    delta_position = np.full(len(old_index), -1, dtype=np.int64)
+    delta_position[delta] = np.arange(len(delta))
+    for start in range(0, len(old_index), chunk_size):
+        idx = np.arange(start, min(start + chunk_size, len(old_index)))
+        lo, hi = offsets[idx[0]], offsets[idx[-1] + 1]
+        chunk = np.empty((hi - lo, features.shape[1]), dtype=features.dtype)
+        reused = old_index[idx] >= 0
+        mask = np.repeat(reused, lengths[idx])
+        if reused.any():
+            chunk[mask] = old_features[_ranges(old_offsets[old_index[idx[reused]]], lengths[idx[reused]])]
+        if (~reused).any():
+            chunk[~mask] = delta_features[_ranges(delta_offsets[delta_position[idx[~reused]]], lengths[idx[~reused]])]
+        features[lo:hi] = chunk
+    features.flush()
+    del features, old_features, delta_features
+
+    os.replace(new_path, path)
+    np.save(_offsets_path(path), offsets)
+    for leftover in (tmp_path, _offsets_path(tmp_path)):
+        if os.path.exists(leftover):
+            os.remove(leftover)
+    return load_prefix_features(path)
+
+
+def replay_mix(n_sentences, new_indices, replay_ratio=1.0, seed=42):
+    """
+    Sorted indices of all ``new_indices`` plus ``replay_ratio`` times as
+    many other sentences drawn without replacement.
+    """
+    new_indices = np.asarray(new_indices, dtype=np.int64)
+    old = np.setdiff1d(np.arange(n_sentences), new_indices)
+    n_replay = min(len(old), int(round(replay_ratio * len(new_indices))))
+    replay = np.random.default_rng(seed).choice(old, size=n_replay, replace=False)
+    return np.sort(np.concatenate([new_indices, replay]))
+
+
+def continue_training(model_dir, strategy, k, train_tok, dev_tok, tokenizer, new_indices, replay_ratio=1.0,
+                      name=None, output_dir="incremental", seed=42, **kwargs):
+    """
+    Fine-tune the model saved in ``model_dir`` (a ``save_model`` run or a
+    ``Trainer`` checkpoint) further on a replay mix of ``train_tok``.
+
+    The strategy's freezing is applied again and the optimizer starts
+    fresh, with the usual schedule over the mix. Keyword arguments go to
+    ``train_strategy``.
+
+    Returns:
+        The ``train_strategy`` row (saved model in "Model Dir", ready for
+        the next increment) with "New Sentences" and "Replay Sentences".
+    """
+    from transformers import AutoModelForTokenClassification
+
+    from .sweep import train_strategy
+
+    mix = replay_mix(len(train_tok), new_indices, replay_ratio, seed)
+    model_init = functools.partial(AutoModelForTokenClassification.from_pretrained, model_dir)
+    training_args = dict(kwargs.pop("training_args", None) or {}, seed=seed)
+    row = train_strategy(name or f"Incremental {strategy or 'none'}" + (f" {k}" if k else ""), strategy, k,
+                         model_init, _subset(train_tok, mix), dev_tok, tokenizer, output_dir=output_dir,
+                         training_args=training_args, save_model=True, **kwargs)
+    row["New Sentences"] = len(new_indices)
+    row["Replay Sentences"] = len(mix) - len(new_indices)
+    return row
+
+
+def prefix_features_path(cache_dir, model, depth):
+    """
+    Where ``incremental_update`` keeps the prefix features of ``model`` at
+    ``depth``: the file name carries both and a digest of the weights, so
+    features of another model or depth are never extended by mistake.
+    """
+    from .results_store import model_digest
+
+    return os.path.join(cache_dir, f"prefix_{depth}.{model_digest(model)}.npy")
+
+
+def incremental_update(conllu_path, tokenizer, tag2id, cache_dir, model_dir, strategy, k, dev_tok,
+                       replay_ratio=1.0, feature_depth=None, feature_model=None, output_dir="incremental",
+                       seed=42, **kwargs):
+    """
+    Update the packed split in ``cache_dir`` and, if ``feature_depth`` is
+    given, its prefix features (at ``prefix_features_path``, computed with
+    ``feature_model``, for ``search.load_prefix_features``), then continue
+    training from ``model_dir`` on the delta plus replay. Keyword arguments
+    go to ``train_strategy``.
+
+    Returns:
+        The ``continue_training`` row, or None if no sentence changed.
+    """
+    train_tok, old_index = update_packed(conllu_path, tokenizer, tag2id, cache_dir)
+    new_indices = np.flatnonzero(old_index < 0)
+    if feature_depth is not None:
+        path = prefix_features_path(cache_dir, feature_model, feature_depth)
+        if os.path.exists(path) and len(new_indices) < len(train_tok):
+            update_prefix_features(feature_model, train_tok, tokenizer, feature_depth, path, old_index)
+        else:
+            from .search import store_prefix_features
+
+            store_prefix_features(feature_model, train_tok, tokenizer, feature_depth, path)
+    if not len(new_indices):
+        return None
+    return continue_training(model_dir, strategy, k, train_tok, dev_tok, tokenizer, new_indices, replay_ratio,
+                             output_dir=output_dir, seed=seed, **kwargs)
@@ -0,0 +1,60 @@
+"""
+Tagging raw, pre-split sentences with a trained token classifier.
+"""
+
+import torch
+
+from .alignment import batch_word_ids, decode_words, overflow_starts
+
+
+def tag_sentences(model, tokenizer, sentences, id2tag=None, max_length=128, lowercase=True, pooling="first",
+                  word_cache=None, stride=None):
+    """
+    Predict one UPOS tag per word for a batch of pre-split sentences.
+
+    By default each word is tagged by its first subword, matching how labels
+    are aligned in ``tokenize_and_align``; ``pooling="mean"`` or ``"max"``
+    pools the logits of all its subwords instead (useful for models trained
+    with ``label_all_tokens=True``). Words that fall beyond ``max_length``
+    subwords get ``None``, unless ``stride`` is set: long sentences are then
+    tagged as overlapping windows of at most ``max_length`` subwords,
+    batched with the other sentences and merged per word.
+
+    Args:
+        model: A trained AutoModelForTokenClassification.
+        tokenizer: Its fast tokenizer.
+        sentences: A list of word lists.
+        id2tag: Label id to tag; defaults to ``model.config.id2label``.
+        lowercase: Lowercase words first, as ``load_conllu_sentences`` does
+            for the training data.
+        word_cache: Optional ``cache.WordPieceCache`` used instead of
+            calling ``tokenizer`` on every word.
+        stride: Subwords of overlap between consecutive windows.
+    """
+    if not sentences:
+        return []
+    id2tag = id2tag or model.config.id2label
+    words = [[w.lower() for w in s] if lowercase else list(s) for s in sentences]
+    sample_mapping = starts = None
+    if word_cache is not None and stride is not None:
+        input_ids, attention_mask, word_ids, sample_mapping, starts = word_cache.encode_windows(
+            words, max_length, stride)
+    elif word_cache is not None:
+        input_ids, attention_mask, word_ids = word_cache.encode(words, max_length)
+    else:
+        encoded = tokenizer(words,
+                            is_split_into_words=True,
+                            truncation=True,
+                            max_length=max_length,
+                            padding=True,
+                            return_tensors="pt",
+                            **(dict(stride=stride, return_overflowing_tokens=True) if stride is not None else {}))
+        input_ids, attention_mask, word_ids = encoded["input_ids"], encoded["attention_mask"], batch_word_ids(encoded)
+        if stride is not None:
+            sample_mapping = encoded["overflow_to_sample_mapping"].numpy()
+            width = max_length - tokenizer.num_special_tokens_to_add()
+            starts = overflow_starts(sample_mapping, width, stride)
+
+    with torch.inference_mode():
+        logits = model(input_ids=input_ids, attention_mask=attention_mask).logits
+    return decode_words(logits, word_ids, id2tag, [len(s) for s in words], pooling, sample_mapping, starts)
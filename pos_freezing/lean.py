@@ -0,0 +1,318 @@
+"""
+A lean CPU training loop for small and mostly frozen models.
+
+With most of the encoder frozen, a training step does little work, and a
+good share of the time goes to ``Trainer`` bookkeeping: per-step callback
+dispatch and logging, the ``DataLoader`` turning lists of Python dicts into
+padded tensors, and device placement. ``LeanTrainer`` keeps the part of the
+``Trainer`` interface that ``train_strategy`` uses (``train``,
+``evaluate``, ``state.log_history``, ``save_model``) and reads the same
+``TrainingArguments``, but:
+
+- flattens each split once into ``input_ids``/``labels``/offset arrays and
+  builds a batch by one vectorized gather into preallocated buffers
+  (pinned when CUDA is present), so no per-row Python or allocation; a
+  ``prefetch.PrefetchPipeline`` can be passed as ``train_dataset`` instead,
+  to stream ready-made batches from background workers;
+- wraps the model in ``torch.compile`` when ``compile=True`` (padding
+  batches to a multiple of 8 to bound the shapes it sees) and falls back
+  to eager mode if compilation is unavailable or fails;
+- runs optimizer, schedule, gradient clipping and accumulation as
+  ``Trainer`` does (AdamW without decay on biases and LayerNorm weights,
+  the configured scheduler and warmup, ``max_grad_norm``,
+  ``gradient_accumulation_steps``) and calls ``compute_metrics`` with an
+  ``EvalPrediction`` of padded logits and labels.
+
+Callbacks are not supported. ``train_strategy(..., engine="lean")`` uses it
+in the sweep, and ``python -m pos_freezing.bench --only lean_train``
+compares steps/s with ``Trainer`` for every strategy.
+"""
+
+import contextlib
+import math
+import os
+import time
+import warnings
+import weakref
+from types import SimpleNamespace
+
+import numpy as np
+import torch
+
+
+class FlatSplit:
+    """
+    A tokenized split as flat int64 ``input_ids``/``labels`` arrays with
+    sentence ``i`` at ``offsets[i]:offsets[i + 1]``.
+    """
+
+    def __init__(self, dataset):
+        from .packed import PackedDataset, _flat_column
+
+        if isinstance(dataset, PackedDataset):
+            input_ids, offsets = np.asarray(dataset.input_ids), dataset.offsets
+            labels = np.asarray(dataset.labels)
+        else:
+            input_ids, offsets = _flat_column(dataset, "input_ids")
+            labels, _ = _flat_column(dataset, "labels")
+        self.input_ids = input_ids.astype(np.int64)
+        self.labels = labels.astype(np.int64)
+        self.offsets = np.asarray(offsets, dtype=np.int64)
+        self.lengths = np.diff(self.offsets)
+
+    def __len__(self):
+        return len(self.lengths)
+
+
+class BatchBuffers:
+    """
+    Preallocated ``input_ids``/``attention_mask``/``labels`` storage for
+    batches of up to ``batch_size`` sentences of ``max_length`` subwords.
+    ``collate`` returns contiguous views of it, so a batch is only valid
+    until the next call.
+    """
+
+    def __init__(self, batch_size, max_length, pad_token_id=0, pad_to_multiple_of=1):
+        self.pad_token_id = pad_token_id
+        self.pad_to_multiple_of = pad_to_multiple_of
+        size = batch_size * _round_up(max_length, pad_to_multiple_of)
+        pin = torch.cuda.is_available()
+        self.tensors = {
+            name: torch.empty(size, dtype=torch.long, pin_memory=pin)
+            for name in ("input_ids", "attention_mask", "labels")
+        }
+        self.arrays = {name: tensor.numpy() for name, tensor in self.tensors.items()}
+
+    def collate(self, split, indices):
+        starts = split.offsets[indices]
+        lengths = split.lengths[indices]
+        n, width = len(indices), _round_up(int(lengths.max()), self.pad_to_multiple_of)
+        cols = np.arange(int(lengths.sum())) - np.repeat(np.cumsum(lengths) - lengths, lengths)
+        flat = np.repeat(np.arange(n) * width, lengths) + cols
+        source = np.repeat(starts, lengths) + cols
+
+        fill = {"input_ids": self.pad_token_id, "attention_mask": 0, "labels": -100}
+        values = {"input_ids": split.input_ids[source], "attention_mask": 1, "labels": split.labels[source]}
+        batch = {}
+        for name, array in self.arrays.items():
+            view = array[:n * width]
+            view.fill(fill[name])
+            view[flat] = values[name]
+            batch[name] = self.tensors[name][:n * width].view(n, width)
+        return batch
+
+
+def _round_up(n, multiple):
+    return -(-n // multiple) * multiple if multiple else n
+
+
+def _compile_errors():
+    """
+    Exceptions from tracing or compiling under ``torch.compile``; errors of
+    the model itself propagate as in eager mode.
+    """
+    from torch._dynamo.exc import TorchDynamoException
+    from torch._inductor.exc import CppCompileError
+
+    return TorchDynamoException, CppCompileError
+
+
+class LeanTrainer:
+    """
+    Minimal stand-in for ``transformers.Trainer`` (see module docstring).
+
+    Args:
+        model, args, train_dataset, eval_dataset, processing_class,
+        compute_metrics: As for ``Trainer``; ``processing_class`` only
+            provides the pad token id.
+        data_collator: Ignored; batches always come from ``BatchBuffers``.
+        callbacks: Must be empty.
+        compile: Run the model through ``torch.compile``.
+        pad_to_multiple_of: Batch width granularity (default 8 when
+            compiling, to limit recompilation, else no extra padding).
+    """
+
+    def __init__(self, model, args, train_dataset=None, eval_dataset=None, processing_class=None,
+                 data_collator=None, compute_metrics=None, callbacks=None, compile=False, pad_to_multiple_of=None):
+        if callbacks:
+            raise ValueError("LeanTrainer does not run TrainerCallbacks")
+        self.model = model
+        self.args = args
+        self.train_dataset = train_dataset
+        self.eval_dataset = eval_dataset
+        self.processing_class = processing_class
+        self.compute_metrics = compute_metrics
+        self.pad_token_id = getattr(processing_class, "pad_token_id", None) or 0
+        self.pad_to_multiple_of = pad_to_multiple_of or (8 if compile else 1)
+        self.state = SimpleNamespace(log_history=[], global_step=0, epoch=0.0)
+        # keyed by the dataset itself, so a freed split's id cannot alias a new one
+        self._splits = weakref.WeakKeyDictionary()
+        self._forward = model
+        if compile:
+            try:
+                self._forward = torch.compile(model, dynamic=True)
+            except Exception as e:  # no compiler backend on this platform
+                warnings.warn(f"torch.compile unavailable, training eagerly: {e}")
+        self._compiled = self._forward is not model
+
+    def _split(self, dataset):
+        if dataset not in self._splits:
+            self._splits[dataset] = FlatSplit(dataset)
+        return self._splits[dataset]
+
+    def _autocast(self):
+        if self.args.bf16:
+            return torch.autocast("cpu", dtype=torch.bfloat16)
+        return contextlib.nullcontext()
+
+    def _run(self, batch):
+        with self._autocast():
+            if self._compiled:
+                try:
+                    return self._forward(**batch)
+                except _compile_errors() as e:
+                    warnings.warn(f"torch.compile failed, falling back to eager mode: {e}")
+                    self._forward, self._compiled = self.model, False
+            return self.model(**batch)
+
+    def create_optimizer(self):
+        from transformers.trainer_pt_utils import get_parameter_names
+
+        forbidden = [r"bias", r"layernorm", r"rmsnorm", r"(?:^|\.)norm(?:$|\.)", r"_norm(?:$|\.)"]
+        decay = set(get_parameter_names(self.model, [torch.nn.LayerNorm], forbidden))
+        named = [(n, p) for n, p in self.model.named_parameters() if p.requires_grad]
+        groups = [
+            {"params": [p for n, p in named if n in decay], "weight_decay": self.args.weight_decay},
+            {"params": [p for n, p in named if n not in decay], "weight_decay": 0.0},
+        ]
+        kwargs = dict(lr=self.args.learning_rate, betas=(self.args.adam_beta1, self.args.adam_beta2),
+                      eps=self.args.adam_epsilon)
+        try:
+            return torch.optim.AdamW(groups, fused=True, **kwargs)
+        except RuntimeError:
+            return torch.optim.AdamW(groups, **kwargs)
+
+    def train(self):
+        from transformers import get_scheduler
+
+        args = self.args
+        batch_size = args.per_device_train_batch_size
+        accumulation = max(1, args.gradient_accumulation_steps)
+        streaming = hasattr(self.train_dataset, "epoch_batches")
+        if streaming:
+            split = buffers = None
+            batches_per_epoch = len(self.train_dataset)
+        else:
+            split = self._split(self.train_dataset)
+            buffers = BatchBuffers(batch_size, int(split.lengths.max()), self.pad_token_id, self.pad_to_multiple_of)
+            batches_per_epoch = (len(split) // batch_size if args.dataloader_drop_last
+                                 else math.ceil(len(split) / batch_size))
+        # optimizer steps; a last incomplete accumulation still steps, as in Trainer
+        steps_per_epoch = math.ceil(batches_per_epoch / accumulation)
+        total_steps = args.max_steps if args.max_steps > 0 else int(steps_per_epoch * args.num_train_epochs)
+        epochs = math.ceil(total_steps / steps_per_epoch)
+
+        torch.manual_seed(args.seed)
+        rng = np.random.default_rng(args.seed)
+        optimizer = self.create_optimizer()
+        scheduler = get_scheduler(args.lr_scheduler_type, optimizer,
+                                  num_warmup_steps=args.get_warmup_steps(total_steps), num_training_steps=total_steps)
+        params = [p for group in optimizer.param_groups for p in group["params"]]
+
+        self.model.train()
+        running = torch.zeros(())
+        total_loss = 0.0
+        logged_steps = 0
+        start = time.perf_counter()
+        for epoch in range(epochs):
+            if streaming:
+                batches = self.train_dataset.epoch_batches(epoch)
+            else:
+                order = rng.permutation(len(split))
+                batches = (buffers.collate(split, order[i:i + batch_size])
+                           for i in range(0, batches_per_epoch * batch_size, batch_size))
+            for micro, batch in enumerate(batches):
+                if self.state.global_step >= total_steps:
+                    break
+                group = min(accumulation, batches_per_epoch - micro // accumulation * accumulation)
+                loss = self._run(batch).loss / group
+                loss.backward()
+                running += loss.detach()
+                if (micro + 1) % accumulation and micro + 1 < batches_per_epoch:
+                    continue
+                step = micro // accumulation
+                if args.max_grad_norm:
+                    torch.nn.utils.clip_grad_norm_(params, args.max_grad_norm)
+                optimizer.step()
+                scheduler.step()
+                optimizer.zero_grad(set_to_none=True)
+                self.state.global_step += 1
+                self.state.epoch = epoch + (step + 1) / steps_per_epoch
+                if args.logging_steps and self.state.global_step % args.logging_steps == 0:
+                    steps = self.state.global_step - logged_steps
+                    total_loss += float(running)
+                    self._log({"loss": round(float(running) / steps, 4),
+                               "learning_rate": scheduler.get_last_lr()[0]})
+                    running.zero_()
+                    logged_steps = self.state.global_step
+            if args.eval_strategy == "epoch" and self.eval_dataset is not None:
+                self.evaluate()
+                self.model.train()
+        total_loss += float(running)
+        runtime = time.perf_counter() - start
+        output = {
+            "train_runtime": round(runtime, 4),
+            "train_steps_per_second": round(self.state.global_step / runtime, 3),
+            "train_loss": total_loss / max(self.state.global_step, 1),
+        }
+        self._log(output)
+        return SimpleNamespace(global_step=self.state.global_step, training_loss=output["train_loss"], metrics=output)
+
+    @torch.inference_mode()
+    def evaluate(self, eval_dataset=None, metric_key_prefix="eval"):
+        """
+        Loss and ``compute_metrics`` on a split. Sentences are batched
+        longest first; logits and labels are handed back in dataset order,
+        padded with -100 to the longest sentence as ``Trainer`` does.
+        """
+        from transformers import EvalPrediction
+
+        split = self._split(eval_dataset if eval_dataset is not None else self.eval_dataset)
+        batch_size = self.args.per_device_eval_batch_size
+        width = int(split.lengths.max())
+        buffers = BatchBuffers(batch_size, width, self.pad_token_id, self.pad_to_multiple_of)
+        predictions = None
+        label_ids = np.full((len(split), width), -100, dtype=np.int64)
+        order = np.argsort(-split.lengths, kind="stable")
+
+        self.model.eval()
+        losses = []
+        start = time.perf_counter()
+        for i in range(0, len(order), batch_size):
+            idx = order[i:i + batch_size]
+            batch = buffers.collate(split, idx)
+            outputs = self._run(batch)
+            logits = outputs.logits.float().numpy()
+            if predictions is None:
+                predictions = np.full((len(split), width, logits.shape[-1]), -100, dtype=np.float32)
+            n = min(logits.shape[1], width)
+            predictions[idx, :n] = logits[:, :n]
+            label_ids[idx, :n] = batch["labels"][:, :n].numpy()
+            losses.append(float(outputs.loss) * len(idx))
+        metrics = {"loss": sum(losses) / len(split)}
+        if self.compute_metrics is not None:
+            metrics.update(self.compute_metrics(EvalPrediction(predictions=predictions, label_ids=label_ids)))
+        metrics["runtime"] = round(time.perf_counter() - start, 4)
+        metrics = {f"{metric_key_prefix}_{key}": value for key, value in metrics.items()}
+        self._log(metrics)
+        return metrics
+
+    def _log(self, entry):
+        self.state.log_history.append(dict(entry, epoch=round(self.state.epoch, 4), step=self.state.global_step))
+
+    def save_model(self, output_dir=None):
+        output_dir = output_dir or self.args.output_dir
+        os.makedirs(output_dir, exist_ok=True)
+        self.model.save_pretrained(output_dir)
+        if self.processing_class is not None:
+            self.processing_class.save_pretrained(output_dir)
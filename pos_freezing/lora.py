@@ -0,0 +1,139 @@
+"""
+Low-rank adapters (LoRA) as a parameter-efficient alternative to freezing.
+
+``apply_lora`` freezes the whole ``distilbert`` backbone and wraps selected
+linear projections of chosen ``transformer.layer`` blocks so that only a
+rank-``r`` update ``B @ A`` (plus the classifier) is trained. After
+training, ``merge_lora`` folds the update into the frozen weights and puts
+plain ``nn.Linear`` modules back, so inference costs exactly the same as
+the original model.
+"""
+
+import math
+
+import torch
+from torch import nn
+
+# Short names accepted by ``apply_lora`` -> attribute path inside a TransformerBlock
+LORA_TARGETS = {
+    "q_lin": "attention.q_lin",
+    "k_lin": "attention.k_lin",
+    "v_lin": "attention.v_lin",
+    "out_lin": "attention.out_lin",
+    "lin1": "ffn.lin1",
+    "lin2": "ffn.lin2",
+}
+
+
+class LoRALinear(nn.Module):
+    """
+    A frozen ``nn.Linear`` plus a trainable low-rank update.
+
+    ``y = base(x) + (alpha / rank) * dropout(x) @ A^T @ B^T``, with ``B``
+    initialised to zero so training starts from the pretrained function.
+    """
+
+    def __init__(self, base, rank=8, alpha=16, dropout=0.0):
+        super().__init__()
+        if rank <= 0:
+            raise ValueError(f"LoRA rank must be positive, got {rank}")
+        self.base = base
+        self.rank = rank
+        self.scaling = alpha / rank
+        self.lora_A = nn.Parameter(torch.empty(rank, base.in_features))
+        self.lora_B = nn.Parameter(torch.zeros(base.out_features, rank))
+        self.lora_dropout = nn.Dropout(dropout) if dropout > 0 else nn.Identity()
+        nn.init.kaiming_uniform_(self.lora_A, a=math.sqrt(5))
+        for param in self.base.parameters():
+            param.requires_grad = False
+
+    def forward(self, x):
+        update = self.lora_dropout(x) @ self.lora_A.t() @ self.lora_B.t()
+        return self.base(x) + update * self.scaling
+
+    def merged(self):
+        """
+        Return a plain ``nn.Linear`` with the update folded into its weight.
+        """
+        linear = nn.Linear(self.base.in_features, self.base.out_features,
+                           bias=self.base.bias is not None,
+                           device=self.base.weight.device, dtype=self.base.weight.dtype)
+        with torch.no_grad():
+            delta = (self.lora_B @ self.lora_A) * self.scaling
+            linear.weight.copy_(self.base.weight + delta.to(self.base.weight.dtype))
+            if self.base.bias is not None:
+                linear.bias.copy_(self.base.bias)
+        linear.weight.requires_grad = False
+        if linear.bias is not None:
+            linear.bias.requires_grad = False
+        return linear
+
+
+def _get_parent(module, path):
+    *parents, name = path.split(".")
+    for parent in parents:
+        module = getattr(module, parent)
+    return module, name
+
+
+def apply_lora(model, rank=8, alpha=16, dropout=0.0, layers=None, targets=("q_lin", "v_lin")):
+    """
+    Freeze the ``distilbert`` backbone and inject LoRA adapters.
+
+    Args:
+        model: An AutoModelForTokenClassification based on DistilBERT.
+        rank: Rank of each adapter.
+        alpha: Scaling numerator; the update is multiplied by ``alpha / rank``.
+        dropout: Dropout applied to the adapter input.
+        layers: Indices of ``transformer.layer`` blocks to adapt (all by default).
+        targets: Short names from ``LORA_TARGETS`` of the projections to adapt.
+
+    Returns:
+        The list of injected ``LoRALinear`` modules.
+    """
+    unknown = [t for t in targets if t not in LORA_TARGETS]
+    if unknown:
+        raise ValueError(f"Unknown LoRA target(s): {', '.join(unknown)}")
+
+    for param in model.distilbert.parameters():
+        param.requires_grad = False
+    for param in model.classifier.parameters():
+        param.requires_grad = True
+
+    blocks = model.distilbert.transformer.layer
+    layers = range(len(blocks)) if layers is None else layers
+    adapters = []
+    for i in layers:
+        for target in targets:
+            parent, name = _get_parent(blocks[i], LORA_TARGETS[target])
+            base = getattr(parent, name)
+            if isinstance(base, LoRALinear):
+                raise ValueError(f"transformer.layer[{i}].{LORA_TARGETS[target]} already has an adapter")
+            adapter = LoRALinear(base, rank=rank, alpha=alpha, dropout=dropout)
+            setattr(parent, name, adapter)
+            adapters.append(adapter)
+    return adapters
+
+
+def merge_lora(model):
+    """
+    Fold every adapter into its base weight and restore plain ``nn.Linear``
+    modules in place. Returns the number of merged adapters.
+    """
+    merged = 0
+    for path, module in list(model.named_modules()):
+        if isinstance(module, LoRALinear):
+            parent, name = _get_parent(model, path)
+            setattr(parent, name, module.merged())
+            merged += 1
+    return merged
+
+
+def lora_state_dict(model):
+    """
+    The trainable state only (adapters and classifier), for small checkpoints.
+    """
+    return {
+        name: tensor for name, tensor in model.state_dict().items()
+        if "lora_" in name or name.startswith("classifier.")
+    }
@@ -0,0 +1,254 @@
+"""
+Memory footprint of a training run: peak RSS and live tensor bytes by
+category.
+
+``MemoryTracker`` follows one model and its optimizer and records the
+peak, over the run, of:
+
+- parameters, gradients and optimizer state (walked directly; storages are
+  counted once, so tied or viewed tensors are not double counted);
+- activations: tensors autograd saves for backward during a forward pass,
+  seen through ``torch.autograd.graph.saved_tensors_hooks`` (parameters,
+  buffers and inputs saved by reference are not counted again);
+- data: the batch tensors passed to the model plus its buffers;
+- peak RSS of the process, from the kernel's high-water mark
+  (``VmHWM``, reset at the start via ``/proc/self/clear_refs`` on Linux)
+  or a background sampler where that is unavailable.
+
+``train_strategy(..., track_memory=True)`` adds the numbers to the result
+row, with "Peak Memory (MB)" as used by ``pareto.OBJECTIVES``.
+"""
+
+import os
+import sys
+import threading
+
+import torch
+
+CATEGORIES = ("params", "grads", "optimizer", "activations", "data")
+
+
+def _storage_key(tensor):
+    try:
+        return tensor.untyped_storage().data_ptr()
+    except RuntimeError:
+        return id(tensor)
+
+
+def tensor_bytes(tensors):
+    """
+    Bytes of the distinct storages behind ``tensors``.
+    """
+    seen = {}
+    for tensor in tensors:
+        if isinstance(tensor, torch.Tensor) and tensor.device.type != "meta":
+            seen.setdefault(_storage_key(tensor), tensor.untyped_storage().nbytes())
+    return sum(seen.values())
+
+
+def current_rss():
+    """
+    Resident set size of this process in bytes (0 if unknown).
+    """
+    try:
+        with open("/proc/self/statm", "r", encoding="ascii") as f:
+            return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+    except (OSError, ValueError):
+        return 0
+
+
+def _reset_peak_rss():
+    try:
+        with open("/proc/self/clear_refs", "w", encoding="ascii") as f:
+            f.write("5")
+        return True
+    except OSError:
+        return False
+
+
+def _kernel_peak_rss():
+    try:
+        with open("/proc/self/status", "r", encoding="ascii") as f:
+            for line in f:
+                if line.startswith("VmHWM:"):
+                    return int(line.split()[1]) * 1024
+    except (OSError, ValueError):
+        pass
+    return None
+
+
+class MemoryTracker:
+    """
+    Peak tensor bytes per category and peak RSS over a training run.
+
+    Call ``start`` before training, ``observe(optimizer=...)`` at points
+    where gradients and optimizer state are live (the ``Trainer`` callback
+    does this before and after each optimizer step) and ``stop`` at the end.
+
+    Args:
+        model: The model being trained.
+        sample_interval: Seconds between RSS samples when the kernel
+            high-water mark cannot be reset.
+    """
+
+    def __init__(self, model, sample_interval=0.01):
+        self.model = model
+        self.sample_interval = sample_interval
+        self.peak = dict.fromkeys(CATEGORIES, 0)
+        self.peak_rss = 0
+        self._handles = []
+        self._hooks = None
+        self._saved = {}
+        self._param_keys = set()
+        self._input_keys = set()
+        self._sampler = None
+        self._stop = threading.Event()
+        self._kernel_hwm = False
+
+    # run boundaries
+
+    def start(self):
+        self._kernel_hwm = _reset_peak_rss() and _kernel_peak_rss() is not None
+        if not self._kernel_hwm:
+            self._stop.clear()
+            self._sampler = threading.Thread(target=self._sample_rss, daemon=True)
+            self._sampler.start()
+        self._handles = [
+            self.model.register_forward_pre_hook(self._forward_start, with_kwargs=True),
+            self.model.register_forward_hook(self._forward_end),
+        ]
+        self.observe()
+        return self
+
+    def stop(self):
+        for handle in self._handles:
+            handle.remove()
+        self._handles = []
+        if self._hooks is not None:
+            self._hooks.__exit__(None, None, None)
+            self._hooks = None
+        if self._sampler is not None:
+            self._stop.set()
+            self._sampler.join()
+            self._sampler = None
+        self._update_rss()
+        return self.summary()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc):
+        self.stop()
+
+    # measurements
+
+    def _sample_rss(self):
+        while not self._stop.wait(self.sample_interval):
+            self.peak_rss = max(self.peak_rss, current_rss())
+
+    def _update_rss(self):
+        if self._kernel_hwm:
+            self.peak_rss = max(self.peak_rss, _kernel_peak_rss() or 0)
+        else:
+            self.peak_rss = max(self.peak_rss, current_rss())
+            if sys.platform != "win32" and not self.peak_rss:
+                import resource
+
+                # ru_maxrss is in kB on Linux; last resort, covers the whole process lifetime
+                self.peak_rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * 1024
+
+    def _record(self, category, nbytes):
+        self.peak[category] = max(self.peak[category], nbytes)
+
+    def observe(self, optimizer=None):
+        """
+        Record current parameter, gradient and optimizer-state bytes.
+        """
+        params = list(self.model.parameters())
+        self._param_keys = {_storage_key(t) for t in params + list(self.model.buffers())}
+        self._record("params", tensor_bytes(params))
+        self._record("grads", tensor_bytes(p.grad for p in params if p.grad is not None))
+        if optimizer is not None:
+            state = getattr(optimizer, "state", {})
+            self._record("optimizer", tensor_bytes(
+                value for param_state in state.values() for value in param_state.values()
+                if isinstance(value, torch.Tensor)
+            ))
+        self._update_rss()
+
+    def _forward_start(self, module, args, kwargs):
+        inputs = [t for t in list(args) + list(kwargs.values()) if isinstance(t, torch.Tensor)]
+        self._input_keys = {_storage_key(t) for t in inputs}
+        self._record("data", tensor_bytes(inputs) + tensor_bytes(self.model.buffers()))
+        if torch.is_grad_enabled() and self.model.training and self._hooks is None:
+            self._saved = {}
+            self._hooks = torch.autograd.graph.saved_tensors_hooks(self._pack, self._unpack)
+            self._hooks.__enter__()
+
+    def _forward_end(self, module, args, output):
+        if self._hooks is not None:
+            self._hooks.__exit__(None, None, None)
+            self._hooks = None
+            self._record("activations", sum(self._saved.values()))
+            self._saved = {}
+
+    def _pack(self, tensor):
+        key = _storage_key(tensor)
+        if key not in self._param_keys and key not in self._input_keys:
+            self._saved.setdefault(key, tensor.untyped_storage().nbytes())
+        return tensor
+
+    @staticmethod
+    def _unpack(tensor):
+        return tensor
+
+    def summary(self):
+        """
+        Peaks in MB, keyed as result-table columns.
+        """
+        def mb(n):
+            return round(n / 2**20, 1)
+
+        return {
+            "Peak Memory (MB)": mb(self.peak_rss),
+            "Params (MB)": mb(self.peak["params"]),
+            "Grads (MB)": mb(self.peak["grads"]),
+            "Optimizer State (MB)": mb(self.peak["optimizer"]),
+            "Activations (MB)": mb(self.peak["activations"]),
+            "Data (MB)": mb(self.peak["data"]),
+        }
+
+
+def _memory_callback_class():
+    from transformers import TrainerCallback
+
+    class MemoryCallback(TrainerCallback):
+        """
+        Runs a ``MemoryTracker`` over ``Trainer.train()``.
+        """
+
+        def __init__(self):
+            self.tracker = None
+            self.summary = None
+
+        def on_train_begin(self, args, state, control, model=None, **kwargs):
+            self.tracker = MemoryTracker(model).start()
+
+        def on_pre_optimizer_step(self, args, state, control, optimizer=None, **kwargs):
+            self.tracker.observe(optimizer)
+
+        def on_optimizer_step(self, args, state, control, optimizer=None, **kwargs):
+            self.tracker.observe(optimizer)
+
+        def on_train_end(self, args, state, control, **kwargs):
+            self.summary = self.tracker.stop()
+
+    return MemoryCallback
+
+
+def memory_callback():
+    """
+    A ``TrainerCallback`` whose ``summary`` holds ``MemoryTracker.summary()``
+    once training ends.
+    """
+    return _memory_callback_class()()
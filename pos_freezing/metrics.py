@@ -0,0 +1,85 @@
+"""
+Evaluation metrics shared by every training run.
+"""
+
+import numpy as np
+
+
+def compute_metrics(p):
+    """
+    Token accuracy over positions whose label is not -100.
+
+    Accepts the ``EvalPrediction`` passed in by ``Trainer``.
+    """
+    preds = np.argmax(p.predictions, axis=2)
+    labels = p.label_ids
+    # only consider non -100 labels
+    mask = labels != -100
+    acc = (preds[mask] == labels[mask]).astype(np.float32).mean().item()
+    return {"accuracy": acc}
+
+
+def evaluate_accuracy(model, dataset, tokenizer, batch_size=32):
+    """
+    Token accuracy of ``model`` on a tokenized split without ``Trainer``.
+
+    Gives the same number as ``compute_metrics`` on ``Trainer.evaluate``
+    output, but counts correct labels batch by batch instead of keeping all
+    logits.
+    """
+    import torch
+    from transformers import DataCollatorForTokenClassification
+
+    from .precision import autocast_for
+
+    data_collator = DataCollatorForTokenClassification(tokenizer, return_tensors="pt")
+    was_training = model.training
+    model.eval()
+    correct = total = 0
+    with torch.inference_mode(), autocast_for(model):
+        for start in range(0, len(dataset), batch_size):
+            rows = dataset[start:start + batch_size]
+            batch = data_collator([
+                {"input_ids": ids, "labels": labels} for ids, labels in zip(rows["input_ids"], rows["labels"])
+            ])
+            preds = model(input_ids=batch["input_ids"], attention_mask=batch["attention_mask"]).logits.argmax(-1)
+            mask = batch["labels"] != -100
+            correct += int((preds[mask] == batch["labels"][mask]).sum())
+            total += int(mask.sum())
+    model.train(was_training)
+    return {"accuracy": correct / total if total else 0.0}
+
+
+def token_correctness(model, dataset, tokenizer, batch_size=32):
+    """
+    Whether each labelled token of a split is tagged correctly.
+
+    Returns:
+        (correct, offsets): a bool array over labelled tokens in dataset
+        order, and int64 offsets so that sentence ``i`` owns
+        ``correct[offsets[i]:offsets[i + 1]]``. ``correct.mean()`` is the
+        ``evaluate_accuracy`` accuracy.
+    """
+    import torch
+    from transformers import DataCollatorForTokenClassification
+
+    from .precision import autocast_for
+
+    data_collator = DataCollatorForTokenClassification(tokenizer, return_tensors="pt")
+    was_training = model.training
+    model.eval()
+    correct, counts = [], []
+    with torch.inference_mode(), autocast_for(model):
+        for start in range(0, len(dataset), batch_size):
+            rows = dataset[start:start + batch_size]
+            batch = data_collator([
+                {"input_ids": ids, "labels": labels} for ids, labels in zip(rows["input_ids"], rows["labels"])
+            ])
+            preds = model(input_ids=batch["input_ids"], attention_mask=batch["attention_mask"]).logits.argmax(-1)
+            mask = batch["labels"] != -100
+            correct.append((preds[mask] == batch["labels"][mask]).numpy())
+            counts.append(mask.sum(-1).numpy())
+    model.train(was_training)
+    counts = np.concatenate(counts) if counts else np.zeros(0, dtype=np.int64)
+    offsets = np.concatenate([[0], np.cumsum(counts)]).astype(np.int64)
+    return (np.concatenate(correct) if correct else np.zeros(0, dtype=bool)), offsets
@@ -0,0 +1,253 @@
+"""
+A compact on-disk format for tokenized splits.
+
+A split is stored as a directory of flat arrays:
+
+- ``input_ids.npy``: int32, every sentence's subword ids back to back;
+- ``labels.npy``: int8, the aligned UPOS ids (-100 for ignored positions);
+- ``offsets.npy``: int64, sentence ``i`` owns ``offsets[i]:offsets[i + 1]``;
+- ``meta.json``: counts plus whatever identifies the source (CoNLL-U
+  digest, tokenizer digest, tag map, alignment options);
+- ``hashes.npy``: a hash per sentence, used by ``incremental.update_packed``
+  to find new or changed sentences.
+
+``PackedDataset`` memory-maps the arrays read-only, so opening a split costs
+milliseconds regardless of its size, sentences are zero-copy views, and
+worker processes share the same pages (pickling sends only the directory).
+It indexes like a ``datasets.Dataset`` of ``input_ids``/``labels`` rows, so
+it can be passed wherever ``train_tok``/``dev_tok`` are used, and
+``collate`` pads a batch of indices straight from the flat arrays.
+
+    train_tok = load_or_pack("en_ewt-ud-train.conllu", tokenizer, tag2id, "cache/train")
+"""
+
+import hashlib
+import json
+import os
+
+import numpy as np
+
+FORMAT_VERSION = 1
+HASHES_FILE = "hashes.npy"
+
+
+def _flat_column(dataset, name):
+    """
+    (values, offsets) of a list column, without a Python loop for Arrow
+    backed datasets.
+    """
+    if getattr(dataset, "_indices", None) is not None:
+        # select/shuffle/filter leave an index mapping over the full table
+        dataset = dataset.flatten_indices()
+    table = getattr(getattr(dataset, "data", None), "table", None)
+    if table is not None:
+        column = table.column(name).combine_chunks()
+        offsets = column.offsets.to_numpy().astype(np.int64)
+        values = column.values.to_numpy()[offsets[0]:offsets[-1]]
+        return values, offsets - offsets[0]
+    rows = dataset[name]
+    offsets = np.concatenate([[0], np.cumsum([len(row) for row in rows])]).astype(np.int64)
+    values = np.concatenate([np.asarray(row) for row in rows]) if len(rows) else np.zeros(0)
+    return values, offsets
+
+
+def write_packed(dataset, directory, meta=None):
+    """
+    Write a tokenized split (``input_ids`` and ``labels`` columns) to
+    ``directory`` and return it opened as a ``PackedDataset``.
+    """
+    input_ids, offsets = _flat_column(dataset, "input_ids")
+    labels, label_offsets = _flat_column(dataset, "labels")
+    if not np.array_equal(offsets, label_offsets):
+        raise ValueError("input_ids and labels differ in length")
+    return write_packed_arrays(input_ids, labels, offsets, directory, meta)
+
+
+def write_packed_arrays(input_ids, labels, offsets, directory, meta=None):
+    """
+    ``write_packed`` for flat arrays that are already concatenated.
+    """
+    if len(labels) and (labels.max() > 127 or labels.min() < -128):
+        raise ValueError("labels do not fit in int8")
+
+    os.makedirs(directory, exist_ok=True)
+    np.save(os.path.join(directory, "input_ids.npy"), input_ids.astype(np.int32))
+    np.save(os.path.join(directory, "labels.npy"), labels.astype(np.int8))
+    np.save(os.path.join(directory, "offsets.npy"), offsets)
+    info = {"format_version": FORMAT_VERSION, "n_sentences": len(offsets) - 1, "n_tokens": int(offsets[-1])}
+    info.update(meta or {})
+    with open(os.path.join(directory, "meta.json"), "w", encoding="utf-8") as f:
+        json.dump(info, f, indent=2)
+    return PackedDataset(directory)
+
+
+class PackedDataset:
+    """
+    Read-only, memory-mapped view of a split written by ``write_packed``.
+
+    Indexing follows ``datasets.Dataset``: an integer gives a row dict of
+    array views, a slice or list of indices gives a dict of lists, and a
+    column name gives the list of all rows' arrays.
+    """
+
+    columns = ("input_ids", "labels")
+
+    def __init__(self, directory):
+        self.directory = directory
+        self.input_ids = np.load(os.path.join(directory, "input_ids.npy"), mmap_mode="r")
+        self.labels = np.load(os.path.join(directory, "labels.npy"), mmap_mode="r")
+        self.offsets = np.load(os.path.join(directory, "offsets.npy"))
+        with open(os.path.join(directory, "meta.json"), "r", encoding="utf-8") as f:
+            self.meta = json.load(f)
+
+    def __getstate__(self):
+        return {"directory": self.directory}
+
+    def __setstate__(self, state):
+        self.__init__(state["directory"])
+
+    def __len__(self):
+        return len(self.offsets) - 1
+
+    @property
+    def lengths(self):
+        return np.diff(self.offsets)
+
+    def row(self, i):
+        start, end = self.offsets[i], self.offsets[i + 1]
+        return {"input_ids": self.input_ids[start:end], "labels": self.labels[start:end]}
+
+    def __getitem__(self, key):
+        if isinstance(key, str):
+            if key not in self.columns:
+                raise KeyError(key)
+            flat = getattr(self, key)
+            return [flat[self.offsets[i]:self.offsets[i + 1]] for i in range(len(self))]
+        if isinstance(key, slice):
+            key = range(*key.indices(len(self)))
+        elif not hasattr(key, "__len__"):
+            return self.row(int(key))
+        rows = [self.row(int(i)) for i in key]
+        return {name: [row[name] for row in rows] for name in self.columns}
+
+    def __iter__(self):
+        for i in range(len(self)):
+            yield self.row(i)
+
+    def collate(self, indices, pad_token_id=0):
+        """
+        Padded ``input_ids``/``attention_mask``/``labels`` tensors for the
+        given sentence indices, gathered from the flat arrays in one step.
+        """
+        import torch
+
+        indices = np.asarray(indices, dtype=np.int64)
+        starts = self.offsets[indices]
+        lengths = self.offsets[indices + 1] - starts
+        width = int(lengths.max()) if len(lengths) else 0
+        rows = np.repeat(np.arange(len(indices)), lengths)
+        cols = np.arange(int(lengths.sum())) - np.repeat(np.cumsum(lengths) - lengths, lengths)
+        source = np.repeat(starts, lengths) + cols
+
+        input_ids = np.full((len(indices), width), pad_token_id, dtype=np.int64)
+        labels = np.full((len(indices), width), -100, dtype=np.int64)
+        attention_mask = np.zeros((len(indices), width), dtype=np.int64)
+        input_ids[rows, cols] = self.input_ids[source]
+        labels[rows, cols] = self.labels[source]
+        attention_mask[rows, cols] = 1
+        return {
+            "input_ids": torch.from_numpy(input_ids),
+            "attention_mask": torch.from_numpy(attention_mask),
+            "labels": torch.from_numpy(labels),
+        }
+
+
+class PackedCollator:
+    """
+    ``Trainer`` data collator for rows of a ``PackedDataset``: pads the
+    array views without going through the tokenizer.
+    """
+
+    def __init__(self, pad_token_id=0):
+        self.pad_token_id = pad_token_id
+
+    def __call__(self, features):
+        import torch
+
+        width = max(len(f["input_ids"]) for f in features)
+        input_ids = torch.full((len(features), width), self.pad_token_id, dtype=torch.long)
+        labels = torch.full((len(features), width), -100, dtype=torch.long)
+        attention_mask = torch.zeros((len(features), width), dtype=torch.long)
+        for i, f in enumerate(features):
+            n = len(f["input_ids"])
+            input_ids[i, :n] = torch.from_numpy(np.asarray(f["input_ids"], dtype=np.int64))
+            labels[i, :n] = torch.from_numpy(np.asarray(f["labels"], dtype=np.int64))
+            attention_mask[i, :n] = 1
+        return {"input_ids": input_ids, "attention_mask": attention_mask, "labels": labels}
+
+
+def file_digest(path, chunk_size=1 << 20):
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(chunk_size), b""):
+            digest.update(chunk)
+    return digest.hexdigest()[:16]
+
+
+def tokenizer_digest(tokenizer):
+    return hashlib.sha256(tokenizer.backend_tokenizer.to_str().encode("utf-8")).hexdigest()[:16]
+
+
+def sentence_hashes(sentences):
+    """
+    A uint64 hash of every (tokens, upos) pair.
+    """
+    hashes = np.empty(len(sentences), dtype=np.uint64)
+    for i, (tokens, upos) in enumerate(sentences):
+        text = "\x1f".join(tokens) + "\x1e" + "\x1f".join(str(tag) for tag in upos)
+        hashes[i] = int.from_bytes(hashlib.blake2b(text.encode("utf-8"), digest_size=8).digest(), "little")
+    return hashes
+
+
+def pack_conllu(conllu_path, tokenizer, tag2id, directory, **kwargs):
+    """
+    Parse, tokenize and align a CoNLL-U file once and write it packed.
+    Keyword arguments go to ``data.tokenize_split``.
+    """
+    from .data import load_conllu_sentences, tokenize_split
+
+    sentences = load_conllu_sentences(conllu_path)
+    dataset = tokenize_split(sentences, tokenizer, tag2id, **kwargs)
+    packed = write_packed(dataset, directory, meta=_source_meta(conllu_path, tokenizer, tag2id, kwargs))
+    hashes_path = os.path.join(directory, HASHES_FILE)
+    if kwargs.get("stride") is None:
+        # per-sentence identity for incremental.update_packed
+        np.save(hashes_path, sentence_hashes(sentences))
+    elif os.path.exists(hashes_path):
+        os.remove(hashes_path)
+    return packed
+
+
+def _source_meta(conllu_path, tokenizer, tag2id, kwargs):
+    return {
+        "source": os.path.basename(conllu_path),
+        "source_digest": file_digest(conllu_path),
+        "tokenizer_digest": tokenizer_digest(tokenizer),
+        "tag2id": tag2id,
+        "options": {key: kwargs[key] for key in sorted(kwargs)},
+    }
+
+
+def load_or_pack(conllu_path, tokenizer, tag2id, directory, **kwargs):
+    """
+    Open the packed split in ``directory`` if it was built from the same
+    file, tokenizer, tag map and options; otherwise (re)build it.
+    """
+    meta_path = os.path.join(directory, "meta.json")
+    if os.path.exists(meta_path):
+        with open(meta_path, "r", encoding="utf-8") as f:
+            meta = json.load(f)
+        expected = json.loads(json.dumps(_source_meta(conllu_path, tokenizer, tag2id, kwargs)))
+        if meta.get("format_version") == FORMAT_VERSION and all(meta.get(k) == v for k, v in expected.items()):
+            return PackedDataset(directory)
+    return pack_conllu(conllu_path, tokenizer, tag2id, directory, **kwargs)
@@ -0,0 +1,158 @@
+"""
+Pareto analysis of measured runs.
+
+Rows come from ``sweep.run_sweep``, ``search.search`` or
+``ResultsStore.rows`` (any number of strategies, searches and treebanks).
+Each objective is a row column with a direction; a row is on the front when
+no other row of its group is at least as good on every objective and
+strictly better on one. Dominance is computed with array operations in
+chunks, so hundreds or thousands of configurations are cheap.
+
+    df = pareto_table(store.rows(), group_by="Treebank")
+    df[df["Pareto Optimal"]]
+    plot_fronts(df)
+
+Objectives missing from every row (e.g. peak memory for runs that did not
+record it) are dropped; rows missing a value of a remaining objective are
+left out of the analysis.
+"""
+
+import numpy as np
+
+# Column -> "max" or "min"
+OBJECTIVES = {
+    "Dev Accuracy (%)": "max",
+    "Training Time (s)": "min",
+    "Peak Memory (MB)": "min",
+    "Inference Tokens/s": "max",
+}
+
+
+def _frame(rows):
+    import pandas as pd
+
+    return rows.copy() if isinstance(rows, pd.DataFrame) else pd.DataFrame(list(rows))
+
+
+def available_objectives(df, objectives=None):
+    """
+    The objectives that have at least one value in ``df``.
+    """
+    objectives = objectives or OBJECTIVES
+    return {col: sense for col, sense in objectives.items() if col in df and df[col].notna().any()}
+
+
+def objective_matrix(df, objectives):
+    """
+    ``(n_rows, n_objectives)`` float array in which lower is better.
+    """
+    values = df[list(objectives)].to_numpy(dtype=np.float64)
+    signs = np.array([-1.0 if sense == "max" else 1.0 for sense in objectives.values()])
+    return values * signs
+
+
+def dominated(points, chunk_size=1024):
+    """
+    Boolean mask of rows of ``points`` (lower is better) dominated by some
+    other row.
+    """
+    n = len(points)
+    mask = np.zeros(n, dtype=bool)
+    for start in range(0, n, chunk_size):
+        block = points[start:start + chunk_size, None, :]  # (b, 1, m)
+        no_worse = (points[None, :, :] <= block).all(-1)  # (b, n)
+        better = (points[None, :, :] < block).any(-1)
+        mask[start:start + chunk_size] = (no_worse & better).any(-1)
+    return mask
+
+
+def pareto_ranks(points):
+    """
+    Non-dominated sorting: rank 0 is the front, rank 1 the front of the
+    rest, and so on.
+    """
+    ranks = np.full(len(points), -1, dtype=np.int64)
+    remaining = np.arange(len(points))
+    rank = 0
+    while len(remaining):
+        is_dominated = dominated(points[remaining])
+        ranks[remaining[~is_dominated]] = rank
+        remaining = remaining[is_dominated]
+        rank += 1
+    return ranks
+
+
+def pareto_table(rows, objectives=None, group_by=None):
+    """
+    DataFrame of ``rows`` with "Pareto Rank" and "Pareto Optimal" columns,
+    computed separately per ``group_by`` value (e.g. "Treebank") if given.
+    Rows without every objective get rank -1.
+    """
+    df = _frame(rows).reset_index(drop=True)
+    objectives = available_objectives(df, objectives)
+    if not objectives:
+        raise ValueError("None of the objectives appear in the rows")
+
+    df["Pareto Rank"] = -1
+    complete = df[list(objectives)].notna().all(axis=1)
+    groups = df[complete].groupby(group_by, dropna=False) if group_by else [(None, df[complete])]
+    for _, group in groups:
+        df.loc[group.index, "Pareto Rank"] = pareto_ranks(objective_matrix(group, objectives))
+    df["Pareto Optimal"] = df["Pareto Rank"] == 0
+    return df
+
+
+def pareto_front(rows, objectives=None, group_by=None):
+    """
+    The non-dominated rows, as a list of row dicts sorted by the first
+    cost (minimized) objective.
+    """
+    df = pareto_table(rows, objectives, group_by)
+    objectives = available_objectives(df, objectives)
+    costs = [col for col, sense in objectives.items() if sense == "min"]
+    front = df[df["Pareto Optimal"]]
+    if costs:
+        front = front.sort_values(costs[0])
+    return front.drop(columns=["Pareto Rank", "Pareto Optimal"]).to_dict("records")
+
+
+def plot_fronts(rows, objectives=None, group_by=None, y="Dev Accuracy (%)", label="Strategy"):
+    """
+    One panel per other objective, plotting ``y`` against it. All runs are
+    drawn faintly, the front (over all objectives) in colour per group, and
+    the two-objective front of each panel as a step line. Front points are
+    labelled with ``label`` when there are few of them.
+    """
+    import matplotlib.pyplot as plt
+    import seaborn as sns
+
+    df = rows if "Pareto Optimal" in getattr(rows, "columns", ()) else pareto_table(rows, objectives, group_by)
+    objectives = available_objectives(df, objectives)
+    others = [col for col in objectives if col != y]
+    groups = list(df.groupby(group_by, dropna=False)) if group_by else [(None, df)]
+    palette = sns.color_palette("Dark2", n_colors=max(1, len(groups)))
+
+    fig, axes = plt.subplots(1, len(others), figsize=(5 * len(others), 4), squeeze=False)
+    for ax, x in zip(axes[0], others):
+        for (name, group), color in zip(groups, palette):
+            group = group[group[[x, y]].notna().all(axis=1)]
+            ax.scatter(group[x], group[y], s=12, color=color, alpha=0.25)
+            front = group[group["Pareto Optimal"]]
+            ax.scatter(front[x], front[y], s=50, color=color, label=None if name is None else str(name))
+            pair = {x: objectives[x], y: objectives[y]}
+            staircase = group.loc[~dominated(objective_matrix(group, pair))].sort_values(x)
+            ax.step(staircase[x], staircase[y], where="post", color=color, linewidth=1)
+            if label in front and len(front) <= 12:
+                for _, row in front.iterrows():
+                    ax.annotate(str(row[label]), (row[x], row[y]), fontsize=7,
+                                xytext=(3, 3), textcoords="offset points")
+        ax.set_xlabel(x)
+        ax.set_ylabel(y)
+        ax.grid(True, linestyle='--', alpha=0.5)
+        ax.spines['top'].set_visible(False)
+        ax.spines['right'].set_visible(False)
+    if group_by:
+        axes[0][-1].legend(title=group_by, bbox_to_anchor=(1.05, 1), loc='upper left')
+    fig.suptitle("Pareto Front of Freezing Configurations")
+    fig.tight_layout()
+    return fig
@@ -0,0 +1,85 @@
+"""
+bfloat16 mixed-precision training on CPU for partially frozen models.
+
+Frozen weights never receive updates, so they do not need fp32 master
+copies: ``store_frozen_in_bf16`` converts the weights of frozen ``Linear``
+and ``Embedding`` modules to bfloat16 permanently, halving their memory.
+Trainable tensors stay fp32 and act as master weights, and the forward and
+backward passes run under ``torch.autocast("cpu", dtype=torch.bfloat16)``
+(``bf16=True`` in ``TrainingArguments``). LayerNorm parameters stay in
+fp32 because CPU LayerNorm kernels do not accept bf16 parameters with fp32
+input, and they are negligible in size.
+"""
+
+import contextlib
+
+import torch
+from torch import nn
+
+PRECISIONS = ("fp32", "bf16")
+
+
+def store_frozen_in_bf16(model):
+    """
+    Convert frozen ``Linear``/``Embedding`` weights to bfloat16 in place.
+
+    Returns:
+        The number of bytes saved.
+    """
+    saved = 0
+    for module in model.modules():
+        if not isinstance(module, (nn.Linear, nn.Embedding)):
+            continue
+        for param in module.parameters(recurse=False):
+            if not param.requires_grad and param.dtype == torch.float32:
+                param.data = param.data.to(torch.bfloat16)
+                saved += param.numel() * 2
+    return saved
+
+
+def parameter_bytes(model):
+    """
+    Bytes held by the model's parameters, in their current dtypes.
+    """
+    return sum(p.numel() * p.element_size() for p in model.parameters())
+
+
+def uses_bf16(model):
+    return any(p.dtype == torch.bfloat16 for p in model.parameters())
+
+
+def autocast_for(model):
+    """
+    A CPU bf16 autocast context if the model holds bf16 weights, otherwise a
+    no-op, for running such a model outside ``Trainer``.
+    """
+    if uses_bf16(model):
+        return torch.autocast("cpu", dtype=torch.bfloat16)
+    return contextlib.nullcontext()
+
+
+def precision_deltas(rows):
+    """
+    Compare bf16 rows against the fp32 row of the same strategy.
+
+    Returns:
+        A DataFrame with, per strategy, the accuracy difference in points and
+        the training and inference tokens/s speed-ups of bf16 over fp32.
+    """
+    import pandas as pd
+
+    df = pd.DataFrame(rows)
+    fp32 = df[df["Precision"] == "fp32"].set_index("Strategy")
+    bf16 = df[df["Precision"] == "bf16"].set_index("Strategy")
+    common = [s for s in bf16.index if s in fp32.index]
+    return pd.DataFrame({
+        "Strategy": common,
+        "Accuracy Delta (pts)": [round(bf16.at[s, "Dev Accuracy (%)"] - fp32.at[s, "Dev Accuracy (%)"], 2)
+                                 for s in common],
+        "Train Speed-up (x)": [round(bf16.at[s, "Train Tokens/s"] / fp32.at[s, "Train Tokens/s"], 2)
+                               for s in common],
+        "Inference Speed-up (x)": [round(bf16.at[s, "Inference Tokens/s"] / fp32.at[s, "Inference Tokens/s"], 2)
+                                   for s in common],
+        "Param Memory Saved (MB)": [round(fp32.at[s, "Param Memory (MB)"] - bf16.at[s, "Param Memory (MB)"], 1)
+                                    for s in common],
+    })
@@ -0,0 +1,300 @@
+"""
+Reading and tokenizing CoNLL-U shards in background processes while the
+model trains.
+
+``PrefetchPipeline`` starts ``workers`` spawned processes that take shards
+from a task queue, parse them, apply an optional ``transform`` (e.g.
+augmentation that rewrites sentences; it must keep their number), then
+tokenize, align and pad ``batch_size`` sentences at a time into numpy
+arrays and put them on a shared output queue. The main process only turns
+arrays into tensors.
+
+The queue is bounded by credits: a worker takes one before putting a
+batch, and the consumer returns one per batch it takes, so at most
+``depth`` batches are buffered. Every ``adapt_every`` batches the depth is
+doubled (up to ``max_depth``) if the consumer stalled for more than
+``stall_threshold`` of that window, and lowered by one (down to
+``min_depth``) if it never waited. A deeper queue absorbs bursts such as a
+long-sentence shard. It cannot fix a pipeline that is slower on average:
+``stats()`` reports the time the consumer spent waiting ("stall") against
+the time it spent working, and the workers' total encoding time. A stall
+fraction that stays high means training is input-bound and needs more
+workers.
+
+Batches of different workers interleave, so the batch order is not
+reproducible run to run, even though each shard's sentence order is.
+
+    with PrefetchPipeline(shards, tokenizer, tag2id, batch_size=16, workers=2) as pipeline:
+        LeanTrainer(model, args, pipeline, dev_tok, tokenizer, compute_metrics=compute_metrics).train()
+        pipeline.stats()
+"""
+
+import contextlib
+import math
+import multiprocessing
+import queue
+import time
+import traceback
+
+import numpy as np
+
+
+def count_sentences(path):
+    """
+    Sentences in a CoNLL-U file (lines of a word with ID 1).
+    """
+    with open(path, "r", encoding="utf-8") as f:
+        return sum(1 for line in f if line.startswith("1\t"))
+
+
+def encode_batch(sentences, tokenizer, tag2id, max_length=128, label_all_tokens=False):
+    """
+    Padded ``input_ids``/``attention_mask``/``labels`` int64 arrays for a
+    list of (tokens, upos) pairs, aligned as in ``tokenize_and_align_batch``.
+    """
+    from .alignment import align_labels, batch_word_ids, word_label_matrix
+
+    encoded = tokenizer([tokens for tokens, _ in sentences], is_split_into_words=True, truncation=True,
+                        max_length=max_length, padding=True, return_tensors="np")
+    labels = align_labels(batch_word_ids(encoded), word_label_matrix([upos for _, upos in sentences], tag2id),
+                          label_all_tokens)
+    return {
+        "input_ids": encoded["input_ids"].astype(np.int64),
+        "attention_mask": encoded["attention_mask"].astype(np.int64),
+        "labels": labels.astype(np.int64),
+    }
+
+
+def _worker(tasks, out, credits, tokenizer, tag2id, batch_size, max_length, label_all_tokens, shuffle,
+            transform, seed, threads):
+    from .data import load_conllu_sentences
+
+    if threads:
+        import torch
+
+        torch.set_num_threads(threads)
+    while (task := tasks.get()) is not None:
+        epoch, shard_idx, path = task
+        try:
+            sentences = load_conllu_sentences(path)
+            if transform is not None:
+                n_sentences = len(sentences)
+                sentences = transform(sentences)
+                if len(sentences) != n_sentences:
+                    # len(pipeline), and with it the LR schedule, is counted before the workers run
+                    raise ValueError(f"transform returned {len(sentences)} sentences for {n_sentences}")
+            order = np.arange(len(sentences))
+            if shuffle:
+                order = np.random.default_rng((seed, epoch, shard_idx)).permutation(len(sentences))
+            for start in range(0, len(order), batch_size):
+                begin = time.perf_counter()
+                batch = encode_batch([sentences[i] for i in order[start:start + batch_size]],
+                                     tokenizer, tag2id, max_length, label_all_tokens)
+                elapsed = time.perf_counter() - begin
+                credits.acquire()
+                out.put(("batch", epoch, (batch, elapsed)))
+        except Exception:
+            out.put(("error", epoch, f"{path}:\n{traceback.format_exc()}"))
+        out.put(("done", epoch, shard_idx))
+
+
+class PrefetchPipeline:
+    """
+    Background CoNLL-U reading, tokenization and collation (see module
+    docstring).
+
+    Args:
+        shards: CoNLL-U paths; each epoch visits all of them.
+        tokenizer, tag2id: As for ``data.tokenize_split``.
+        workers: Worker processes.
+        depth: Initial number of buffered batches.
+        min_depth, max_depth: Bounds of the adaptive depth.
+        adapt_every: Batches between depth adjustments.
+        stall_threshold: Stall fraction above which the depth grows.
+        transform: Picklable ``f(sentences) -> sentences`` run in the
+            workers on every shard, e.g. augmentation. It must return as
+            many sentences as it gets, since ``len()`` counts batches from
+            the files; a worker fails the epoch otherwise.
+        threads: torch threads per worker (default 1).
+    """
+
+    def __init__(self, shards, tokenizer, tag2id, batch_size=16, workers=2, depth=4, min_depth=2, max_depth=64,
+                 adapt_every=20, stall_threshold=0.05, max_length=128, label_all_tokens=False, shuffle=True,
+                 transform=None, seed=42, threads=1):
+        self.shards = list(shards)
+        self.tokenizer = tokenizer
+        self.tag2id = tag2id
+        self.batch_size = batch_size
+        self.workers = workers
+        self.depth = depth
+        self.min_depth = min_depth
+        self.max_depth = max_depth
+        self.adapt_every = adapt_every
+        self.stall_threshold = stall_threshold
+        self.max_length = max_length
+        self.label_all_tokens = label_all_tokens
+        self.shuffle = shuffle
+        self.transform = transform
+        self.seed = seed
+        self.threads = threads
+        self.n_batches = sum(math.ceil(count_sentences(path) / batch_size) for path in self.shards)
+        self._processes = []
+        self._epoch = 0
+        self.reset_stats()
+
+    def reset_stats(self):
+        self._stats = {"batches": 0, "startup_s": 0.0, "stall_s": 0.0, "compute_s": 0.0, "producer_s": 0.0,
+                       "stalls": 0}
+        self._window = [0, 0.0, 0.0]  # batches, stall, compute
+        self._window_stalls = 0
+        self._warm = False
+        self.depth_history = [self.depth]
+
+    def __len__(self):
+        return self.n_batches
+
+    def start(self):
+        if self._processes:
+            return self
+        context = multiprocessing.get_context("spawn")
+        self._tasks = context.Queue()
+        self._out = context.Queue()
+        self._credits = context.Semaphore(self.depth)
+        self._debt = 0
+        self._processes = [
+            context.Process(target=_worker, daemon=True, args=(
+                self._tasks, self._out, self._credits, self.tokenizer, self.tag2id, self.batch_size,
+                self.max_length, self.label_all_tokens, self.shuffle, self.transform, self.seed, self.threads))
+            for _ in range(self.workers)
+        ]
+        for process in self._processes:
+            process.start()
+        return self
+
+    def close(self):
+        if not self._processes:
+            return
+        # drop shards not started yet, then wake workers blocked on a credit
+        with contextlib.suppress(queue.Empty):
+            while True:
+                self._tasks.get_nowait()
+        for _ in self._processes:
+            self._tasks.put(None)
+        for _ in range(self.max_depth * len(self._processes)):
+            self._credits.release()
+        # a worker cannot exit while its queued output is unread
+        deadline = time.monotonic() + 30
+        while any(p.is_alive() for p in self._processes) and time.monotonic() < deadline:
+            with contextlib.suppress(queue.Empty):
+                while True:
+                    self._out.get(timeout=0.05)
+        for process in self._processes:
+            if process.is_alive():
+                process.terminate()
+            process.join()
+        self._processes = []
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def _release(self):
+        if self._debt:
+            self._debt -= 1
+        else:
+            self._credits.release()
+
+    def _adapt(self):
+        batches, stall, compute = self._window
+        if batches < self.adapt_every:
+            return
+        fraction = stall / (stall + compute) if stall + compute > 0 else 0.0
+        if fraction > self.stall_threshold and self.depth < self.max_depth:
+            grow = min(self.depth, self.max_depth - self.depth)
+            self.depth += grow
+            for _ in range(grow):
+                self._release()
+        elif self._stats["stalls"] == self._window_stalls and self.depth > self.min_depth:
+            self.depth -= 1
+            self._debt += 1
+        self.depth_history.append(self.depth)
+        self._window = [0, 0.0, 0.0]
+        self._window_stalls = self._stats["stalls"]
+
+    def epoch_batches(self, epoch=None):
+        """
+        Yield every batch of one pass over the shards as tensors.
+        """
+        import torch
+
+        self.start()
+        epoch = self._epoch if epoch is None else epoch
+        self._epoch = epoch + 1
+        order = np.random.default_rng((self.seed, epoch)).permutation(len(self.shards)) if self.shuffle \
+            else range(len(self.shards))
+        for shard_idx in order:
+            self._tasks.put((epoch, int(shard_idx), self.shards[shard_idx]))
+
+        remaining = len(self.shards)
+        resumed = None
+        while remaining:
+            begin = time.perf_counter()
+            if resumed is not None:
+                self._stats["compute_s"] += begin - resumed
+                self._window[2] += begin - resumed
+            kind, message_epoch, payload = self._out.get()
+            waited = time.perf_counter() - begin
+            if not self._warm:
+                # worker start-up (interpreter, imports), not a steady-state stall
+                self._stats["startup_s"] += waited
+                self._warm = True
+            else:
+                self._stats["stall_s"] += waited
+                self._window[1] += waited
+                if waited > 1e-3:
+                    self._stats["stalls"] += 1
+            if message_epoch != epoch:
+                # left over from an epoch the consumer stopped early
+                if kind == "batch":
+                    self._release()
+                resumed = time.perf_counter()
+                continue
+            if kind == "error":
+                raise RuntimeError(f"Prefetch worker failed on {payload}")
+            if kind == "done":
+                remaining -= 1
+                resumed = time.perf_counter()
+                continue
+            batch, producer_s = payload
+            self._release()
+            self._stats["batches"] += 1
+            self._stats["producer_s"] += producer_s
+            self._window[0] += 1
+            self._adapt()
+            resumed = time.perf_counter()
+            yield {name: torch.from_numpy(array) for name, array in batch.items()}
+
+    def __iter__(self):
+        return self.epoch_batches()
+
+    def stats(self):
+        """
+        Consumer stall and compute seconds, the stall fraction, the workers'
+        total encoding seconds, and the current and peak depth. The wait for
+        the first batch is reported separately as ``startup_s``.
+        """
+        s = self._stats
+        busy = s["stall_s"] + s["compute_s"]
+        return {
+            "batches": s["batches"],
+            "startup_s": round(s["startup_s"], 3),
+            "stall_s": round(s["stall_s"], 3),
+            "compute_s": round(s["compute_s"], 3),
+            "stall_fraction": round(s["stall_s"] / busy, 4) if busy else 0.0,
+            "stalls": s["stalls"],
+            "producer_s": round(s["producer_s"], 3),
+            "depth": self.depth,
+            "max_depth_used": max(self.depth_history),
+        }
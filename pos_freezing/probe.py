@@ -0,0 +1,233 @@
+"""
+Linear probing of frozen DistilBERT hidden states for fast layer selection.
+
+Instead of fine-tuning once per freezing candidate, the pretrained encoder
+is run once over ``train_tok`` and ``dev_tok`` with
+``output_hidden_states=True``. The hidden state of every layer (embeddings
+plus the 6 ``transformer.layer`` outputs) at each labelled subword is
+stored in one memory-mapped ``.npy`` array of shape
+``(n_layers, n_tokens, dim)``, and a ridge-regression probe is fitted for
+all layers at once with a single batched solve.
+
+Typical use from a notebook:
+
+    probes = run_probes(model, tokenizer, train_tok, dev_tok, len(tag2id), "probe_cache")
+    pd.DataFrame(probes["layers"])
+    suggest_freeze(probes["dev_accuracy"])
+"""
+
+import hashlib
+import json
+import os
+
+import numpy as np
+
+
+def count_labelled_tokens(dataset):
+    """
+    Number of positions whose label is not -100.
+    """
+    return int(sum(sum(1 for label in labels if label != -100) for labels in dataset["labels"]))
+
+
+def extract_hidden_states(model, dataset, tokenizer, path, batch_size=32, dtype=np.float16):
+    """
+    Run the frozen encoder once and store every layer's hidden state at the
+    labelled subwords.
+
+    Sentences are processed longest first to keep padding low; features and
+    labels are written in that order, so they stay aligned with each other.
+
+    Args:
+        model: A DistilBERT model (the ``distilbert`` backbone of a token
+            classifier is used if present, so the classifier is skipped).
+        dataset: A tokenized split with ``input_ids`` and ``labels``.
+        tokenizer: The tokenizer used to build ``dataset`` (for padding).
+        path: Output ``.npy`` path for the features. Labels are written next
+            to it with a ``.labels.npy`` suffix.
+        dtype: Storage dtype of the features.
+
+    Returns:
+        (features, labels): a read-only memmap of shape
+        ``(n_layers, n_tokens, dim)`` and an int64 label array.
+    """
+    import torch
+    from transformers import DataCollatorForTokenClassification
+
+    encoder = getattr(model, "distilbert", model)
+    encoder.eval()
+    n_layers = encoder.config.n_layers + 1
+    dim = encoder.config.dim
+    n_tokens = count_labelled_tokens(dataset)
+
+    labels_path = path[:-len(".npy")] + ".labels.npy" if path.endswith(".npy") else path + ".labels.npy"
+    os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+    features = np.lib.format.open_memmap(path, mode="w+", dtype=dtype, shape=(n_layers, n_tokens, dim))
+    labels = np.empty(n_tokens, dtype=np.int64)
+
+    data_collator = DataCollatorForTokenClassification(tokenizer, return_tensors="pt")
+    order = np.argsort([-len(ids) for ids in dataset["input_ids"]], kind="stable")
+    offset = 0
+    with torch.inference_mode():
+        for start in range(0, len(order), batch_size):
+            rows = [dataset[int(i)] for i in order[start:start + batch_size]]
+            batch = data_collator([{"input_ids": r["input_ids"], "labels": r["labels"]} for r in rows])
+            outputs = encoder(
+                input_ids=batch["input_ids"],
+                attention_mask=batch["attention_mask"],
+                output_hidden_states=True,
+            )
+            mask = batch["labels"] != -100
+            n = int(mask.sum())
+            hidden = torch.stack(outputs.hidden_states)  # (n_layers, bs, seq, dim)
+            features[:, offset:offset + n] = hidden[:, mask].numpy().astype(dtype)
+            labels[offset:offset + n] = batch["labels"][mask].numpy()
+            offset += n
+
+    features.flush()
+    np.save(labels_path, labels)
+    del features
+    return np.load(path, mmap_mode="r"), labels
+
+
+def _with_bias(x):
+    import torch
+
+    return torch.cat([x, torch.ones(*x.shape[:-1], 1, dtype=x.dtype)], dim=-1)
+
+
+def train_probes(features, labels, num_labels, l2=1e-3, chunk_size=8192):
+    """
+    Fit a one-vs-rest ridge probe on every layer at once.
+
+    The normal equations ``(X^T X + lambda I) W = X^T Y`` are accumulated in
+    float64 over chunks of the memmap for all layers together and solved with
+    one batched ``torch.linalg.solve``. ``l2`` is relative to the mean
+    diagonal of each layer's Gram matrix, so one value suits every layer.
+
+    Returns:
+        A ``(n_layers, dim + 1, num_labels)`` float64 tensor of weights.
+    """
+    import torch
+
+    n_layers, n_tokens, dim = features.shape
+    gram = torch.zeros(n_layers, dim + 1, dim + 1, dtype=torch.float64)
+    target = torch.zeros(n_layers, dim + 1, num_labels, dtype=torch.float64)
+
+    for start in range(0, n_tokens, chunk_size):
+        x = _with_bias(torch.from_numpy(np.asarray(features[:, start:start + chunk_size], dtype=np.float64)))
+        y = torch.nn.functional.one_hot(
+            torch.from_numpy(labels[start:start + chunk_size]), num_labels
+        ).to(torch.float64)
+        gram += x.transpose(1, 2) @ x
+        target += x.transpose(1, 2) @ y.expand(n_layers, -1, -1)
+
+    scale = gram.diagonal(dim1=1, dim2=2).mean(dim=1)
+    gram += (l2 * scale)[:, None, None] * torch.eye(dim + 1, dtype=torch.float64)
+    return torch.linalg.solve(gram, target)
+
+
+def probe_accuracy(weights, features, labels, chunk_size=8192):
+    """
+    Token accuracy of every layer's probe.
+
+    Returns:
+        A float array of shape ``(n_layers,)``.
+    """
+    import torch
+
+    n_layers, n_tokens, _ = features.shape
+    correct = torch.zeros(n_layers, dtype=torch.int64)
+    for start in range(0, n_tokens, chunk_size):
+        x = _with_bias(torch.from_numpy(np.asarray(features[:, start:start + chunk_size], dtype=np.float64)))
+        preds = (x @ weights).argmax(dim=-1)
+        correct += (preds == torch.from_numpy(labels[start:start + chunk_size])).sum(dim=1)
+    return (correct.to(torch.float64) / max(n_tokens, 1)).numpy()
+
+
+def suggest_freeze(accuracies, tolerance=0.01):
+    """
+    Turn per-layer probe accuracies into a ``freeze_layers`` suggestion.
+
+    Layers whose output is already within ``tolerance`` of the best probe
+    carry most of the PoS information, so the blocks up to the first such
+    layer can be frozen and the ones above left to adapt.
+
+    Args:
+        accuracies: Probe accuracy per hidden state, index 0 being the
+            embeddings and index i the output of ``transformer.layer[i - 1]``.
+
+    Returns:
+        (freeze_strategy, k) to pass to ``freeze_layers``.
+    """
+    accuracies = np.asarray(accuracies)
+    n_blocks = len(accuracies) - 1
+    k = int(np.argmax(accuracies >= accuracies.max() - tolerance))
+    if k >= n_blocks:
+        return ("all_encoder", 0)
+    if k == 0:
+        return (None, 0)
+    return ("first_k", k)
+
+
+def hidden_states_key(model, dataset):
+    """
+    Short hash of what cached hidden states depend on: the encoder's name,
+    revision and weights and the content of the split.
+    """
+    from .results_store import dataset_digest, model_digest
+
+    encoder = getattr(model, "distilbert", model)
+    key = {
+        "model": getattr(model.config, "_name_or_path", None),
+        "revision": getattr(model.config, "_commit_hash", None),
+        "weights": model_digest(encoder),
+        "data": dataset_digest(dataset),
+    }
+    return hashlib.sha256(json.dumps(key, sort_keys=True).encode("utf-8")).hexdigest()[:12]
+
+
+def cached_hidden_states(model, dataset, tokenizer, cache_dir, split, batch_size=32):
+    """
+    ``extract_hidden_states`` into ``cache_dir``, named by
+    ``hidden_states_key``, or the arrays already there from an earlier run.
+    """
+    key = hidden_states_key(model, dataset)
+    path = os.path.join(cache_dir, f"{split}.{key}.hidden.npy")
+    labels_path = os.path.join(cache_dir, f"{split}.{key}.hidden.labels.npy")
+    if os.path.exists(path) and os.path.exists(labels_path):
+        return np.load(path, mmap_mode="r"), np.load(labels_path)
+    return extract_hidden_states(model, dataset, tokenizer, path, batch_size)
+
+
+def run_probes(model, tokenizer, train_tok, dev_tok, num_labels, cache_dir, batch_size=32, l2=1e-3):
+    """
+    Extract (or reuse cached) hidden states for both splits, fit the probes
+    and score them on the dev split. Cache files are named by
+    ``hidden_states_key``, so one ``cache_dir`` can hold several models.
+
+    Returns:
+        A dict with ``train_accuracy`` and ``dev_accuracy`` arrays, a
+        ``layers`` list of per-layer rows ready for ``pd.DataFrame`` and the
+        ``suggestion`` from ``suggest_freeze``.
+    """
+    splits = {split: cached_hidden_states(model, dataset, tokenizer, cache_dir, split, batch_size)
+              for split, dataset in (("train", train_tok), ("dev", dev_tok))}
+
+    weights = train_probes(*splits["train"], num_labels, l2=l2)
+    train_acc = probe_accuracy(weights, *splits["train"])
+    dev_acc = probe_accuracy(weights, *splits["dev"])
+    layers = [
+        {
+            "Layer": "embeddings" if i == 0 else f"transformer.layer[{i - 1}]",
+            "Train Probe Accuracy (%)": round(100 * float(train_acc[i]), 2),
+            "Dev Probe Accuracy (%)": round(100 * float(dev_acc[i]), 2),
+        }
+        for i in range(len(dev_acc))
+    ]
+    return {
+        "train_accuracy": train_acc,
+        "dev_accuracy": dev_acc,
+        "layers": layers,
+        "suggestion": suggest_freeze(dev_acc),
+    }
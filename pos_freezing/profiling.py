@@ -0,0 +1,318 @@
+"""
+Switchable per-module profiling of the training hot path.
+
+``ModuleProfiler`` hooks ``distilbert.embeddings``, every
+``transformer.layer`` block and the classifier:
+
+- forward time: forward pre-hook to forward hook;
+- backward time: full backward pre-hook to backward hook, extended to the
+  last gradient accumulation into the module's own parameters (for the
+  embeddings the backward hook fires before the weight gradient is
+  computed, since no input needs a gradient);
+- allocations (optional, ``track_allocations=True``): every tensor produced
+  by an operator while the module is running, counted and sized through a
+  ``TorchDispatchMode``. This costs a Python call per operator, so it is
+  off by default.
+
+Hooks stay attached but do nothing unless the profiler is enabled, so it
+can be toggled around a few steps. Events are exported as a Chrome trace
+(``chrome://tracing``, Perfetto or speedscope render it as a flame graph).
+
+A frozen block still shows backward time when a trainable module sits
+below it (the ``freeze_layers`` strategies keep the embeddings trainable),
+because the input gradient must pass through it; only blocks below the
+lowest trainable parameter are skipped entirely.
+
+    callback = profiler_callback("profiles", "Freeze First 2")
+    train_strategy(..., callbacks=[callback])
+    callback.profiler.summary()
+
+or ``train_strategy(..., profile_dir="profiles")``, which adds the trace
+path and the per-module backward milliseconds to the result row.
+"""
+
+import json
+import os
+import threading
+import time
+import warnings
+
+import torch
+
+
+def profiled_modules(model):
+    """
+    ``(name, module)`` pairs hooked by default.
+    """
+    modules = [("embeddings", model.distilbert.embeddings)]
+    modules += [(f"layer.{i}", layer) for i, layer in enumerate(model.distilbert.transformer.layer)]
+    modules.append(("classifier", model.classifier))
+    return modules
+
+
+class _AllocationCounter(torch.utils._python_dispatch.TorchDispatchMode):
+    def __init__(self, profiler):
+        super().__init__()
+        self.profiler = profiler
+
+    def __torch_dispatch__(self, func, types, args=(), kwargs=None):
+        out = func(*args, **(kwargs or {}))
+        stack = self.profiler._stack
+        if stack:
+            count = nbytes = 0
+            for tensor in (out if isinstance(out, (tuple, list)) else (out,)):
+                if isinstance(tensor, torch.Tensor):
+                    count += 1
+                    nbytes += tensor.numel() * tensor.element_size()
+            stats = self.profiler._stats[stack[-1]]
+            stats["allocations"] += count
+            stats["allocated_bytes"] += nbytes
+        return out
+
+
+class ModuleProfiler:
+    """
+    Forward/backward timing (and optional allocation counts) per module.
+
+    Args:
+        model: A DistilBERT token classifier.
+        modules: ``(name, module)`` pairs; default ``profiled_modules``.
+        track_allocations: Count tensors allocated inside each module.
+        max_events: Trace events kept; later ones only update the totals.
+    """
+
+    def __init__(self, model, modules=None, track_allocations=False, max_events=200_000):
+        self.model = model
+        self.modules = modules or profiled_modules(model)
+        self.track_allocations = track_allocations
+        self.max_events = max_events
+        self.enabled = False
+        self._handles = []
+        self._mode = None
+        self._warnings = None
+        self.reset()
+
+    def reset(self):
+        self.events = []
+        self._stack = []
+        self._open = {}
+        self._backward = {}
+        self._stats = {
+            name: {"forward_calls": 0, "forward_ns": 0, "backward_calls": 0, "backward_ns": 0,
+                   "allocations": 0, "allocated_bytes": 0}
+            for name, _ in self.modules
+        }
+
+    # hook management
+
+    def attach(self):
+        if self._handles:
+            return self
+        # only while the hooks are attached, restored by detach()
+        self._warnings = warnings.catch_warnings()
+        self._warnings.__enter__()
+        warnings.filterwarnings("ignore", message="Full backward hook is firing when gradients are computed")
+        for name, module in self.modules:
+            self._handles += [
+                module.register_forward_pre_hook(lambda m, args, name=name: self._forward_start(name)),
+                module.register_forward_hook(lambda m, args, out, name=name: self._forward_end(name)),
+                module.register_full_backward_pre_hook(lambda m, grad, name=name: self._backward_start(name)),
+                module.register_full_backward_hook(lambda m, gi, go, name=name: self._backward_end(name, gi)),
+            ]
+            for param in module.parameters():
+                if param.requires_grad:
+                    self._handles.append(param.register_post_accumulate_grad_hook(
+                        lambda p, name=name: self._grad_accumulated(name)))
+        return self
+
+    def detach(self):
+        self.disable()
+        for handle in self._handles:
+            handle.remove()
+        self._handles = []
+        if self._warnings is not None:
+            self._warnings.__exit__(None, None, None)
+            self._warnings = None
+
+    def enable(self):
+        self.attach()
+        self.enabled = True
+        if self.track_allocations and self._mode is None:
+            self._mode = _AllocationCounter(self)
+            self._mode.__enter__()
+        return self
+
+    def disable(self):
+        self._close_backward()
+        self.enabled = False
+        if self._mode is not None:
+            self._mode.__exit__(None, None, None)
+            self._mode = None
+
+    def __enter__(self):
+        return self.enable()
+
+    def __exit__(self, *exc):
+        self.disable()
+
+    # event recording
+
+    def _event(self, name, category, start, end):
+        if len(self.events) < self.max_events:
+            self.events.append((name, category, start, end, threading.get_ident()))
+
+    def _forward_start(self, name):
+        if self.enabled:
+            self._close_backward()
+            self._open[name] = time.perf_counter_ns()
+            self._stack.append(name)
+
+    def _forward_end(self, name):
+        if self.enabled and name in self._open:
+            start = self._open.pop(name)
+            end = time.perf_counter_ns()
+            stats = self._stats[name]
+            stats["forward_calls"] += 1
+            stats["forward_ns"] += end - start
+            self._event(name, "forward", start, end)
+            if self._stack and self._stack[-1] == name:
+                self._stack.pop()
+
+    def _backward_start(self, name):
+        if self.enabled:
+            self._backward[name] = [time.perf_counter_ns(), None]
+            self._stack.append(name)
+
+    def _backward_end(self, name, grad_input):
+        if self.enabled and name in self._backward:
+            self._backward[name][1] = time.perf_counter_ns()
+            # with no input gradient the hook fires before the module's own
+            # backward ops run, so keep attributing allocations to it
+            if any(g is not None for g in grad_input) and self._stack and self._stack[-1] == name:
+                self._stack.pop()
+
+    def _grad_accumulated(self, name):
+        if self.enabled and name in self._backward:
+            self._backward[name][1] = time.perf_counter_ns()
+
+    def _close_backward(self):
+        if not self._backward:
+            return
+        for name, (start, end) in self._backward.items():
+            end = end or start
+            stats = self._stats[name]
+            stats["backward_calls"] += 1
+            stats["backward_ns"] += end - start
+            self._event(name, "backward", start, end)
+        self._backward = {}
+        self._stack = []
+
+    def mark(self, name, start_ns, end_ns, category="step"):
+        """
+        Record an outer span (e.g. a training step) in the trace.
+        """
+        if self.enabled:
+            self._event(name, category, start_ns, end_ns)
+
+    # results
+
+    def summary(self):
+        """
+        One row per module with call counts, total and per-call milliseconds
+        and, if tracked, allocation counts and MB.
+        """
+        self._close_backward()
+        rows = []
+        for name, _ in self.modules:
+            s = self._stats[name]
+            row = {
+                "Module": name,
+                "Forward Calls": s["forward_calls"],
+                "Forward (ms)": round(s["forward_ns"] / 1e6, 2),
+                "Backward Calls": s["backward_calls"],
+                "Backward (ms)": round(s["backward_ns"] / 1e6, 2),
+                "Forward ms/call": round(s["forward_ns"] / 1e6 / max(1, s["forward_calls"]), 3),
+                "Backward ms/call": round(s["backward_ns"] / 1e6 / max(1, s["backward_calls"]), 3),
+            }
+            if self.track_allocations:
+                row["Allocations"] = s["allocations"]
+                row["Allocated (MB)"] = round(s["allocated_bytes"] / 2**20, 1)
+            rows.append(row)
+        return rows
+
+    def export_chrome_trace(self, path, process_name="train"):
+        """
+        Write the recorded spans as Chrome trace-event JSON.
+        """
+        self._close_backward()
+        origin = min((e[2] for e in self.events), default=0)
+        threads = {tid: i for i, tid in enumerate(dict.fromkeys(e[4] for e in self.events))}
+        trace = [{"name": "process_name", "ph": "M", "pid": 0, "args": {"name": process_name}}]
+        for name, category, start, end, tid in self.events:
+            trace.append({
+                "name": name if category == "step" else f"{name} {category}",
+                "cat": category,
+                "ph": "X",
+                "ts": (start - origin) / 1e3,
+                "dur": max(end - start, 0) / 1e3,
+                "pid": 0,
+                "tid": threads[tid],
+            })
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        with open(path, "w", encoding="utf-8") as f:
+            json.dump({"traceEvents": trace, "displayTimeUnit": "ms"}, f)
+        return path
+
+
+def _profiler_callback_class():
+    from transformers import TrainerCallback
+
+    class ProfilerCallback(TrainerCallback):
+        """
+        See ``profiler_callback``.
+        """
+
+        def __init__(self, output_dir, name, skip_steps=1, max_steps=20, track_allocations=False):
+            self.output_dir = output_dir
+            self.name = name
+            self.skip_steps = skip_steps
+            self.max_steps = max_steps
+            self.track_allocations = track_allocations
+            self.profiler = None
+            self.trace_path = None
+            self._step_start = None
+
+        def _active(self, step):
+            return step >= self.skip_steps and (self.max_steps is None or step < self.skip_steps + self.max_steps)
+
+        def on_train_begin(self, args, state, control, model=None, **kwargs):
+            self.profiler = ModuleProfiler(model, track_allocations=self.track_allocations).attach()
+
+        def on_step_begin(self, args, state, control, **kwargs):
+            if self._active(state.global_step):
+                self.profiler.enable()
+                self._step_start = time.perf_counter_ns()
+
+        def on_step_end(self, args, state, control, **kwargs):
+            if self.profiler.enabled:
+                self.profiler.mark(f"step {state.global_step}", self._step_start, time.perf_counter_ns())
+                self.profiler.disable()
+
+        def on_train_end(self, args, state, control, **kwargs):
+            slug = self.name.lower().replace(" ", "_").replace("=", "")
+            self.trace_path = self.profiler.export_chrome_trace(
+                os.path.join(self.output_dir, f"{slug}.trace.json"), self.name)
+            self.profiler.detach()
+
+    return ProfilerCallback
+
+
+def profiler_callback(output_dir, name, skip_steps=1, max_steps=20, track_allocations=False):
+    """
+    A ``TrainerCallback`` that profiles ``Trainer.train()``. Hooks are
+    attached when training starts and enabled for steps ``skip_steps`` to
+    ``skip_steps + max_steps`` (all remaining steps if ``max_steps`` is
+    None); the trace is written to ``output_dir/<name>.trace.json`` at the
+    end (``callback.trace_path``), and ``callback.profiler`` keeps the totals.
+    """
+    return _profiler_callback_class()(output_dir, name, skip_steps, max_steps, track_allocations)
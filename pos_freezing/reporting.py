@@ -0,0 +1,108 @@
+"""
+The notebooks' Task 3 tables and plots, drawn from measured result rows.
+
+Each function takes rows as returned by ``sweep.run_sweep`` or
+``ResultsStore.rows`` instead of hand-typed dictionaries, and reproduces
+the corresponding notebook section.
+"""
+
+
+def _frame(rows):
+    from .sweep import results_table
+
+    df = results_table(rows)
+    # one row per strategy: the latest run wins
+    return df.drop_duplicates(subset=["Strategy", "Precision"], keep="last").reset_index(drop=True)
+
+
+def plot_accuracy(rows, title="Model Performance Across Freezing Strategies"):
+    """
+    Horizontal bar chart of dev accuracy per strategy.
+    """
+    from matplotlib import pyplot as plt
+    import seaborn as sns
+
+    df_results = _frame(rows)
+    palette = sns.color_palette("Dark2", n_colors=len(df_results))
+    plt.figure(figsize=(8, 4))
+    ax = df_results.set_index('Strategy')['Dev Accuracy (%)'].plot(kind='barh', color=palette)
+    for i, accuracy in enumerate(df_results['Dev Accuracy (%)']):
+        ax.text(accuracy + 0.005, i, f"{accuracy:.1f}", va='center')
+    ax.spines['top'].set_visible(False)
+    ax.spines['right'].set_visible(False)
+    plt.xlabel("Evaluation Accuracy (%)")
+    plt.title(title)
+    plt.xlim(0, 100.0)
+    plt.tight_layout()
+    return ax
+
+
+def plot_convergence(rows, title="Convergence Curves by Freezing Strategy"):
+    """
+    Dev accuracy per epoch for every strategy with a recorded history.
+    """
+    import matplotlib.pyplot as plt
+
+    histories = {row["Strategy"]: row["History"] for row in rows if row.get("History")}
+    plt.figure(figsize=(8, 4))
+    for strat, accs in histories.items():
+        plt.plot(range(1, len(accs) + 1), accs, marker='o', label=strat)
+    plt.xlabel("Epoch")
+    plt.ylabel("Dev Accuracy")
+    plt.title(title)
+    plt.legend()
+    plt.grid(True, linestyle='--', alpha=0.5)
+    plt.tight_layout()
+    return plt.gca()
+
+
+def plot_accuracy_vs_size(rows, title="Accuracy vs. Model Size by Freezing Strategy"):
+    """
+    Scatter of dev accuracy against trainable parameters (millions).
+    """
+    import matplotlib.pyplot as plt
+    import seaborn as sns
+
+    df = _frame(rows)
+    palette = sns.color_palette("Dark2", n_colors=len(df))
+    plt.figure(figsize=(8, 4))
+    for (_, row), color in zip(df.iterrows(), palette):
+        plt.scatter(row["Trainable Params (M)"], row["Dev Accuracy (%)"], s=100, color=color, label=row["Strategy"])
+    plt.xlabel("Trainable Parameters (Millions)")
+    plt.ylabel("Eval Accuracy (%)")
+    plt.title(title)
+    plt.grid(True, linestyle='--', alpha=0.5)
+    plt.legend(title="Strategy", bbox_to_anchor=(1.05, 1), loc='upper left')
+    plt.tight_layout()
+    return plt.gca()
+
+
+def plot_training_time(rows, title="Compute Savings by Freezing Strategy"):
+    """
+    Horizontal bar chart of training time per strategy.
+    """
+    from matplotlib import pyplot as plt
+    import seaborn as sns
+
+    df_times = _frame(rows)
+    palette = sns.color_palette("Dark2", n_colors=len(df_times))
+    plt.figure(figsize=(8, 4))
+    ax = df_times.set_index('Strategy')['Training Time (s)'].plot(kind='barh', color=palette)
+    for i, time_val in enumerate(df_times['Training Time (s)']):
+        ax.text(time_val + 0.5, i, f"{time_val:.0f}", va='center')
+    ax.spines['top'].set_visible(False)
+    ax.spines['right'].set_visible(False)
+    plt.xlabel("Training Time (seconds)")
+    plt.title(title)
+    plt.tight_layout()
+    return ax
+
+
+def summary_table(rows):
+    """
+    The "Result Summary" table.
+    """
+    df = _frame(rows)
+    columns = [c for c in ["Strategy", "Dev Accuracy (%)", "Trainable Params (M)",
+                           "Training Time (s)", "Compute Savings (%)"] if c in df]
+    return df[columns]
@@ -0,0 +1,208 @@
+"""
+An on-disk SQLite store of sweep results.
+
+Every run is keyed by a hash of everything that determines its outcome:
+treebank, base model, a digest of the tokenized data, the strategy and
+its arguments, the effective training hyperparameters and the code version
+(a hash of the sources of the modules that train).
+``sweep.run_sweep(..., store=store)`` skips configurations already present,
+and the reporting helpers read the rows back, so the result tables and
+plots come from measured runs instead of hand-typed literals.
+
+    store = ResultsStore("results.sqlite")
+    rows = run_sweep(STRATEGIES, model_init, train_tok, dev_tok, tokenizer,
+                     store=store, treebank="UD_English-EWT", model_name=model_name)
+    store.table(treebank="UD_English-EWT")
+"""
+
+import hashlib
+import json
+import os
+import sqlite3
+import time
+
+import numpy as np
+
+# Training arguments that do not change results
+COSMETIC_ARGS = {"output_dir", "logging_steps", "disable_tqdm", "report_to", "save_strategy", "logging_dir"}
+
+
+# Modules on ``train_strategy``'s path; editing any other module keeps stored runs valid
+TRAINING_MODULES = ("checkpointing", "coreset", "freezing", "lean", "lora", "memory", "metrics", "packed",
+                    "precision", "profiling", "sweep")
+
+# ``train_strategy`` keywords that only say where outputs go
+OUTPUT_OPTIONS = {"output_dir", "save_model", "profile_dir"}
+
+
+def code_version():
+    """
+    Package version plus a short hash of the sources of ``TRAINING_MODULES``.
+    """
+    from . import __version__
+
+    digest = hashlib.sha256()
+    package_dir = os.path.dirname(os.path.abspath(__file__))
+    for module in TRAINING_MODULES:
+        digest.update(module.encode("utf-8"))
+        with open(os.path.join(package_dir, f"{module}.py"), "rb") as f:
+            digest.update(f.read())
+    return f"{__version__}+{digest.hexdigest()[:12]}"
+
+
+def dataset_digest(dataset, columns=("input_ids", "labels")):
+    """
+    Content hash of a tokenized split's rows, in order: the flat values and
+    sentence offsets of each column, as int64. Unlike the ``datasets``
+    fingerprint, it is stable across sessions, and a ``PackedDataset``
+    hashes like the split it was packed from.
+    """
+    from .packed import PackedDataset, _flat_column
+
+    digest = hashlib.sha256()
+    for name in columns:
+        if isinstance(dataset, PackedDataset):
+            values, offsets = getattr(dataset, name), dataset.offsets
+        else:
+            # sliced values, not the Arrow buffers a contiguous select shares with its parent
+            values, offsets = _flat_column(dataset, name)
+        digest.update(name.encode("utf-8"))
+        digest.update(np.ascontiguousarray(values, dtype=np.int64).tobytes())
+        digest.update(np.ascontiguousarray(offsets, dtype=np.int64).tobytes())
+    return digest.hexdigest()[:16]
+
+
+def model_digest(model):
+    """
+    Content hash of a model's parameters and buffers, e.g. to key features
+    or logits computed with it.
+    """
+    import torch
+
+    digest = hashlib.sha256()
+    for name, tensor in sorted(model.state_dict().items()):
+        digest.update(name.encode("utf-8"))
+        digest.update(str(tensor.dtype).encode("utf-8"))
+        digest.update(memoryview(tensor.detach().cpu().contiguous().view(-1).view(torch.uint8).numpy()))
+    return digest.hexdigest()[:16]
+
+
+def _option_value(key, value):
+    if key == "callbacks":
+        # instances print with their address; key them by class
+        return [type(callback).__name__ for callback in value or []]
+    return value
+
+
+def run_config(treebank, model_name, name, strategy, k, precision, data, training_args=None, **kwargs):
+    """
+    The dictionary a run is keyed by. Extra ``train_strategy`` keywords
+    that affect results (LoRA arguments, checkpointing) are included;
+    output locations are not.
+    """
+    from .sweep import effective_training_args
+
+    args = effective_training_args(strategy, precision, training_args)
+    return {
+        "treebank": treebank,
+        "model": model_name,
+        "data": data,
+        "strategy": {"name": name, "freeze_strategy": strategy, "k": k},
+        "precision": precision,
+        "training_args": {key: value for key, value in sorted(args.items()) if key not in COSMETIC_ARGS},
+        "options": {key: _option_value(key, value) for key, value in sorted(kwargs.items())
+                    if key not in OUTPUT_OPTIONS},
+        "code_version": code_version(),
+    }
+
+
+class ResultsStore:
+    """
+    Result rows keyed by configuration hash in a SQLite file.
+    """
+
+    def __init__(self, path="results.sqlite"):
+        self.path = path
+        self.conn = sqlite3.connect(path)
+        self.conn.execute(
+            """
+            CREATE TABLE IF NOT EXISTS runs (
+                key TEXT PRIMARY KEY,
+                treebank TEXT,
+                model TEXT,
+                strategy TEXT,
+                code_version TEXT,
+                created_at REAL,
+                config TEXT,
+                row TEXT
+            )
+            """
+        )
+        self.conn.commit()
+
+    @staticmethod
+    def key(config):
+        return hashlib.sha256(json.dumps(config, sort_keys=True, default=str).encode("utf-8")).hexdigest()
+
+    def get(self, key):
+        found = self.conn.execute("SELECT row FROM runs WHERE key = ?", (key,)).fetchone()
+        return json.loads(found[0]) if found else None
+
+    def __contains__(self, key):
+        return self.conn.execute("SELECT 1 FROM runs WHERE key = ?", (key,)).fetchone() is not None
+
+    def __len__(self):
+        return self.conn.execute("SELECT COUNT(*) FROM runs").fetchone()[0]
+
+    def put(self, key, config, row):
+        self.conn.execute(
+            "INSERT OR REPLACE INTO runs VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+            (key, config.get("treebank"), config.get("model"), config["strategy"]["name"],
+             config.get("code_version"), time.time(),
+             json.dumps(config, sort_keys=True, default=str), json.dumps(row, default=str)),
+        )
+        self.conn.commit()
+
+    def delete(self, key):
+        self.conn.execute("DELETE FROM runs WHERE key = ?", (key,))
+        self.conn.commit()
+
+    def rows(self, treebank=None, model=None, strategies=None, latest_code_only=False):
+        """
+        Stored result rows, oldest first, optionally filtered. With
+        ``latest_code_only`` only runs made with the current code version
+        are returned.
+        """
+        query, params = "SELECT row FROM runs WHERE 1 = 1", []
+        if treebank is not None:
+            query += " AND treebank = ?"
+            params.append(treebank)
+        if model is not None:
+            query += " AND model = ?"
+            params.append(model)
+        if latest_code_only:
+            query += " AND code_version = ?"
+            params.append(code_version())
+        query += " ORDER BY created_at"
+        rows = [json.loads(r[0]) for r in self.conn.execute(query, params)]
+        if strategies is not None:
+            rows = [row for row in rows if row["Strategy"] in set(strategies)]
+        return rows
+
+    def table(self, **filters):
+        """
+        ``sweep.results_table`` over the stored rows.
+        """
+        from .sweep import results_table
+
+        return results_table(self.rows(**filters))
+
+    def histories(self, **filters):
+        """
+        Strategy -> dev accuracy per epoch, as the notebooks' ``histories``
+        dict, taking the most recent run of each strategy.
+        """
+        return {row["Strategy"]: row["History"] for row in self.rows(**filters) if row.get("History")}
+
+    def close(self):
+        self.conn.close()
@@ -0,0 +1,434 @@
+"""
+Random hyperparameter search with asynchronous successive halving (ASHA).
+
+The notebooks train every strategy with one fixed learning rate, batch size
+and weight decay. This module samples configurations over the freeze spec
+(a ``freezing.STRATEGIES`` entry, optionally with the embeddings frozen too)
+and the optimizer settings, trains them in parallel CPU processes and stops
+unpromising ones early:
+
+- each trial first trains for ``min_epochs``; when a worker is free, the
+  best ``1/eta`` of the trials that finished a rung are promoted to the next
+  budget (``min_epochs * eta**i`` epochs, capped at ``max_epochs``), and
+  otherwise a new trial is started;
+- a promoted trial resumes from its saved trainable weights and optimizer
+  state; the learning-rate schedule always spans ``max_epochs``, so a trial
+  that reaches the last rung is trained exactly like a full run.
+
+The tokenized splits are handed to the worker pool once. When a trial
+freezes the embeddings, the frozen prefix (embeddings plus the leading
+frozen layers) has fixed outputs, so they are computed once per prefix
+depth into a memory-mapped float16 array that all workers read, and those
+trials run only the layers above it. The prefix then runs without dropout,
+as in evaluation; the features' extraction time is shared and not included
+in any trial's training time.
+
+    rows = search(model_init, train_tok, dev_tok, tokenizer, n_trials=24, workers=4)
+    results_table(pareto_front(rows))
+"""
+
+import math
+import os
+import time
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+
+import numpy as np
+
+from .freezing import STRATEGIES, count_parameters, frozen_layer_indices
+
+# Lists are sampled uniformly, ("log", low, high) log-uniformly
+SEARCH_SPACE = {
+    "strategy": STRATEGIES,
+    "freeze_embeddings": [False, True],
+    "learning_rate": ("log", 1e-5, 1e-3),
+    "per_device_train_batch_size": [8, 16, 32],
+    "weight_decay": [0.0, 0.01, 0.1],
+}
+
+
+def sample_config(space, rng):
+    """
+    Draw one configuration from ``space`` with a ``numpy`` generator.
+    """
+    config = {}
+    for key, values in space.items():
+        if isinstance(values, tuple) and values and values[0] == "log":
+            _, low, high = values
+            config[key] = float(math.exp(rng.uniform(math.log(low), math.log(high))))
+        else:
+            config[key] = values[int(rng.integers(len(values)))]
+    return config
+
+
+def prefix_depth(num_layers, freeze_strategy, k, freeze_embeddings):
+    """
+    Number of leading ``transformer.layer`` blocks whose output is fixed,
+    or None if the embeddings train (then nothing can be precomputed).
+    """
+    if not freeze_embeddings:
+        return None
+    frozen = set(frozen_layer_indices(num_layers, freeze_strategy, k))
+    depth = 0
+    while depth in frozen:
+        depth += 1
+    return depth
+
+
+def rung_budgets(min_epochs=1, max_epochs=5, eta=3):
+    """
+    Epoch budgets of the successive-halving rungs, e.g. ``[1, 3, 5]``.
+    """
+    budgets = []
+    budget = min_epochs
+    while budget < max_epochs:
+        budgets.append(budget)
+        budget *= eta
+    budgets.append(max_epochs)
+    return budgets
+
+
+def _attention_mask(model, hidden, attention_mask):
+    try:
+        from transformers.masking_utils import create_bidirectional_mask
+    except ImportError:
+        # older transformers: DistilBERT layers take the 2D padding mask,
+        # expanded to a 4D additive one only under SDPA
+        if getattr(model.config, "_attn_implementation", "eager") != "sdpa":
+            return attention_mask
+        from transformers.modeling_attn_mask_utils import _prepare_4d_attention_mask_for_sdpa
+
+        return _prepare_4d_attention_mask_for_sdpa(attention_mask, hidden.dtype, tgt_len=hidden.shape[1])
+    return create_bidirectional_mask(config=model.config, inputs_embeds=hidden, attention_mask=attention_mask)
+
+
+def prefix_forward(model, input_ids, attention_mask, depth):
+    """
+    Hidden states after the embeddings and the first ``depth`` layers.
+    """
+    distilbert = model.distilbert
+    hidden = distilbert.embeddings(input_ids)
+    mask = _attention_mask(model, hidden, attention_mask)
+    for layer in distilbert.transformer.layer[:depth]:
+        hidden = layer(hidden, mask)
+    return hidden
+
+
+def suffix_logits(model, hidden, attention_mask, depth):
+    """
+    Logits from hidden states produced by ``prefix_forward(..., depth)``.
+    """
+    mask = _attention_mask(model, hidden, attention_mask)
+    for layer in model.distilbert.transformer.layer[depth:]:
+        hidden = layer(hidden, mask)
+    return model.classifier(model.dropout(hidden))
+
+
+def store_prefix_features(model, dataset, tokenizer, depth, path, batch_size=32, dtype=np.float16):
+    """
+    Run the frozen prefix once and store its output for every subword.
+
+    Sentence ``i`` owns rows ``offsets[i]:offsets[i + 1]`` of the
+    ``(n_tokens, dim)`` array; offsets are saved with an ``.offsets.npy``
+    suffix, as for ``distill.store_teacher_logits``.
+
+    Returns:
+        (features, offsets): a read-only memmap and an int64 array.
+    """
+    import torch
+    from transformers import DataCollatorForTokenClassification
+
+    from .distill import _offsets_path
+
+    offsets = np.concatenate([[0], np.cumsum([len(ids) for ids in dataset["input_ids"]])]).astype(np.int64)
+    os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+    features = np.lib.format.open_memmap(path, mode="w+", dtype=dtype, shape=(int(offsets[-1]), model.config.dim))
+
+    data_collator = DataCollatorForTokenClassification(tokenizer, return_tensors="pt")
+    model.eval()
+    with torch.inference_mode():
+        for start in range(0, len(dataset), batch_size):
+            rows = dataset[start:start + batch_size]
+            batch = data_collator([
+                {"input_ids": ids, "labels": labels} for ids, labels in zip(rows["input_ids"], rows["labels"])
+            ])
+            hidden = prefix_forward(model, batch["input_ids"], batch["attention_mask"], depth)
+            mask = batch["attention_mask"].bool()
+            features[offsets[start]:offsets[min(start + batch_size, len(dataset))]] = hidden[mask].numpy().astype(dtype)
+
+    features.flush()
+    np.save(_offsets_path(path), offsets)
+    del features
+    return load_prefix_features(path)
+
+
+def load_prefix_features(path):
+    from .distill import load_teacher_logits
+
+    return load_teacher_logits(path)
+
+
+class ASHA:
+    """
+    Bookkeeping for asynchronous successive halving.
+
+    ``next_job`` returns ``(trial_id, rung)`` for a promotion when one is
+    due, ``(None, 0)`` when a new trial should start, or None when the
+    caller should wait for running jobs (all trials sampled, nothing to
+    promote).
+    """
+
+    def __init__(self, budgets, eta=3, n_trials=20):
+        self.budgets = budgets
+        self.eta = eta
+        self.n_trials = n_trials
+        self.n_started = 0
+        self.results = [{} for _ in budgets]
+        self.promoted = [set() for _ in budgets]
+
+    def next_job(self):
+        for rung in reversed(range(len(self.budgets) - 1)):
+            finished = sorted(self.results[rung].items(), key=lambda item: -item[1])
+            for trial_id, _ in finished[:len(finished) // self.eta]:
+                if trial_id not in self.promoted[rung]:
+                    self.promoted[rung].add(trial_id)
+                    return trial_id, rung + 1
+        if self.n_started < self.n_trials:
+            self.n_started += 1
+            return None, 0
+        return None
+
+    def report(self, trial_id, rung, accuracy):
+        self.results[rung][trial_id] = accuracy
+
+
+# Per-process state of a search worker, set by ``_init_worker``
+_WORKER = {}
+
+
+def _init_worker(model_init, train_tok, dev_tok, tokenizer, feature_paths, seed, threads):
+    import torch
+
+    if threads:
+        torch.set_num_threads(threads)
+    features = {
+        depth: (load_prefix_features(paths["train"]), load_prefix_features(paths["dev"]))
+        for depth, paths in feature_paths.items()
+    }
+    _WORKER.update(model_init=model_init, train_tok=train_tok, dev_tok=dev_tok, tokenizer=tokenizer,
+                   features=features, seed=seed)
+
+
+def _batches(dataset, indices, batch_size, data_collator, features=None):
+    import torch
+
+    for start in range(0, len(indices), batch_size):
+        idx = indices[start:start + batch_size]
+        rows = dataset[idx]
+        batch = data_collator([
+            {"input_ids": ids, "labels": labels} for ids, labels in zip(rows["input_ids"], rows["labels"])
+        ])
+        if features is not None:
+            values, offsets = features
+            hidden = torch.zeros(*batch["input_ids"].shape, values.shape[1])
+            for row, i in enumerate(idx):
+                n = int(offsets[i + 1] - offsets[i])
+                hidden[row, :n] = torch.from_numpy(np.array(values[offsets[i]:offsets[i + 1]], dtype=np.float32))
+            batch["hidden"] = hidden
+        yield batch
+
+
+def _logits(model, batch, depth):
+    if "hidden" in batch:
+        return suffix_logits(model, batch["hidden"], batch["attention_mask"], depth)
+    return model(input_ids=batch["input_ids"], attention_mask=batch["attention_mask"]).logits
+
+
+def _evaluate(model, dev_tok, data_collator, features, depth, batch_size=32):
+    import torch
+
+    model.eval()
+    correct = total = 0
+    with torch.inference_mode():
+        for batch in _batches(dev_tok, list(range(len(dev_tok))), batch_size, data_collator, features):
+            preds = _logits(model, batch, depth).argmax(-1)
+            mask = batch["labels"] != -100
+            correct += int((preds[mask] == batch["labels"][mask]).sum())
+            total += int(mask.sum())
+    model.train()
+    return correct / total if total else 0.0
+
+
+def _run_trial(trial_id, config, epochs_done, epochs_to, max_epochs, trial_dir):
+    """
+    Train trial ``trial_id`` from ``epochs_done`` to ``epochs_to`` epochs in
+    a worker and return its result row.
+    """
+    import torch
+    from transformers import DataCollatorForTokenClassification, get_linear_schedule_with_warmup
+
+    from .sweep import inference_throughput, prepare_model
+    from .synthetic import seed_everything
+
+    train_tok, dev_tok, tokenizer = _WORKER["train_tok"], _WORKER["dev_tok"], _WORKER["tokenizer"]
+    name, freeze_strategy, k = config["strategy"]
+    seed = _WORKER["seed"] + trial_id
+    seed_everything(seed)
+    model = prepare_model(_WORKER["model_init"](), freeze_strategy, k)
+    if config["freeze_embeddings"]:
+        model.distilbert.embeddings.requires_grad_(False)
+    depth = prefix_depth(model.config.n_layers, freeze_strategy, k, config["freeze_embeddings"])
+    train_features, dev_features = _WORKER["features"].get(depth, (None, None))
+    total_params, trainable_params = count_parameters(model)
+
+    batch_size = config["per_device_train_batch_size"]
+    steps_per_epoch = math.ceil(len(train_tok) / batch_size)
+    trainable = [p for p in model.parameters() if p.requires_grad]
+    optimizer = torch.optim.AdamW(trainable, lr=config["learning_rate"], weight_decay=config["weight_decay"])
+    scheduler = get_linear_schedule_with_warmup(optimizer, 0, max_epochs * steps_per_epoch)
+
+    state_path = os.path.join(trial_dir, "state.pt")
+    train_time, history = 0.0, []
+    if epochs_done:
+        state = torch.load(state_path, weights_only=False)
+        model.load_state_dict(state["params"], strict=False)
+        optimizer.load_state_dict(state["optimizer"])
+        scheduler.load_state_dict(state["scheduler"])
+        train_time, history = state["train_time"], state["history"]
+
+    data_collator = DataCollatorForTokenClassification(tokenizer, return_tensors="pt")
+    model.train()
+    for epoch in range(epochs_done, epochs_to):
+        order = torch.randperm(len(train_tok), generator=torch.Generator().manual_seed(seed * 1000 + epoch)).tolist()
+        start = time.perf_counter()
+        for batch in _batches(train_tok, order, batch_size, data_collator, train_features):
+            logits = _logits(model, batch, depth)
+            loss = torch.nn.functional.cross_entropy(logits.view(-1, logits.shape[-1]), batch["labels"].view(-1))
+            loss.backward()
+            optimizer.step()
+            scheduler.step()
+            optimizer.zero_grad(set_to_none=True)
+        train_time += time.perf_counter() - start
+        history.append(round(100 * _evaluate(model, dev_tok, data_collator, dev_features, depth), 1))
+
+    if epochs_to < max_epochs:
+        os.makedirs(trial_dir, exist_ok=True)
+        torch.save({
+            "params": {n: p.detach() for n, p in model.named_parameters() if p.requires_grad},
+            "optimizer": optimizer.state_dict(),
+            "scheduler": scheduler.state_dict(),
+            "train_time": train_time,
+            "history": history,
+        }, state_path)
+    elif os.path.exists(state_path):
+        os.remove(state_path)
+
+    return {
+        "Trial": trial_id,
+        "Strategy": name + (" + Frozen Embeddings" if config["freeze_embeddings"] else ""),
+        "Learning Rate": config["learning_rate"],
+        "Batch Size": batch_size,
+        "Weight Decay": config["weight_decay"],
+        "Epochs": epochs_to,
+        "Dev Accuracy (%)": history[-1],
+        "Trainable Params (M)": round(trainable_params / 1e6, 2),
+        "Total Params (M)": round(total_params / 1e6, 2),
+        "Training Time (s)": round(train_time, 1),
+        "Inference Tokens/s": round(inference_throughput(model, dev_tok, tokenizer)),
+        "Prefix Cache": depth if train_features is not None else None,
+        "History": history,
+    }
+
+
+def search(model_init, train_tok, dev_tok, tokenizer, output_dir="search", n_trials=20, space=None,
+           min_epochs=1, max_epochs=5, eta=3, workers=2, threads_per_worker=None, seed=42,
+           cache_prefix=True):
+    """
+    Run an ASHA random search and return one row per trial at the highest
+    budget it reached (``"Epochs"``), with ``"Stopped"`` marking trials that
+    were terminated early.
+
+    Args:
+        model_init: Picklable zero-argument model factory.
+        space: Search space (default ``SEARCH_SPACE``); must provide
+            "strategy", "freeze_embeddings", "learning_rate",
+            "per_device_train_batch_size" and "weight_decay".
+        workers: Parallel trial processes; 1 runs trials in this process.
+        threads_per_worker: ``torch`` threads per worker (default: the CPU
+            count split evenly).
+        cache_prefix: Precompute frozen-prefix features for trials that
+            freeze the embeddings.
+    """
+    space = space or SEARCH_SPACE
+    rng = np.random.default_rng(seed)
+    configs = [sample_config(space, rng) for _ in range(n_trials)]
+    budgets = rung_budgets(min_epochs, max_epochs, eta)
+
+    feature_paths = {}
+    if cache_prefix:
+        model = model_init()
+        num_layers = model.config.n_layers
+        depths = {prefix_depth(num_layers, c["strategy"][1], c["strategy"][2], c["freeze_embeddings"])
+                  for c in configs}
+        for depth in sorted(d for d in depths if d is not None):
+            paths = {split: os.path.join(output_dir, "features", f"{split}.depth{depth}.npy")
+                     for split in ("train", "dev")}
+            store_prefix_features(model, train_tok, tokenizer, depth, paths["train"])
+            store_prefix_features(model, dev_tok, tokenizer, depth, paths["dev"])
+            feature_paths[depth] = paths
+        del model
+
+    threads = threads_per_worker or max(1, (os.cpu_count() or 1) // max(1, workers))
+    initargs = (model_init, train_tok, dev_tok, tokenizer, feature_paths, seed, threads)
+    scheduler = ASHA(budgets, eta, n_trials)
+    latest = {}
+
+    def job(trial_id, rung):
+        epochs_done = budgets[rung - 1] if rung else 0
+        return (trial_id, configs[trial_id], epochs_done, budgets[rung], max_epochs,
+                os.path.join(output_dir, f"trial_{trial_id}"))
+
+    def record(trial_id, rung, row):
+        scheduler.report(trial_id, rung, row["Dev Accuracy (%)"])
+        latest[trial_id] = row
+
+    next_trial = 0
+    if workers <= 1:
+        _init_worker(*initargs)
+        while (item := scheduler.next_job()) is not None:
+            trial_id, rung = item
+            if trial_id is None:
+                trial_id, next_trial = next_trial, next_trial + 1
+            record(trial_id, rung, _run_trial(*job(trial_id, rung)))
+    else:
+        import multiprocessing
+
+        with ProcessPoolExecutor(workers, mp_context=multiprocessing.get_context("spawn"),
+                                 initializer=_init_worker, initargs=initargs) as pool:
+            running = {}
+            while True:
+                while len(running) < workers and (item := scheduler.next_job()) is not None:
+                    trial_id, rung = item
+                    if trial_id is None:
+                        trial_id, next_trial = next_trial, next_trial + 1
+                    running[pool.submit(_run_trial, *job(trial_id, rung))] = (trial_id, rung)
+                if not running:
+                    break
+                done, _ = wait(running, return_when=FIRST_COMPLETED)
+                for future in done:
+                    trial_id, rung = running.pop(future)
+                    record(trial_id, rung, future.result())
+
+    rows = [latest[trial_id] for trial_id in sorted(latest)]
+    for row in rows:
+        row["Stopped"] = row["Epochs"] < max_epochs
+    return rows
+
+
+def pareto_front(rows, maximize="Dev Accuracy (%)", minimize="Training Time (s)"):
+    """
+    Rows not dominated on (higher ``maximize``, lower ``minimize``), sorted
+    by ``minimize``. See ``pareto`` for more objectives.
+    """
+    from .pareto import pareto_front as front
+
+    return front(rows, objectives={maximize: "max", minimize: "min"})
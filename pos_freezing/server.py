@@ -0,0 +1,390 @@
+"""
+An asyncio tagging service with dynamic micro-batching.
+
+Concurrent requests are queued and gathered into micro-batches of up to
+``max_batch_size`` sentences, waiting at most ``max_wait_ms`` after the
+first request of a batch arrives. Each batch runs in a dedicated thread
+pool so the event loop keeps accepting requests. Admission is bounded: when
+``max_queue`` sentences are already waiting, new requests are rejected with
+HTTP 503 instead of growing latency without limit. An optional
+``SentenceCache`` answers repeated sentences before they are queued. If
+a batch fails, its sentences are tagged again one at a time, so only the
+requests whose sentences fail get the error. Stopping fails whatever is
+still queued with ``Stopped``.
+
+The HTTP front end uses only the standard library and is meant for
+localhost testing and simple deployments:
+
+    python -m pos_freezing.server --model-dir sweep/freeze_first_2 --port 8000
+
+    POST /tag      {"tokens": ["the", "cat", "sat"]}
+                   or {"sentences": [["the", "cat"], ["hello"]]}
+    GET  /metrics  latency percentiles, batch fill, queue depth, rejections,
+                   cache hit rates and evictions
+    GET  /health
+"""
+
+import argparse
+import asyncio
+import collections
+import json
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+
+from .cache import SentenceCache, WordPieceCache
+from .inference import tag_sentences
+
+
+class Overloaded(Exception):
+    """
+    Raised when the admission queue is full.
+    """
+
+
+class Stopped(Exception):
+    """
+    Raised for sentences still queued when the batcher stops.
+    """
+
+
+class MicroBatcher:
+    """
+    Gathers sentences from concurrent callers into batches for ``tag_fn``.
+
+    Args:
+        tag_fn: Blocking callable mapping a list of sentences to a list of
+            per-word tag lists.
+        max_batch_size: Upper bound on sentences per batch.
+        max_wait_ms: Longest time the first sentence of a batch waits for
+            company before the batch is dispatched.
+        max_queue: Sentences allowed to wait before requests are rejected.
+        workers: Threads running ``tag_fn``; batches beyond that wait.
+        window: Number of recent requests kept for latency percentiles.
+        cache: Optional ``SentenceCache``; hits never reach the queue.
+    """
+
+    def __init__(self, tag_fn, max_batch_size=32, max_wait_ms=5.0, max_queue=1024, workers=1, window=10000,
+                 cache=None):
+        self.tag_fn = tag_fn
+        self.cache = cache
+        self.max_batch_size = max_batch_size
+        self.max_wait = max_wait_ms / 1000.0
+        self.max_queue = max_queue
+        self.executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="tagger")
+        self.workers = asyncio.Semaphore(workers)
+        self.queue = None
+        self.pending = 0
+        self.latencies = collections.deque(maxlen=window)
+        self.batch_sizes = collections.deque(maxlen=window)
+        self.requests = 0
+        self.rejected = 0
+        self.errors = 0
+        self._task = None
+        # the loop holds tasks weakly; keep in-flight dispatches alive
+        self._dispatches = set()
+        # sentences taken off the queue for the batch being gathered
+        self._gathering = []
+
+    async def start(self):
+        self.queue = asyncio.Queue()
+        self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+        # nothing will dispatch what is still waiting: fail it instead of hanging its callers
+        waiting = self._gathering
+        self._gathering = []
+        while self.queue is not None and not self.queue.empty():
+            waiting.append(self.queue.get_nowait())
+        self.pending -= len(waiting)
+        for _, future in waiting:
+            if not future.done():
+                future.set_exception(Stopped("the tagger stopped before this sentence was tagged"))
+        # let in-flight batches finish, then join the threads off the event loop
+        if self._dispatches:
+            await asyncio.gather(*self._dispatches, return_exceptions=True)
+        await asyncio.get_running_loop().run_in_executor(None, self.executor.shutdown)
+
+    async def submit(self, sentences):
+        """
+        Tag a list of sentences, waiting for the batch they land in.
+
+        Raises:
+            Overloaded: If admitting them would exceed ``max_queue``.
+            Stopped: If the batcher is not running or stops first.
+        """
+        if self._task is None:
+            raise Stopped("the tagger is not running")
+        start = time.perf_counter()
+        results = [None] * len(sentences)
+        misses = list(range(len(sentences)))
+        if self.cache is not None:
+            keys = [self.cache.key(s) for s in sentences]
+            results = [self.cache.get(key) for key in keys]
+            misses = [i for i, tags in enumerate(results) if tags is None]
+
+        if self.pending + len(misses) > self.max_queue:
+            self.rejected += 1
+            raise Overloaded(f"queue full ({self.pending} sentences waiting)")
+        self.requests += 1
+        if not misses:
+            self.latencies.append(time.perf_counter() - start)
+            return results
+
+        self.pending += len(misses)
+        loop = asyncio.get_running_loop()
+        futures = [loop.create_future() for _ in misses]
+        for i, future in zip(misses, futures):
+            self.queue.put_nowait((sentences[i], future))
+        try:
+            for i, tags in zip(misses, await asyncio.gather(*futures)):
+                results[i] = tags
+                if self.cache is not None:
+                    self.cache.put(keys[i], tags)
+            return results
+        finally:
+            self.latencies.append(time.perf_counter() - start)
+
+    async def _run(self):
+        loop = asyncio.get_running_loop()
+        while True:
+            batch = self._gathering = [await self.queue.get()]
+            deadline = loop.time() + self.max_wait
+            while len(batch) < self.max_batch_size:
+                timeout = deadline - loop.time()
+                if timeout <= 0:
+                    break
+                try:
+                    batch.append(await asyncio.wait_for(self.queue.get(), timeout))
+                except asyncio.TimeoutError:
+                    break
+            await self.workers.acquire()
+            task = asyncio.create_task(self._dispatch(batch))
+            self.pending -= len(batch)
+            self._gathering = []
+            self._dispatches.add(task)
+            task.add_done_callback(self._dispatches.discard)
+
+    async def _dispatch(self, batch):
+        loop = asyncio.get_running_loop()
+        sentences = [sentence for sentence, _ in batch]
+        self.batch_sizes.append(len(batch))
+        try:
+            try:
+                outcomes = [(tags, None) for tags in
+                            await loop.run_in_executor(self.executor, self.tag_fn, sentences)]
+            except Exception as exc:
+                # retag one by one so only the sentences that fail get the error
+                outcomes = ([(None, exc)] if len(sentences) == 1 else
+                            await loop.run_in_executor(self.executor, self._tag_each, sentences))
+            for (_, future), (tags, error) in zip(batch, outcomes):
+                if error is not None:
+                    self.errors += 1
+                if future.done():
+                    continue
+                if error is not None:
+                    future.set_exception(error)
+                else:
+                    future.set_result(tags)
+        finally:
+            self.workers.release()
+
+    def _tag_each(self, sentences):
+        outcomes = []
+        for sentence in sentences:
+            try:
+                outcomes.append((self.tag_fn([sentence])[0], None))
+            except Exception as exc:
+                outcomes.append((None, exc))
+        return outcomes
+
+    def stats(self):
+        latencies = np.array(self.latencies) * 1000.0
+        batch_sizes = np.array(self.batch_sizes)
+        caches = {}
+        if self.cache is not None:
+            caches["sentence_cache"] = self.cache.stats()
+        word_cache = getattr(self.tag_fn, "word_cache", None)
+        if word_cache is not None:
+            caches["word_cache"] = word_cache.stats()
+        return {
+            "requests": self.requests,
+            "rejected": self.rejected,
+            "errors": self.errors,
+            "queue_depth": self.pending,
+            "latency_ms_p50": float(np.percentile(latencies, 50)) if len(latencies) else None,
+            "latency_ms_p99": float(np.percentile(latencies, 99)) if len(latencies) else None,
+            "batches": len(batch_sizes),
+            "mean_batch_size": float(batch_sizes.mean()) if len(batch_sizes) else None,
+            "batch_fill": float(batch_sizes.mean() / self.max_batch_size) if len(batch_sizes) else None,
+            **caches,
+        }
+
+
+REASONS = {200: "OK", 400: "Bad Request", 404: "Not Found", 405: "Method Not Allowed",
+           413: "Payload Too Large", 500: "Internal Server Error", 503: "Service Unavailable"}
+
+
+class TaggingServer:
+    """
+    Minimal HTTP/1.1 front end (keep-alive, JSON bodies) over a ``MicroBatcher``.
+    """
+
+    def __init__(self, batcher, host="127.0.0.1", port=8000, max_body_bytes=1 << 20):
+        self.batcher = batcher
+        self.host = host
+        self.port = port
+        self.max_body_bytes = max_body_bytes
+        self.server = None
+
+    async def start(self):
+        await self.batcher.start()
+        self.server = await asyncio.start_server(self._handle, self.host, self.port)
+        # port 0 picks a free port; report the real one
+        self.port = self.server.sockets[0].getsockname()[1]
+
+    async def stop(self):
+        if self.server is not None:
+            self.server.close()
+            await self.server.wait_closed()
+        await self.batcher.stop()
+
+    async def serve_forever(self):
+        await self.start()
+        try:
+            await self.server.serve_forever()
+        finally:
+            await self.stop()
+
+    async def _handle(self, reader, writer):
+        try:
+            while True:
+                request_line = await reader.readline()
+                if not request_line:
+                    break
+                method, path, _ = request_line.decode("latin-1").split(" ", 2)
+                headers = {}
+                while True:
+                    line = await reader.readline()
+                    if line in (b"\r\n", b"\n", b""):
+                        break
+                    key, _, value = line.decode("latin-1").partition(":")
+                    headers[key.strip().lower()] = value.strip()
+
+                length = int(headers.get("content-length", 0))
+                if length > self.max_body_bytes:
+                    await self._respond(writer, 413, {"error": "request body too large"}, close=True)
+                    break
+                body = await reader.readexactly(length) if length else b""
+
+                status, payload = await self._route(method, path, body)
+                close = headers.get("connection", "").lower() == "close"
+                await self._respond(writer, status, payload, close=close)
+                if close:
+                    break
+        except (asyncio.IncompleteReadError, ConnectionError, ValueError):
+            pass
+        finally:
+            writer.close()
+
+    async def _route(self, method, path, body):
+        if path == "/health":
+            return 200, {"status": "ok"}
+        if path == "/metrics":
+            return 200, self.batcher.stats()
+        if path != "/tag":
+            return 404, {"error": f"no route for {path}"}
+        if method != "POST":
+            return 405, {"error": "use POST"}
+
+        try:
+            request = json.loads(body or b"{}")
+            single = "tokens" in request
+            sentences = [request["tokens"]] if single else request["sentences"]
+            if not all(isinstance(s, list) and all(isinstance(w, str) for w in s) for s in sentences):
+                raise ValueError
+        except (ValueError, KeyError, TypeError):
+            return 400, {"error": 'expected {"tokens": [...]} or {"sentences": [[...], ...]}'}
+
+        try:
+            tags = await self.batcher.submit(sentences)
+        except (Overloaded, Stopped) as exc:
+            return 503, {"error": str(exc)}
+        except Exception as exc:
+            return 500, {"error": str(exc)}
+        return 200, {"upos": tags[0]} if single else {"upos": tags}
+
+    async def _respond(self, writer, status, payload, close=False):
+        body = json.dumps(payload).encode("utf-8")
+        head = (
+            f"HTTP/1.1 {status} {REASONS.get(status, '')}\r\n"
+            f"Content-Type: application/json\r\n"
+            f"Content-Length: {len(body)}\r\n"
+            f"Connection: {'close' if close else 'keep-alive'}\r\n\r\n"
+        )
+        writer.write(head.encode("latin-1") + body)
+        await writer.drain()
+
+
+def make_tag_fn(model, tokenizer, id2tag=None, max_length=128, word_cache_size=0, stride=None):
+    """
+    Bind a model and tokenizer into the blocking callable ``MicroBatcher``
+    expects. With ``word_cache_size`` > 0 words are encoded through a
+    ``WordPieceCache``, exposed as ``tag_fn.word_cache``. ``stride`` tags
+    long sentences as overlapping windows (see ``tag_sentences``).
+    """
+    model.eval()
+    word_cache = WordPieceCache(tokenizer, word_cache_size) if word_cache_size else None
+
+    def tag_fn(sentences):
+        return tag_sentences(model, tokenizer, sentences, id2tag, max_length, word_cache=word_cache, stride=stride)
+    tag_fn.word_cache = word_cache
+    return tag_fn
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Serve a trained PoS tagger over HTTP.")
+    parser.add_argument("--model-dir", required=True, help="directory saved with save_pretrained")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8000)
+    parser.add_argument("--max-batch-size", type=int, default=32)
+    parser.add_argument("--max-wait-ms", type=float, default=5.0)
+    parser.add_argument("--max-queue", type=int, default=1024)
+    parser.add_argument("--sentence-cache", type=int, default=100_000,
+                        help="sentences kept in the result cache (0 = off)")
+    parser.add_argument("--word-cache", type=int, default=200_000,
+                        help="words kept in the tokenizer-output cache (0 = off)")
+    parser.add_argument("--max-length", type=int, default=128, help="subwords per sequence or window")
+    parser.add_argument("--stride", type=int, default=None,
+                        help="tag sentences longer than --max-length as windows overlapping by this many subwords")
+    parser.add_argument("--threads", type=int, default=0, help="torch intra-op threads (0 = leave as is)")
+    args = parser.parse_args(argv)
+
+    import torch
+    from transformers import AutoModelForTokenClassification, AutoTokenizer
+
+    if args.threads:
+        torch.set_num_threads(args.threads)
+    tokenizer = AutoTokenizer.from_pretrained(args.model_dir)
+    model = AutoModelForTokenClassification.from_pretrained(args.model_dir)
+    batcher = MicroBatcher(
+        make_tag_fn(model, tokenizer, max_length=args.max_length, word_cache_size=args.word_cache,
+                    stride=args.stride),
+        args.max_batch_size, args.max_wait_ms, args.max_queue,
+        cache=SentenceCache(args.sentence_cache) if args.sentence_cache else None,
+    )
+    server = TaggingServer(batcher, args.host, args.port)
+    print(f"Serving on http://{args.host}:{args.port}")
+    asyncio.run(server.serve_forever())
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,210 @@
+"""
+Multi-seed runs and paired significance tests between freezing strategies.
+
+The results table compares strategies on single seed-42 runs, where a gap
+of 0.1 points can be seed noise. ``multi_seed`` trains every strategy with
+several seeds in parallel worker processes. Each worker receives the
+tokenized splits and the tokenizer once and builds the base model once.
+Every run starts from a copy of it, with the classifier head
+re-initialized from the run's seed, and the seed also drives data order
+and dropout. Each run returns its sweep row and the per-token correctness
+of the trained model on the dev split.
+
+- ``seed_table``: mean and standard deviation per strategy;
+- ``significance_table``: a paired bootstrap of every strategy against a
+  reference. The statistic is the difference in seed-averaged accuracy,
+  resampled over sentences by default, since tokens of one sentence are
+  not independent. All resamples are drawn at once as a count matrix and
+  reduced with one matrix product. The table reports the 95% interval, a
+  two-sided p-value and whether the interval lies above ``-margin``,
+  i.e. whether the strategy is no more than ``margin`` points worse.
+
+    rows, correctness = multi_seed(STRATEGIES, model_init, train_tok, dev_tok, tokenizer, seeds=range(5))
+    seed_table(rows)
+    significance_table(correctness, reference="Full Fine-tuning")
+"""
+
+import copy
+import functools
+import os
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+
+import numpy as np
+
+# Per-process state of a seed worker, set by ``_init_worker``
+_WORKER = {}
+
+
+def _init_worker(model_init, train_tok, dev_tok, tokenizer, threads):
+    import torch
+
+    if threads:
+        torch.set_num_threads(threads)
+    _WORKER.update(base=model_init(), train_tok=train_tok, dev_tok=dev_tok, tokenizer=tokenizer)
+
+
+def _seeded_copy(base, seed, models):
+    import torch
+
+    model = copy.deepcopy(base)
+    torch.manual_seed(seed)
+    with torch.no_grad():
+        model._init_weights(model.classifier)
+    models.append(model)
+    return model
+
+
+def _run_seed(name, strategy, k, seed, output_dir, kwargs):
+    from .metrics import token_correctness
+    from .sweep import train_strategy
+
+    models = []
+    training_args = dict(kwargs.pop("training_args", None) or {}, seed=seed)
+    row = train_strategy(name, strategy, k, functools.partial(_seeded_copy, _WORKER["base"], seed, models),
+                         _WORKER["train_tok"], _WORKER["dev_tok"], _WORKER["tokenizer"],
+                         output_dir=os.path.join(output_dir, f"seed_{seed}"), training_args=training_args, **kwargs)
+    row["Seed"] = seed
+    correct, offsets = token_correctness(models[0], _WORKER["dev_tok"], _WORKER["tokenizer"])
+    # "Dev Accuracy (%)" is rounded to 0.1 points, too coarse for seed spread
+    row["Dev Accuracy Raw (%)"] = 100 * float(correct.mean()) if len(correct) else 0.0
+    return row, correct, offsets
+
+
+def multi_seed(strategies, model_init, train_tok, dev_tok, tokenizer, seeds=(42, 43, 44, 45, 46), workers=2,
+               threads_per_worker=None, output_dir="seeds", **kwargs):
+    """
+    Train every ``(name, strategy, k)`` once per seed.
+
+    Args:
+        model_init: Picklable zero-argument model factory, called once per
+            worker.
+        workers: Parallel processes; 1 runs everything in this process.
+        threads_per_worker: ``torch`` threads per worker (default: the CPU
+            count split evenly).
+
+    Keyword arguments go to ``train_strategy``.
+
+    Returns:
+        (rows, correctness): the sweep rows with "Seed" and unrounded "Dev
+        Accuracy Raw (%)" columns, and a dict mapping each strategy name to
+        ``{"correct": (n_seeds, n_tokens) bool array, "offsets": sentence
+        offsets}``, seeds in ``seeds`` order.
+    """
+    seeds = list(seeds)
+    threads = threads_per_worker or max(1, (os.cpu_count() or 1) // max(1, workers))
+    initargs = (model_init, train_tok, dev_tok, tokenizer, threads)
+    jobs = [(name, strategy, k, seed, output_dir, dict(kwargs)) for name, strategy, k in strategies for seed in seeds]
+
+    results = {}
+    if workers <= 1:
+        _init_worker(*initargs)
+        for job in jobs:
+            results[job[0], job[3]] = _run_seed(*job)
+    else:
+        import multiprocessing
+
+        with ProcessPoolExecutor(workers, mp_context=multiprocessing.get_context("spawn"),
+                                 initializer=_init_worker, initargs=initargs) as pool:
+            running = {pool.submit(_run_seed, *job): (job[0], job[3]) for job in jobs}
+            while running:
+                done, _ = wait(running, return_when=FIRST_COMPLETED)
+                for future in done:
+                    results[running.pop(future)] = future.result()
+
+    rows, correctness = [], {}
+    for name, _, _ in strategies:
+        runs = [results[name, seed] for seed in seeds]
+        rows += [row for row, _, _ in runs]
+        correctness[name] = {"correct": np.stack([correct for _, correct, _ in runs]), "offsets": runs[0][2]}
+    return rows, correctness
+
+
+def seed_table(rows, metrics=("Dev Accuracy Raw (%)", "Training Time (s)", "Inference Tokens/s")):
+    """
+    Mean and standard deviation (ddof=1) of ``metrics`` per strategy. Dev
+    accuracy is aggregated unrounded, from the per-token correctness.
+    """
+    import pandas as pd
+
+    df = pd.DataFrame(rows)
+    grouped = df.groupby("Strategy", sort=False)
+    table = grouped[list(metrics)].agg(["mean", "std"])
+    table.columns = [f"{metric} {stat}" for metric, stat in table.columns]
+    table.insert(0, "Seeds", grouped.size())
+    return table.round(3).reset_index()
+
+
+def paired_bootstrap(correct_a, correct_b, offsets=None, n_resamples=10_000, seed=42, chunk_size=1000):
+    """
+    Paired bootstrap of the accuracy difference between two systems on the
+    same tokens.
+
+    Args:
+        correct_a, correct_b: ``(n_tokens,)`` or ``(n_seeds, n_tokens)``
+            bool arrays; seeds are averaged per token.
+        offsets: Sentence offsets into the token axis; if given, sentences
+            are resampled instead of tokens.
+
+    Returns:
+        dict with the observed difference (a - b, in points), the 2.5 and
+        97.5 percentiles of the resampled differences, and the two-sided
+        p-value of a zero difference.
+    """
+    a = np.atleast_2d(correct_a).mean(0)
+    b = np.atleast_2d(correct_b).mean(0)
+    diff = a - b
+    if offsets is not None:
+        # per-sentence sums and token counts; a resample's difference is sum / count
+        sums = np.add.reduceat(diff, offsets[:-1]) if len(diff) else diff
+        counts = np.diff(offsets).astype(np.float64)
+        keep = counts > 0
+        sums, counts = sums[keep], counts[keep]
+    else:
+        sums, counts = diff, np.ones_like(diff)
+    observed = sums.sum() / counts.sum()
+
+    rng = np.random.default_rng(seed)
+    n = len(sums)
+    values = np.stack([sums, counts], axis=1)
+    resampled = []
+    for start in range(0, n_resamples, chunk_size):
+        size = min(chunk_size, n_resamples - start)
+        weights = rng.multinomial(n, np.full(n, 1.0 / n), size=size).astype(np.float64)
+        totals = weights @ values
+        resampled.append(totals[:, 0] / totals[:, 1])
+    resampled = np.concatenate(resampled)
+    low, high = np.percentile(resampled, [2.5, 97.5])
+    # shift to the null of no difference
+    p_value = float(np.mean(np.abs(resampled - observed) >= abs(observed)))
+    return {"diff": float(100 * observed), "low": float(100 * low), "high": float(100 * high), "p_value": p_value}
+
+
+def significance_table(correctness, reference, margin=0.1, by_sentence=True, n_resamples=10_000, seed=42):
+    """
+    ``paired_bootstrap`` of every strategy in ``correctness`` (as returned
+    by ``multi_seed``) against ``reference``.
+
+    Returns:
+        A DataFrame with the accuracy difference and its 95% interval in
+        points, the p-value, and "Within Margin" when the interval's lower
+        end is above ``-margin`` points.
+    """
+    import pandas as pd
+
+    ref = correctness[reference]
+    rows = []
+    for name, result in correctness.items():
+        if name == reference:
+            continue
+        stats = paired_bootstrap(result["correct"], ref["correct"], ref["offsets"] if by_sentence else None,
+                                 n_resamples, seed)
+        rows.append({
+            "Strategy": name,
+            "Reference": reference,
+            "Δ Accuracy (pts)": round(stats["diff"], 3),
+            "CI Low": round(stats["low"], 3),
+            "CI High": round(stats["high"], 3),
+            "p-value": round(stats["p_value"], 4),
+            "Within Margin": bool(stats["low"] > -margin),
+        })
+    return pd.DataFrame(rows)
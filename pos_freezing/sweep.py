@@ -0,0 +1,331 @@
+"""
+Running the freezing study as one sweep and collecting a results table.
+
+Each strategy is a ``(name, freeze_strategy, k)`` tuple as in
+``freezing.STRATEGIES``. Besides the ``freeze_layers`` strategies, the
+sweep understands ``"lora"``, where ``k`` is the adapter rank, so LoRA runs
+land in the same table as the freezing runs. Every run can use fp32 or
+bf16 precision (see ``precision``); rows record which one.
+"""
+
+import functools
+import os
+import time
+
+from .checkpointing import apply_checkpointing
+from .freezing import count_parameters, freeze_layers
+from .lora import apply_lora, merge_lora
+from .metrics import compute_metrics
+from .precision import PRECISIONS, autocast_for, parameter_bytes, store_frozen_in_bf16
+
+# Hyperparameters used by every run in the notebooks
+DEFAULT_TRAINING_ARGS = dict(
+    eval_strategy="epoch",
+    save_strategy="no",
+    learning_rate=5e-5,
+    per_device_train_batch_size=16,
+    num_train_epochs=5,
+    weight_decay=0.01,
+    logging_steps=50,
+    report_to="none",
+)
+
+ENGINES = ("trainer", "lean", "lean_compiled")
+
+# LoRA runs conventionally use a larger learning rate than full fine-tuning
+LORA_LEARNING_RATE = 5e-4
+
+
+def load_pretrained(model_name, tag2id):
+    """
+    Load a fresh token classifier, as each notebook section does with
+    ``from_pretrained``.
+    """
+    from transformers import AutoModelForTokenClassification
+
+    return AutoModelForTokenClassification.from_pretrained(
+        model_name,
+        num_labels=len(tag2id),
+        id2label={i: t for t, i in tag2id.items()},
+        label2id=tag2id,
+    )
+
+
+def pretrained_model_init(model_name, tag2id):
+    """
+    Return a zero-argument factory for ``load_pretrained``. It is picklable,
+    so it can be sent to worker processes.
+    """
+    return functools.partial(load_pretrained, model_name, tag2id)
+
+
+def prepare_model(model, strategy, k=0, lora_kwargs=None):
+    """
+    Apply a sweep strategy to a freshly loaded model.
+    """
+    if strategy == "lora":
+        apply_lora(model, rank=k, **(lora_kwargs or {}))
+    else:
+        freeze_layers(model, strategy, k)
+    return model
+
+
+def epoch_history(log_history):
+    """
+    Dev accuracy (%) per epoch from ``trainer.state.log_history``.
+    """
+    return [round(100 * entry["eval_accuracy"], 1) for entry in log_history if "eval_accuracy" in entry]
+
+
+def inference_throughput(model, dataset, tokenizer, batch_size=32, repeats=1):
+    """
+    Tagging throughput in subword tokens per second (padding excluded) over
+    a tokenized split, with dropout off and autograd disabled.
+    """
+    import torch
+    from transformers import DataCollatorForTokenClassification
+
+    data_collator = DataCollatorForTokenClassification(tokenizer, return_tensors="pt")
+    batches = []
+    for start in range(0, len(dataset), batch_size):
+        rows = dataset[start:start + batch_size]
+        batches.append(data_collator([
+            {"input_ids": ids, "labels": labels} for ids, labels in zip(rows["input_ids"], rows["labels"])
+        ]))
+    n_tokens = sum(int(batch["attention_mask"].sum()) for batch in batches)
+
+    was_training = model.training
+    model.eval()
+    start = time.perf_counter()
+    with torch.inference_mode(), autocast_for(model):
+        for _ in range(repeats):
+            for batch in batches:
+                model(input_ids=batch["input_ids"], attention_mask=batch["attention_mask"])
+    elapsed = time.perf_counter() - start
+    model.train(was_training)
+    return repeats * n_tokens / elapsed
+
+
+def effective_training_args(strategy, precision="fp32", training_args=None):
+    """
+    ``TrainingArguments`` keywords a run actually uses: the notebook
+    defaults, strategy/precision adjustments, then explicit overrides.
+    """
+    args = dict(DEFAULT_TRAINING_ARGS)
+    if strategy == "lora":
+        args["learning_rate"] = LORA_LEARNING_RATE
+    if precision == "bf16":
+        args.update(bf16=True, use_cpu=True)
+    args.update(training_args or {})
+    return args
+
+
+def count_tokens(dataset):
+    """
+    Non-padding subword tokens in a tokenized split.
+    """
+    return sum(len(ids) for ids in dataset["input_ids"])
+
+
+def train_strategy(name, strategy, k, model_init, train_tok, dev_tok, tokenizer,
+                   output_dir="sweep", training_args=None, lora_kwargs=None, save_model=False,
+                   precision="fp32", checkpointing=None, callbacks=None, profile_dir=None,
+                   track_memory=False, curriculum_epochs=0, engine="trainer"):
+    """
+    Fine-tune one strategy and return its row of the results table.
+
+    Args:
+        name: Display name, e.g. "Freeze First 2".
+        strategy, k: Passed to ``prepare_model``.
+        model_init: Zero-argument factory returning a fresh model.
+        training_args: Overrides for ``DEFAULT_TRAINING_ARGS``.
+        lora_kwargs: Extra arguments for ``apply_lora``.
+        save_model: Save the trained (merged) model and tokenizer to the
+            run's ``output_dir`` and record it as "Model Dir", e.g. to use
+            the best run as a distillation teacher.
+        precision: "fp32", or "bf16" to store frozen weights in bfloat16
+            and train the rest under CPU bf16 autocast with fp32 master
+            weights.
+        checkpointing: None, or a policy for ``checkpointing.apply_checkpointing``
+            ("trainable", "all" or layer indices) to trade recomputation for
+            activation memory, e.g. to raise ``per_device_train_batch_size``.
+        callbacks: Extra ``TrainerCallback`` instances.
+        profile_dir: Profile training steps with ``profiling.profiler_callback``,
+            write the Chrome trace there and add it, with per-module backward
+            milliseconds per step, to the row.
+        track_memory: Track the run with ``memory.memory_callback`` and add
+            peak RSS ("Peak Memory (MB)") and peak parameter, gradient,
+            optimizer-state, activation and data MB to the row.
+        curriculum_epochs: Order the first epochs' batches from short to
+            long sentences (``coreset.CurriculumSampler``).
+        engine: "trainer" for ``transformers.Trainer``, "lean" for
+            ``lean.LeanTrainer`` or "lean_compiled" for the same under
+            ``torch.compile``. The lean engines run no callbacks, so they
+            cannot be combined with ``callbacks``, ``profile_dir``,
+            ``track_memory`` or ``curriculum_epochs``.
+    """
+    from transformers import DataCollatorForTokenClassification, Trainer, TrainingArguments
+
+    if precision not in PRECISIONS:
+        raise ValueError(f"Unknown precision: {precision}")
+    if engine not in ENGINES:
+        raise ValueError(f"Unknown engine: {engine}")
+
+    model = prepare_model(model_init(), strategy, k, lora_kwargs)
+    total_params, trainable_params = count_parameters(model)
+    if precision == "bf16":
+        store_frozen_in_bf16(model)
+    if checkpointing:
+        apply_checkpointing(model, checkpointing)
+
+    args = effective_training_args(strategy, precision, training_args)
+    slug = name.lower().replace(" ", "_").replace("=", "")
+    if precision != "fp32":
+        slug += f"_{precision}"
+    args.setdefault("output_dir", os.path.join(output_dir, slug))
+    callbacks = list(callbacks or [])
+    if profile_dir:
+        from .profiling import profiler_callback
+
+        profiler = profiler_callback(profile_dir, slug)
+        callbacks.append(profiler)
+    if track_memory:
+        from .memory import memory_callback
+
+        memory = memory_callback()
+        callbacks.append(memory)
+
+    trainer_kwargs = {}
+    if engine != "trainer":
+        from .lean import LeanTrainer
+
+        if callbacks or curriculum_epochs:
+            raise ValueError(f"The {engine} engine does not run Trainer callbacks or samplers")
+        trainer_class = LeanTrainer
+        trainer_kwargs["compile"] = engine == "lean_compiled"
+    elif curriculum_epochs:
+        from .coreset import _curriculum_trainer_class
+
+        trainer_class = _curriculum_trainer_class()
+        trainer_kwargs["curriculum_epochs"] = curriculum_epochs
+    else:
+        trainer_class = Trainer
+
+    trainer = trainer_class(
+        model=model,
+        args=TrainingArguments(**args),
+        train_dataset=train_tok,
+        eval_dataset=dev_tok,
+        processing_class=tokenizer,
+        data_collator=DataCollatorForTokenClassification(tokenizer),
+        compute_metrics=compute_metrics,
+        callbacks=callbacks,
+        **trainer_kwargs,
+    )
+
+    start = time.perf_counter()
+    trainer.train()
+    train_time = time.perf_counter() - start
+    history = epoch_history(trainer.state.log_history)
+
+    if strategy == "lora":
+        merge_lora(trainer.model)
+    metrics = trainer.evaluate(eval_dataset=dev_tok)
+    tokens_per_second = inference_throughput(trainer.model, dev_tok, tokenizer)
+
+    model_dir = None
+    if save_model:
+        model_dir = args["output_dir"]
+        trainer.save_model(model_dir)
+
+    row = {
+        "Strategy": name,
+        "Precision": precision,
+        "Engine": engine,
+        "Checkpointing": checkpointing or "none",
+        "Batch Size": args["per_device_train_batch_size"],
+        "Dev Accuracy (%)": round(100 * metrics["eval_accuracy"], 1),
+        "Trainable Params (M)": round(trainable_params / 1e6, 2),
+        "Total Params (M)": round(total_params / 1e6, 2),
+        "Trainable (%)": trainable_params / total_params * 100,
+        "Training Time (s)": round(train_time, 1),
+        "Train Tokens/s": round(count_tokens(train_tok) * args["num_train_epochs"] / train_time),
+        "Inference Tokens/s": round(tokens_per_second),
+        "Param Memory (MB)": round(parameter_bytes(trainer.model) / 2**20, 1),
+        "History": history,
+        "Model Dir": model_dir,
+    }
+    if profile_dir:
+        row["Trace"] = profiler.trace_path
+        row["Backward (ms/step)"] = {r["Module"]: r["Backward ms/call"] for r in profiler.profiler.summary()}
+    if track_memory:
+        row.update(memory.summary)
+    return row
+
+
+def run_sweep(strategies, model_init, train_tok, dev_tok, tokenizer, precisions=("fp32",),
+              store=None, treebank=None, model_name=None, **kwargs):
+    """
+    Train every strategy in turn, once per precision. Keyword arguments go
+    to ``train_strategy``.
+
+    With a ``results_store.ResultsStore``, each run is keyed by a hash of
+    treebank, model, data, strategy, hyperparameters and code version;
+    runs already in the store are returned from it instead of retrained,
+    and new ones are added, so only changed configurations cost time.
+
+    Returns:
+        A list of result rows (see ``results_table``; with both "fp32" and
+        "bf16", ``precision.precision_deltas`` compares them).
+    """
+    from .results_store import dataset_digest, run_config
+
+    data = None
+    rows = []
+    for name, strategy, k in strategies:
+        for precision in precisions:
+            key = config = None
+            if store is not None:
+                if data is None:
+                    data = {"train": dataset_digest(train_tok), "dev": dataset_digest(dev_tok)}
+                config = run_config(treebank, model_name, name, strategy, k, precision, data, **kwargs)
+                key = store.key(config)
+                cached = store.get(key)
+                if cached is not None:
+                    rows.append(cached)
+                    continue
+            row = train_strategy(name, strategy, k, model_init, train_tok, dev_tok, tokenizer,
+                                 precision=precision, **kwargs)
+            if store is not None:
+                row["Treebank"] = treebank
+                store.put(key, config, row)
+            rows.append(row)
+    return rows
+
+
+def best_row(rows, metric="Dev Accuracy (%)"):
+    """
+    The row with the highest ``metric``, e.g. to pick a distillation teacher.
+    """
+    return max(rows, key=lambda row: row[metric])
+
+
+def results_table(rows, baseline="Baseline"):
+    """
+    Build the "Result Summary" DataFrame with compute savings relative to
+    the ``baseline`` row of the same precision (when present).
+    """
+    import pandas as pd
+
+    df = pd.DataFrame(rows)
+    if "Precision" not in df:
+        df["Precision"] = "fp32"
+    savings = pd.Series(float("nan"), index=df.index)
+    for precision, group in df.groupby(df["Precision"].fillna("fp32")):
+        base = group[group["Strategy"] == baseline]
+        if len(base):
+            baseline_time = base["Training Time (s)"].iloc[0]
+            savings[group.index] = (baseline_time - group["Training Time (s)"]) / baseline_time * 100
+    if savings.notna().any():
+        df["Compute Savings (%)"] = savings.round(1)
+    return df
@@ -0,0 +1,154 @@
+"""
+Synthetic, UD-shaped data and a small local DistilBERT for offline runs.
+
+Nothing here touches the network: the tokenizer vocabulary is built from the
+generated corpus and the model is randomly initialised from a small config.
+The shapes (sentence lengths, tag set, subword fan-out) follow UD English
+EWT closely enough for timing and plumbing, not for accuracy.
+"""
+
+import os
+import random
+import string
+
+import numpy as np
+
+UPOS_TAGS = [
+    "ADJ", "ADP", "ADV", "AUX", "CCONJ", "DET", "INTJ", "NOUN", "NUM",
+    "PART", "PRON", "PROPN", "PUNCT", "SCONJ", "SYM", "VERB", "X",
+]
+
+SPECIAL_TOKENS = ["[PAD]", "[UNK]", "[CLS]", "[SEP]", "[MASK]"]
+
+
+def make_synthetic_sentences(n_sentences, seed=42, vocab_size=5000, mean_length=17, max_length=160):
+    """
+    Generate (tokens, upos) pairs shaped like a UD treebank split.
+
+    Word forms follow a Zipf distribution over a random lowercase vocabulary,
+    each form has a fixed most-likely tag, and sentence lengths are drawn from
+    a geometric distribution with a long tail, so a few sentences exceed the
+    128-subword truncation limit as in the real data.
+    """
+    rng = np.random.default_rng(seed)
+    letters = np.array(list(string.ascii_lowercase))
+
+    forms = []
+    seen = set()
+    while len(forms) < vocab_size:
+        length = int(rng.integers(1, 12))
+        form = "".join(rng.choice(letters, size=length))
+        if form not in seen:
+            seen.add(form)
+            forms.append(form)
+    form_tags = rng.integers(0, len(UPOS_TAGS), size=vocab_size)
+
+    ranks = np.arange(1, vocab_size + 1)
+    probs = 1.0 / ranks
+    probs /= probs.sum()
+
+    sentences = []
+    for _ in range(n_sentences):
+        length = int(min(max_length, max(1, rng.geometric(1.0 / mean_length))))
+        word_ids = rng.choice(vocab_size, size=length, p=probs)
+        tags = form_tags[word_ids].copy()
+        # ~10% tag ambiguity so the task is not a pure lookup
+        flip = rng.random(length) < 0.1
+        tags[flip] = rng.integers(0, len(UPOS_TAGS), size=int(flip.sum()))
+        sentences.append(([forms[i] for i in word_ids], [UPOS_TAGS[t] for t in tags]))
+    return sentences
+
+
+def write_conllu(sentences, path):
+    """
+    Write (tokens, upos) pairs as a minimal CoNLL-U file.
+    """
+    with open(path, "w", encoding="utf-8") as f:
+        for sent_id, (tokens, upos) in enumerate(sentences):
+            f.write(f"# sent_id = synthetic-{sent_id}\n")
+            f.write(f"# text = {' '.join(tokens)}\n")
+            for i, (form, tag) in enumerate(zip(tokens, upos), start=1):
+                head = 0 if i == 1 else 1
+                deprel = "root" if i == 1 else "dep"
+                f.write(f"{i}\t{form}\t{form}\t{tag}\t_\t_\t{head}\t{deprel}\t_\t_\n")
+            f.write("\n")
+
+
+def build_local_tokenizer(sentences, out_dir, n_words=1000):
+    """
+    Build a WordPiece tokenizer from a corpus and save it to ``out_dir``.
+
+    The vocabulary holds the ``n_words`` most frequent forms plus every
+    single character as a word-initial and continuation piece, so rarer
+    words split into several subwords like they do in mBERT.
+    """
+    from collections import Counter
+
+    from tokenizers import Tokenizer, models, pre_tokenizers, processors
+    from transformers import PreTrainedTokenizerFast
+
+    counts = Counter(form for tokens, _ in sentences for form in tokens)
+    chars = sorted({c for form in counts for c in form} | set(string.ascii_lowercase))
+    vocab = list(SPECIAL_TOKENS)
+    vocab += chars
+    vocab += ["##" + c for c in chars]
+    vocab += [form for form, _ in counts.most_common(n_words) if len(form) > 1]
+    vocab = {piece: i for i, piece in enumerate(dict.fromkeys(vocab))}
+
+    backend = Tokenizer(models.WordPiece(vocab, unk_token="[UNK]"))
+    backend.pre_tokenizer = pre_tokenizers.BertPreTokenizer()
+    backend.post_processor = processors.BertProcessing(
+        ("[SEP]", vocab["[SEP]"]), ("[CLS]", vocab["[CLS]"])
+    )
+    tokenizer = PreTrainedTokenizerFast(
+        tokenizer_object=backend,
+        unk_token="[UNK]", pad_token="[PAD]", cls_token="[CLS]",
+        sep_token="[SEP]", mask_token="[MASK]",
+    )
+    os.makedirs(out_dir, exist_ok=True)
+    tokenizer.save_pretrained(out_dir)
+    return tokenizer
+
+
+def small_config(tag2id, vocab_size, n_layers=6, dim=64, n_heads=4, hidden_dim=256):
+    """
+    A DistilBERT config with the real layer count but a tiny width, so every
+    freezing strategy is meaningful and a step costs milliseconds on CPU.
+    """
+    from transformers import DistilBertConfig
+
+    return DistilBertConfig(
+        vocab_size=vocab_size,
+        n_layers=n_layers,
+        dim=dim,
+        n_heads=n_heads,
+        hidden_dim=hidden_dim,
+        max_position_embeddings=512,
+        num_labels=len(tag2id),
+        id2label={i: t for t, i in tag2id.items()},
+        label2id=tag2id,
+    )
+
+
+def build_small_model(tag2id, vocab_size, seed=42, **config_kwargs):
+    """
+    Instantiate a randomly initialised token classifier from ``small_config``.
+    """
+    import torch
+    from transformers import AutoModelForTokenClassification
+
+    torch.manual_seed(seed)
+    config = small_config(tag2id, vocab_size, **config_kwargs)
+    return AutoModelForTokenClassification.from_config(config)
+
+
+def seed_everything(seed=42):
+    """
+    Seed Python, NumPy and torch the way the notebooks do.
+    """
+    import torch
+
+    random.seed(seed)
+    np.random.seed(seed)
+    torch.manual_seed(seed)
+    torch.backends.cudnn.deterministic = True
@@ -0,0 +1,170 @@
+"""
+Pruning the multilingual embedding matrix down to a treebank's subwords.
+
+``distilbert-base-multilingual-cased`` has a 119,547-piece vocabulary whose
+embeddings are ~92M of the model's ~135M parameters, while a single
+treebank such as EWT or NSC touches only a few thousand pieces. Pruning
+keeps the pieces that occur in the tokenized training corpus (plus an
+optional held-out word list, the special tokens and, by default, every
+single-character piece so unseen words still segment instead of becoming
+``[UNK]``), renumbers them densely and slices ``word_embeddings`` to match.
+
+Because WordPiece segments greedily by longest match, every word of the
+scanned corpus tokenizes to the same pieces before and after pruning, so
+the pruned model produces identical outputs on it.
+"""
+
+import json
+
+import numpy as np
+
+
+def used_token_ids(datasets, tokenizer, extra_words=None, keep_characters=True):
+    """
+    Collect the token ids to keep.
+
+    Args:
+        datasets: Tokenized splits (anything with an ``input_ids`` column).
+        tokenizer: The tokenizer that produced them.
+        extra_words: Optional iterable of held-out words whose pieces must
+            survive, e.g. a domain lexicon or the dev/test vocabulary.
+        keep_characters: Also keep every single-character piece and its
+            ``##`` continuation.
+
+    Returns:
+        A sorted int64 array of old token ids.
+    """
+    used = np.zeros(len(tokenizer), dtype=bool)
+    for dataset in datasets:
+        for ids in dataset["input_ids"]:
+            used[ids] = True
+    used[tokenizer.all_special_ids] = True
+
+    if extra_words:
+        words = list(extra_words)
+        for ids in tokenizer(words, add_special_tokens=False)["input_ids"]:
+            used[ids] = True
+
+    if keep_characters:
+        prefix = getattr(tokenizer.backend_tokenizer.model, "continuing_subword_prefix", "##")
+        for piece, idx in tokenizer.get_vocab().items():
+            if len(piece) == 1 or (piece.startswith(prefix) and len(piece) == len(prefix) + 1):
+                used[idx] = True
+
+    return np.flatnonzero(used)
+
+
+def _remap_post_processor(node, old_to_new):
+    """
+    Rewrite special-token ids in a serialized post-processor in place.
+    """
+    if isinstance(node, list):
+        for child in node:
+            _remap_post_processor(child, old_to_new)
+        return
+    if not isinstance(node, dict):
+        return
+    kind = node.get("type")
+    if kind in ("BertProcessing", "RobertaProcessing"):
+        for key in ("sep", "cls"):
+            token, idx = node[key]
+            node[key] = [token, int(old_to_new[idx])]
+    elif kind == "TemplateProcessing":
+        for special in node.get("special_tokens", {}).values():
+            special["ids"] = [int(old_to_new[i]) for i in special["ids"]]
+    for child in node.get("processors", []) or []:
+        _remap_post_processor(child, old_to_new)
+
+
+def prune_tokenizer(tokenizer, keep_ids):
+    """
+    Build a fast tokenizer restricted to ``keep_ids``, renumbered densely in
+    their original order.
+
+    Only WordPiece (BERT-style) fast tokenizers are supported.
+    """
+    from tokenizers import Tokenizer
+    from transformers import PreTrainedTokenizerFast
+
+    state = json.loads(tokenizer.backend_tokenizer.to_str())
+    if state["model"]["type"] != "WordPiece":
+        raise ValueError(f"Vocabulary pruning supports WordPiece tokenizers, got {state['model']['type']}")
+
+    old_to_new = np.full(len(tokenizer), -1, dtype=np.int64)
+    old_to_new[keep_ids] = np.arange(len(keep_ids))
+
+    id_to_piece = {idx: piece for piece, idx in state["model"]["vocab"].items()}
+    state["model"]["vocab"] = {id_to_piece[int(old)]: int(new) for new, old in enumerate(keep_ids)}
+    state["added_tokens"] = [
+        dict(token, id=int(old_to_new[token["id"]]))
+        for token in state.get("added_tokens", [])
+        if old_to_new[token["id"]] >= 0
+    ]
+    _remap_post_processor(state.get("post_processor"), old_to_new)
+
+    pruned = PreTrainedTokenizerFast(
+        tokenizer_object=Tokenizer.from_str(json.dumps(state)),
+        model_max_length=tokenizer.model_max_length,
+        **tokenizer.special_tokens_map,
+    )
+    return pruned, old_to_new
+
+
+def prune_embeddings(model, keep_ids):
+    """
+    Slice ``distilbert.embeddings.word_embeddings`` to ``keep_ids`` in place
+    and update the config. The new matrix keeps the old ``requires_grad``.
+    """
+    import torch
+    from torch import nn
+
+    old = model.distilbert.embeddings.word_embeddings
+    index = torch.as_tensor(keep_ids, dtype=torch.long, device=old.weight.device)
+    old_to_new = {int(old_id): new_id for new_id, old_id in enumerate(keep_ids)}
+    padding_idx = old_to_new.get(old.padding_idx) if old.padding_idx is not None else None
+
+    new = nn.Embedding(len(keep_ids), old.embedding_dim, padding_idx=padding_idx,
+                       device=old.weight.device, dtype=old.weight.dtype)
+    with torch.no_grad():
+        new.weight.copy_(old.weight.index_select(0, index))
+    new.weight.requires_grad = old.weight.requires_grad
+    model.distilbert.embeddings.word_embeddings = new
+
+    model.config.vocab_size = len(keep_ids)
+    if model.config.pad_token_id is not None:
+        model.config.pad_token_id = old_to_new.get(model.config.pad_token_id, padding_idx)
+    return model
+
+
+def remap_input_ids(dataset, old_to_new):
+    """
+    Renumber an already tokenized split for the pruned vocabulary, instead
+    of tokenizing it again. Ids that were pruned map to -1 and raise.
+    """
+    def remap(batch):
+        ids = [old_to_new[np.asarray(row, dtype=np.int64)] for row in batch["input_ids"]]
+        if any((row < 0).any() for row in ids):
+            raise ValueError("Split contains token ids that were pruned; include it when scanning")
+        return {"input_ids": [row.tolist() for row in ids]}
+
+    return dataset.map(remap, batched=True)
+
+
+def prune_vocabulary(model, tokenizer, datasets, extra_words=None, keep_characters=True, output_dir=None):
+    """
+    Scan the tokenized corpus, prune tokenizer and embeddings together and
+    optionally save both with ``save_pretrained``.
+
+    Returns:
+        (model, tokenizer, old_to_new) where ``old_to_new`` maps old token
+        ids to new ones (-1 for pruned pieces); use it with
+        ``remap_input_ids`` to reuse ``train_tok``/``dev_tok``.
+    """
+    keep_ids = used_token_ids(datasets, tokenizer, extra_words, keep_characters)
+    pruned_tokenizer, old_to_new = prune_tokenizer(tokenizer, keep_ids)
+    prune_embeddings(model, keep_ids)
+
+    if output_dir is not None:
+        model.save_pretrained(output_dir)
+        pruned_tokenizer.save_pretrained(output_dir)
+    return model, pruned_tokenizer, old_to_new
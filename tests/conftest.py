@@ -0,0 +1,50 @@
+import pytest
+
+
+@pytest.fixture
+def dataset():
+    """
+    300 rows whose ids and labels encode the row index, for index-mapping tests.
+    """
+    datasets = pytest.importorskip("datasets")
+    return datasets.Dataset.from_dict({
+        "input_ids": [[i] * (i % 5 + 1) for i in range(300)],
+        "labels": [[i % 7] * (i % 5 + 1) for i in range(300)],
+    })
+
+
+@pytest.fixture(scope="session")
+def corpus(tmp_path_factory):
+    """
+    Synthetic sentences with a local WordPiece tokenizer and tag map.
+    """
+    pytest.importorskip("transformers")
+    from pos_freezing.data import build_tag_maps
+    from pos_freezing.synthetic import build_local_tokenizer, make_synthetic_sentences
+
+    sentences = make_synthetic_sentences(120, vocab_size=400, max_length=60)
+    tokenizer = build_local_tokenizer(sentences, str(tmp_path_factory.mktemp("tokenizer")), n_words=200)
+    tag2id, _ = build_tag_maps(sentences)
+    return sentences, tokenizer, tag2id
+
+
+@pytest.fixture(scope="session")
+def tokenized(corpus):
+    """
+    The synthetic corpus tokenized as (train_tok, dev_tok): 96 and 24 sentences.
+    """
+    from pos_freezing.data import tokenize_split
+
+    sentences, tokenizer, tag2id = corpus
+    return tokenize_split(sentences[:96], tokenizer, tag2id), tokenize_split(sentences[96:], tokenizer, tag2id)
+
+
+@pytest.fixture
+def model(corpus):
+    """
+    A fresh small DistilBERT token classifier for the corpus.
+    """
+    from pos_freezing.synthetic import build_small_model
+
+    _, tokenizer, tag2id = corpus
+    return build_small_model(tag2id, len(tokenizer)).eval()
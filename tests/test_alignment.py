@@ -0,0 +1,58 @@
+import pytest
+
+from pos_freezing.alignment import tokenize_and_align_batch
+from pos_freezing.data import tokenize_and_align, tokenize_split
+
+
+@pytest.mark.parametrize("label_all_tokens", [False, True])
+@pytest.mark.parametrize("max_length", [128, 16])
+def test_batch_alignment_matches_per_sentence(corpus, label_all_tokens, max_length):
+    sentences, tokenizer, tag2id = corpus
+    batch = {"tokens": [tokens for tokens, _ in sentences], "upos": [upos for _, upos in sentences]}
+    batched = tokenize_and_align_batch(batch, tokenizer, tag2id, label_all_tokens, max_length)
+    for i, sentence in enumerate(sentences):
+        expected = tokenize_and_align(sentence, tokenizer, tag2id, label_all_tokens, max_length)
+        assert list(batched["input_ids"][i]) == expected["input_ids"]
+        assert list(batched["labels"][i]) == expected["labels"]
+
+
+def test_tokenize_split_matches_per_sentence(corpus):
+    sentences, tokenizer, tag2id = corpus
+    dataset = tokenize_split(sentences, tokenizer, tag2id, batch_size=32)
+    assert len(dataset) == len(sentences)
+    for row, sentence in zip(dataset, sentences):
+        expected = tokenize_and_align(sentence, tokenizer, tag2id)
+        assert row["input_ids"] == expected["input_ids"]
+        assert row["labels"] == expected["labels"]
+
+
+def test_windows_label_every_word_once(corpus):
+    sentences, tokenizer, tag2id = corpus
+    batch = {"tokens": [tokens for tokens, _ in sentences], "upos": [upos for _, upos in sentences]}
+    windowed = tokenize_and_align_batch(batch, tokenizer, tag2id, max_length=16, stride=4)
+    assert len(windowed["input_ids"]) > len(sentences)
+    assert all(len(ids) <= 16 for ids in windowed["input_ids"])
+    labels = [label for row in windowed["labels"] for label in row if label != -100]
+    expected = [tag2id[tag] for _, upos in sentences for tag in upos]
+    # windows are emitted in sentence order and each word is labelled in exactly one of them
+    assert labels == expected
+
+
+def test_windowed_tagging_covers_long_sentences(model, corpus):
+    from pos_freezing.cache import WordPieceCache
+    from pos_freezing.inference import tag_sentences
+
+    sentences, tokenizer, _ = corpus
+    words = [tokens for tokens, _ in sentences[:8]]
+    truncated = tag_sentences(model, tokenizer, words, max_length=16)
+    assert any(None in tags for tags in truncated)
+    windowed = tag_sentences(model, tokenizer, words, max_length=16, stride=4)
+    assert [len(tags) for tags in windowed] == [len(s) for s in words]
+    assert not any(None in tags for tags in windowed)
+    cached = tag_sentences(model, tokenizer, words, max_length=16, stride=4, word_cache=WordPieceCache(tokenizer))
+    assert cached == windowed
+    # sentences that fit in one window are tagged as before
+    assert any(None not in short for short in truncated)
+    for tags, short in zip(windowed, truncated):
+        if None not in short:
+            assert tags == short
@@ -0,0 +1,37 @@
+import json
+
+import pytest
+
+from pos_freezing.bench import compare, main, measure, run_benchmarks
+
+
+def test_measure_runs_setup_untimed():
+    calls = []
+    result = measure(calls.append, items=10, unit="rows", repeats=3, warmup=2, setup=lambda: len(calls))
+    assert calls == [0, 1, 2, 3, 4]
+    assert result["repeats"] == 3 and result["items"] == 10 and result["unit"] == "rows"
+    assert result["min_s"] <= result["median_s"]
+
+
+def test_compare_flags_regressions():
+    def payload(**times):
+        return {"results": {case: {"median_s": t} for case, t in times.items()}}
+
+    rows, regressions = compare(payload(a=1.0, b=1.0, gone=1.0), payload(a=1.05, b=1.5, new=2.0))
+    assert [row[0] for row in rows] == ["a", "b"]
+    assert [row[0] for row in regressions] == ["b"]
+
+
+def test_run_and_compare_from_the_command_line(tmp_path):
+    with pytest.raises(ValueError, match="Unknown benchmark"):
+        run_benchmarks(["nope"])
+    baseline = tmp_path / "baseline.json"
+    args = ["--only", "parse_conllu", "collate", "--n-train", "32", "--n-eval", "8", "--repeats", "1"]
+    assert main(args + ["--output", str(baseline)]) == 0
+    results = json.loads(baseline.read_text())["results"]
+    assert results and all(r["median_s"] > 0 for r in results.values())
+    # a baseline that was infinitely fast makes every case a regression
+    for result in results.values():
+        result["median_s"] = 1e-12
+    baseline.write_text(json.dumps({"results": results}))
+    assert main(args + ["--compare", str(baseline)]) == 1
@@ -0,0 +1,41 @@
+import numpy as np
+import pytest
+
+from pos_freezing.cache import LRUCache, SentenceCache, WordPieceCache
+
+
+def test_lru_evicts_least_recently_used():
+    cache = LRUCache(max_entries=2)
+    cache.put("a", 1)
+    cache.put("b", 2)
+    assert cache.get("a") == 1
+    cache.put("c", 3)
+    assert "b" not in cache and "a" in cache and "c" in cache
+    assert cache.get("b") is None
+    assert cache.stats() == {"entries": 2, "max_entries": 2, "hits": 1, "misses": 1, "hit_rate": 0.5,
+                             "evictions": 1}
+    with pytest.raises(ValueError):
+        LRUCache(0)
+
+
+def test_sentence_key_normalizes():
+    cache = SentenceCache()
+    assert cache.key(["The", " dog "]) == cache.key(["the", "dog"])
+    assert cache.key(["the", "dog"]) != cache.key(["thedog"])
+    assert SentenceCache(lowercase=False).key(["The"]) != SentenceCache(lowercase=False).key(["the"])
+
+
+def test_encode_matches_tokenizer(corpus):
+    from pos_freezing.alignment import batch_word_ids
+
+    sentences, tokenizer, _ = corpus
+    words = [[w.lower() for w in s] for s, _ in sentences[:6]]
+    cache = WordPieceCache(tokenizer, max_entries=20)
+    for max_length in (128, 12):
+        input_ids, attention_mask, word_ids = cache.encode(words, max_length=max_length)
+        expected = tokenizer(words, is_split_into_words=True, truncation=True, max_length=max_length,
+                             padding=True, return_tensors="pt")
+        assert input_ids.tolist() == expected["input_ids"].tolist()
+        assert attention_mask.tolist() == expected["attention_mask"].tolist()
+        np.testing.assert_array_equal(word_ids, batch_word_ids(expected))
+    assert len(cache) == 20 and cache.evictions > 0
@@ -0,0 +1,54 @@
+import pytest
+import torch
+
+from pos_freezing.checkpointing import apply_checkpointing, remove_checkpointing, saved_activation_bytes
+from pos_freezing.freezing import freeze_layers
+
+
+def _batch(tokenized):
+    train_tok, _ = tokenized
+    rows = train_tok[:4]
+    lengths = [len(ids) for ids in rows["input_ids"]]
+    width = max(lengths)
+    return {
+        "input_ids": torch.tensor([ids + [0] * (width - len(ids)) for ids in rows["input_ids"]]),
+        "attention_mask": torch.tensor([[1] * n + [0] * (width - n) for n in lengths]),
+        "labels": torch.tensor([labels + [-100] * (width - len(labels)) for labels in rows["labels"]]),
+    }
+
+
+def _gradients(model, batch):
+    model.zero_grad(set_to_none=True)
+    model(**batch).loss.backward()
+    return {name: p.grad.clone() for name, p in model.named_parameters() if p.grad is not None}
+
+
+def test_policies_follow_the_freeze_mask(model):
+    freeze_layers(model, "first_k", 2)
+    assert apply_checkpointing(model, "trainable") == {"no_grad": [], "checkpointed": [2, 3, 4, 5]}
+    assert apply_checkpointing(model, [3]) == {"no_grad": [], "checkpointed": [3]}
+    model.distilbert.embeddings.requires_grad_(False)
+    assert apply_checkpointing(model, "all") == {"no_grad": [-1, 0, 1], "checkpointed": [2, 3, 4, 5]}
+    with pytest.raises(ValueError, match="Unknown checkpointing policy"):
+        apply_checkpointing(model, "some")
+
+
+def test_same_gradients_with_less_saved_memory(model, tokenized):
+    for module in model.modules():
+        if isinstance(module, torch.nn.Dropout):
+            module.p = 0.0
+    freeze_layers(model, "first_k", 2)
+    model.distilbert.embeddings.requires_grad_(False)
+    model.train()
+    batch = _batch(tokenized)
+    expected, plain_bytes = _gradients(model, batch), saved_activation_bytes(model, batch)
+
+    apply_checkpointing(model, "all")
+    gradients = _gradients(model, batch)
+    assert gradients.keys() == expected.keys()
+    for name, grad in gradients.items():
+        torch.testing.assert_close(grad, expected[name])
+    assert saved_activation_bytes(model, batch) < plain_bytes
+
+    remove_checkpointing(model)
+    assert saved_activation_bytes(model, batch) == plain_bytes
@@ -0,0 +1,53 @@
+import numpy as np
+
+from pos_freezing.coreset import coreset_curve, curriculum_order, curriculum_sampler, select_coreset
+from pos_freezing.packed import write_packed
+
+TRAINING_ARGS = {"num_train_epochs": 1, "report_to": [], "use_cpu": True, "disable_tqdm": True,
+                 "save_strategy": "no"}
+
+
+def test_selection_spends_the_budget():
+    rng = np.random.default_rng(0)
+    embeddings = rng.normal(size=(200, 8)).astype(np.float32)
+    costs = rng.integers(1, 20, size=200)
+    for method in ("k_center", "diversity", "random"):
+        picked = select_coreset(embeddings, 0.25, method, costs)
+        assert len(set(picked.tolist())) == len(picked)
+        spent = costs[picked].sum()
+        assert spent >= 0.25 * costs.sum() and spent - costs[picked[-1]] < 0.25 * costs.sum()
+
+
+def test_k_center_covers_clusters():
+    centers = np.eye(4, dtype=np.float32) * 10
+    embeddings = np.repeat(centers, 25, axis=0) + np.random.default_rng(0).normal(scale=0.01, size=(100, 4))
+    picked = select_coreset(embeddings, 4, "k_center")
+    assert sorted(picked // 25) == [0, 1, 2, 3]
+
+
+def test_curriculum_goes_short_to_long_then_shuffles():
+    lengths = np.random.default_rng(0).integers(1, 100, size=500)
+    order = curriculum_order(lengths, np.random.default_rng(1), n_buckets=5)
+    assert sorted(order.tolist()) == list(range(500))
+    buckets = np.array_split(lengths[order], 5)
+    assert all(a.max() <= b.min() for a, b in zip(buckets, buckets[1:]))
+
+    sampler = curriculum_sampler(lengths, curriculum_epochs=1, n_buckets=5, seed=1)
+    first, second = list(sampler), list(sampler)
+    assert first == order.tolist()
+    assert sorted(second) == list(range(500))
+    second_buckets = np.array_split(lengths[second], 5)
+    assert not all(a.max() <= b.min() for a, b in zip(second_buckets, second_buckets[1:]))
+
+
+def test_curve_on_packed_split(corpus, tokenized, tmp_path):
+    from pos_freezing.synthetic import build_small_model
+
+    _, tokenizer, tag2id = corpus
+    train_tok, dev_tok = tokenized
+    packed = write_packed(train_tok, str(tmp_path / "packed"))
+    rows = coreset_curve(lambda: build_small_model(tag2id, len(tokenizer)), packed, dev_tok, tokenizer,
+                         fractions=(0.5,), methods=("k_center",), output_dir=str(tmp_path / "runs"),
+                         training_args=TRAINING_ARGS)
+    assert [row["Subset"] for row in rows] == ["full", "k_center"]
+    assert rows[0]["Subset (%)"] == 100.0 and 50.0 <= rows[1]["Subset (%)"] < 60.0
@@ -0,0 +1,40 @@
+import numpy as np
+
+from pos_freezing.distill import (
+    build_student,
+    distill,
+    load_teacher_logits,
+    store_teacher_logits,
+    teacher_logits_key,
+)
+
+TRAINING_ARGS = {"num_train_epochs": 1, "report_to": [], "use_cpu": True, "disable_tqdm": True,
+                 "save_strategy": "no"}
+
+
+def test_key_distinguishes_contiguous_slices(model, tokenized):
+    train_tok, _ = tokenized
+    assert teacher_logits_key(model, train_tok.select(range(0, 40))) != \
+        teacher_logits_key(model, train_tok.select(range(40, 80)))
+
+
+def test_distill_restores_logits_for_another_slice(model, corpus, tokenized, tmp_path):
+    _, tokenizer, _ = corpus
+    train_tok, dev_tok = tokenized
+    first, second = train_tok.select(range(0, 40)), train_tok.select(range(40, 80))
+    distill(model, first, dev_tok, tokenizer, str(tmp_path), layers=(0,), training_args=TRAINING_ARGS)
+    distill(model, second, dev_tok, tokenizer, str(tmp_path), layers=(0,), training_args=TRAINING_ARGS)
+
+    logits, offsets = load_teacher_logits(str(tmp_path / "teacher_logits.npy"))
+    expected, expected_offsets = store_teacher_logits(model, second, tokenizer, str(tmp_path / "fresh.npy"))
+    np.testing.assert_array_equal(offsets, expected_offsets)
+    np.testing.assert_array_equal(logits, expected)
+
+
+def test_student_keeps_selected_layers(model):
+    student = build_student(model, layers=(0, 5))
+    assert student.config.n_layers == 2
+    for kept, source in zip(student.distilbert.transformer.layer, (0, 5)):
+        for a, b in zip(kept.parameters(), model.distilbert.transformer.layer[source].parameters()):
+            assert a.data_ptr() != b.data_ptr()
+            np.testing.assert_array_equal(a.detach().numpy(), b.detach().numpy())
@@ -0,0 +1,52 @@
+import functools
+import os
+
+import pytest
+import torch
+import torch.distributed as dist
+from safetensors.torch import load_file
+
+from pos_freezing.distributed import GradientReducer, free_port, run_data_parallel
+from pos_freezing.freezing import freeze_layers
+
+
+@pytest.fixture
+def group():
+    dist.init_process_group("gloo", init_method=f"tcp://127.0.0.1:{free_port()}", rank=0, world_size=1)
+    yield
+    dist.destroy_process_group()
+
+
+def test_reducer_sends_only_touched_embedding_rows(model, tokenized, group):
+    train_tok, _ = tokenized
+    freeze_layers(model, "first_k", 4)
+    model.train()
+    input_ids = torch.tensor([train_tok[0]["input_ids"]])
+    model(input_ids=input_ids, labels=torch.tensor([train_tok[0]["labels"]])).loss.backward()
+    expected = {name: p.grad.clone() for name, p in model.named_parameters() if p.requires_grad}
+
+    reducer = GradientReducer(model)
+    reducer.reduce(input_ids)
+    for name, p in model.named_parameters():
+        if p.requires_grad:
+            torch.testing.assert_close(p.grad, expected[name])
+    embedding = model.distilbert.embeddings.word_embeddings.weight
+    dense_bytes = sum(p.numel() * 4 for p in model.parameters() if p.requires_grad and p is not embedding)
+    rows = len(torch.unique(input_ids))
+    assert reducer.bytes_sent == dense_bytes + rows * embedding.shape[1] * 4 + rows * 8
+
+
+def test_two_rank_runs_are_reproducible(corpus, tokenized, tmp_path):
+    from pos_freezing.synthetic import build_small_model
+
+    _, tokenizer, tag2id = corpus
+    train_tok, dev_tok = tokenized
+    model_init = functools.partial(build_small_model, tag2id, len(tokenizer))
+    runs = [run_data_parallel(2, model_init, "first_k", 2, train_tok, dev_tok, tokenizer, str(tmp_path / name),
+                              epochs=1, batch_size=8)
+            for name in ("a", "b")]
+    assert runs[0]["World Size"] == 2
+    assert runs[0]["History"] == runs[1]["History"]
+    weights = [load_file(os.path.join(tmp_path, name, "model.safetensors")) for name in ("a", "b")]
+    for name, tensor in weights[0].items():
+        assert torch.equal(tensor, weights[1][name])
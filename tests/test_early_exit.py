@@ -0,0 +1,50 @@
+import os
+
+import torch
+
+from pos_freezing.early_exit import EarlyExitTagger, evaluate_early_exit, train_exit_heads
+
+
+def test_heads_reuse_cached_hidden_states(model, corpus, tokenized, tmp_path):
+    _, tokenizer, _ = corpus
+    train_tok, _ = tokenized
+    heads = train_exit_heads(model, train_tok, tokenizer, str(tmp_path), epochs=1)
+    assert sorted(heads, key=int) == [str(layer) for layer in range(1, model.config.n_layers)]
+    cached = sorted(os.listdir(tmp_path))
+    assert len(cached) == 2 and all(name.startswith("train.") for name in cached)
+
+    again = train_exit_heads(model, train_tok, tokenizer, str(tmp_path), epochs=1)
+    assert sorted(os.listdir(tmp_path)) == cached
+    for layer, head in heads.items():
+        torch.testing.assert_close(again[layer].weight, head.weight)
+    # another split gets its own files instead of the first split's features
+    train_exit_heads(model, train_tok.select(range(0, 40)), tokenizer, str(tmp_path), epochs=1)
+    assert len(os.listdir(tmp_path)) == 4
+
+
+def test_unreachable_threshold_matches_full_model(model, corpus, tokenized, tmp_path):
+    _, tokenizer, _ = corpus
+    train_tok, dev_tok = tokenized
+    heads = train_exit_heads(model, train_tok, tokenizer, str(tmp_path), epochs=1)
+    rows = dev_tok[:8]
+    input_ids = torch.nn.utils.rnn.pad_sequence([torch.tensor(ids) for ids in rows["input_ids"]], batch_first=True,
+                                                padding_value=tokenizer.pad_token_id)
+    attention_mask = (input_ids != tokenizer.pad_token_id).long()
+    positions = attention_mask.bool()
+    with torch.inference_mode():
+        expected = model(input_ids=input_ids, attention_mask=attention_mask).logits.argmax(-1)
+    for mode in ("sentence", "token"):
+        preds, exit_layer = EarlyExitTagger(model, heads, threshold=1.0, mode=mode).predict(
+            input_ids, attention_mask, positions)
+        assert torch.equal(preds[positions], expected[positions])
+        assert (exit_layer == model.config.n_layers).all()
+
+
+def test_zero_threshold_exits_at_first_head(model, corpus, tokenized, tmp_path):
+    _, tokenizer, _ = corpus
+    train_tok, dev_tok = tokenized
+    heads = train_exit_heads(model, train_tok, tokenizer, str(tmp_path), epochs=1)
+    result = evaluate_early_exit(EarlyExitTagger(model, heads, threshold=0.0), dev_tok, tokenizer)
+    assert result["expected_layers"] == 1.0
+    full = evaluate_early_exit(EarlyExitTagger(model, torch.nn.ModuleDict(), threshold=1.0), dev_tok, tokenizer)
+    assert full["expected_layers"] == model.config.n_layers
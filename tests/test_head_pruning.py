@@ -0,0 +1,65 @@
+import functools
+
+import numpy as np
+import pytest
+import torch
+
+from pos_freezing.head_pruning import (
+    _gate_hook,
+    count_heads,
+    head_importance,
+    heads_to_prune,
+    load_pruned_model,
+    prune_heads,
+)
+
+
+def _input_ids(tokenized):
+    train_tok, _ = tokenized
+    return torch.tensor([train_tok[0]["input_ids"]])
+
+
+def test_pruning_equals_zeroing_the_heads(model, tokenized):
+    input_ids = _input_ids(tokenized)
+    attention = model.distilbert.transformer.layer[1].attention
+    gate = torch.tensor([1.0, 0.0, 1.0, 0.0])
+    handle = attention.out_lin.register_forward_pre_hook(functools.partial(_gate_hook, gate))
+    with torch.inference_mode():
+        expected = model(input_ids=input_ids).logits
+    handle.remove()
+
+    prune_heads(model, {1: [1, 3]})
+    assert attention.n_heads == 2 and attention.q_lin.out_features == attention.dim
+    assert count_heads(model) == 4 * model.config.n_layers - 2
+    with torch.inference_mode():
+        torch.testing.assert_close(model(input_ids=input_ids).logits, expected)
+    with pytest.raises(ValueError, match="every head"):
+        prune_heads(model, {1: [0, 1]})
+
+
+def test_pruned_model_reloads(model, tokenized, tmp_path):
+    input_ids = _input_ids(tokenized)
+    prune_heads(model, {0: [2], 3: [0, 1]})
+    # indices are relative to the remaining heads: this removes original head 3
+    prune_heads(model, {0: [2]})
+    assert model.config.pruned_heads == {"0": [2, 3], "3": [0, 1]}
+    model.save_pretrained(str(tmp_path))
+    reloaded = load_pruned_model(str(tmp_path))
+    assert count_heads(reloaded) == count_heads(model)
+    with torch.inference_mode():
+        torch.testing.assert_close(reloaded(input_ids=input_ids).logits, model.eval()(input_ids=input_ids).logits)
+
+
+def test_importance_and_selection(model, corpus, tokenized):
+    _, tokenizer, _ = corpus
+    _, dev_tok = tokenized
+    requires_grad = [p.requires_grad for p in model.parameters()]
+    importance = head_importance(model, dev_tok, tokenizer)
+    assert importance.shape == (model.config.n_layers, 4)
+    assert [p.requires_grad for p in model.parameters()] == requires_grad
+    np.testing.assert_allclose(np.linalg.norm(importance, axis=1), 1.0)
+
+    heads = heads_to_prune(importance, 0.5)
+    assert sum(len(h) for h in heads.values()) == importance.size // 2
+    for layer, layer_heads in heads.items():
+        assert int(np.argmax(importance[layer])) not in layer_heads
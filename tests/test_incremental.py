@@ -0,0 +1,74 @@
+import numpy as np
+
+from pos_freezing.incremental import prefix_features_path, replay_mix, update_packed, update_prefix_features
+from pos_freezing.packed import pack_conllu
+from pos_freezing.search import store_prefix_features
+from pos_freezing.synthetic import make_synthetic_sentences, write_conllu
+
+
+def _assert_same_split(a, b):
+    assert len(a) == len(b)
+    np.testing.assert_array_equal(a.offsets, b.offsets)
+    np.testing.assert_array_equal(a.input_ids, b.input_ids)
+    np.testing.assert_array_equal(a.labels, b.labels)
+
+
+def test_update_packed_matches_fresh_pack(corpus, tmp_path):
+    sentences, tokenizer, tag2id = corpus
+    old = sentences[:80]
+    path = str(tmp_path / "train.conllu")
+    write_conllu(old, path)
+    pack_conllu(path, tokenizer, tag2id, str(tmp_path / "cache"))
+
+    added = make_synthetic_sentences(20, seed=7, vocab_size=400, max_length=60)
+    edited = [(tokens, ["X" if upos[0] != "X" else "NOUN"] + upos[1:]) for tokens, upos in old[10:15]]
+    grown = old[:10] + edited + old[15:70] + added  # 5 edited, 10 removed, 20 added
+    write_conllu(grown, path)
+    updated, old_index = update_packed(path, tokenizer, tag2id, str(tmp_path / "cache"))
+
+    _assert_same_split(updated, pack_conllu(path, tokenizer, tag2id, str(tmp_path / "fresh")))
+    expected = np.r_[np.arange(10), np.full(5, -1), np.arange(15, 70), np.full(20, -1)]
+    np.testing.assert_array_equal(old_index, expected)
+
+
+def test_update_packed_is_a_no_op_when_unchanged(corpus, tmp_path):
+    sentences, tokenizer, tag2id = corpus
+    path = str(tmp_path / "train.conllu")
+    write_conllu(sentences, path)
+    packed = pack_conllu(path, tokenizer, tag2id, str(tmp_path / "cache"))
+    updated, old_index = update_packed(path, tokenizer, tag2id, str(tmp_path / "cache"))
+    _assert_same_split(updated, packed)
+    np.testing.assert_array_equal(old_index, np.arange(len(sentences)))
+
+
+def test_update_prefix_features_matches_fresh_features(corpus, model, tmp_path):
+    sentences, tokenizer, tag2id = corpus
+    path = str(tmp_path / "train.conllu")
+    write_conllu(sentences[:60], path)
+    packed = pack_conllu(path, tokenizer, tag2id, str(tmp_path / "cache"))
+    features_path = prefix_features_path(str(tmp_path / "cache"), model, 2)
+    store_prefix_features(model, packed, tokenizer, 2, features_path)
+
+    write_conllu(sentences[5:90], path)
+    updated, old_index = update_packed(path, tokenizer, tag2id, str(tmp_path / "cache"))
+    features, offsets = update_prefix_features(model, updated, tokenizer, 2, features_path, old_index)
+    expected, expected_offsets = store_prefix_features(model, updated, tokenizer, 2, str(tmp_path / "fresh.npy"))
+    np.testing.assert_array_equal(offsets, expected_offsets)
+    np.testing.assert_allclose(np.asarray(features, dtype=np.float32), np.asarray(expected, dtype=np.float32),
+                               atol=1e-2)
+
+
+def test_prefix_features_path_is_keyed_on_model_and_depth(corpus, model):
+    from pos_freezing.synthetic import build_small_model
+
+    _, tokenizer, tag2id = corpus
+    other = build_small_model(tag2id, len(tokenizer), seed=7)
+    assert prefix_features_path("cache", model, 2) != prefix_features_path("cache", other, 2)
+    assert prefix_features_path("cache", model, 2) != prefix_features_path("cache", model, 3)
+
+
+def test_replay_mix():
+    mix = replay_mix(100, [3, 50, 97], replay_ratio=2.0, seed=0)
+    assert len(mix) == 9 and len(set(mix.tolist())) == 9
+    assert {3, 50, 97} <= set(mix.tolist())
+    assert np.all(np.diff(mix) > 0)
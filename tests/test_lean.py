@@ -0,0 +1,87 @@
+import numpy as np
+import pytest
+
+pytest.importorskip("torch")
+
+from pos_freezing.lean import BatchBuffers, FlatSplit
+
+
+def test_flat_split_of_selected_rows(dataset):
+    ds = dataset.select([5, 3, 100, 7])
+    split = FlatSplit(ds)
+    assert len(split) == len(ds)
+    for i in range(len(ds)):
+        sentence = slice(split.offsets[i], split.offsets[i + 1])
+        np.testing.assert_array_equal(split.input_ids[sentence], ds[i]["input_ids"])
+        np.testing.assert_array_equal(split.labels[sentence], ds[i]["labels"])
+
+
+def test_collate_pads_rows(dataset):
+    ds = dataset.shuffle(seed=0)
+    split = FlatSplit(ds)
+    indices = np.array([4, 0, 9])
+    batch = BatchBuffers(8, int(split.lengths.max()), pad_token_id=0).collate(split, indices)
+    for row, i in enumerate(indices):
+        n = len(ds[int(i)]["input_ids"])
+        assert batch["input_ids"][row, :n].tolist() == ds[int(i)]["input_ids"]
+        assert batch["labels"][row, :n].tolist() == ds[int(i)]["labels"]
+        assert batch["attention_mask"][row].sum() == n
+        assert (batch["labels"][row, n:] == -100).all()
+
+
+def _trainer(model, corpus, tmp_path, **kwargs):
+    from transformers import TrainingArguments
+
+    from pos_freezing.lean import LeanTrainer
+
+    _, tokenizer, _ = corpus
+    args = TrainingArguments(output_dir=str(tmp_path), report_to=[], use_cpu=True, disable_tqdm=True)
+    return LeanTrainer(model, args, processing_class=tokenizer, **kwargs)
+
+
+def test_split_cache_drops_freed_datasets(model, corpus, tmp_path, dataset):
+    import gc
+
+    trainer = _trainer(model, corpus, tmp_path)
+    ds = dataset.select(range(10))
+    assert trainer._split(ds) is trainer._split(ds)
+    del ds
+    gc.collect()
+    assert len(trainer._splits) == 0
+    assert len(trainer._split(dataset.select(range(20, 25)))) == 5
+
+
+def test_compile_errors_fall_back_to_eager(model, corpus, tokenized, tmp_path):
+    from torch._dynamo.exc import Unsupported
+
+    train_tok, _ = tokenized
+    trainer = _trainer(model, corpus, tmp_path)
+    split = FlatSplit(train_tok)
+    batch = BatchBuffers(4, int(split.lengths.max())).collate(split, np.arange(4))
+
+    def unsupported(**batch):
+        raise Unsupported("graph break")
+
+    trainer._forward, trainer._compiled = unsupported, True
+    with pytest.warns(UserWarning, match="falling back to eager"):
+        assert trainer._run(batch).logits.shape[:2] == batch["input_ids"].shape
+    assert trainer._forward is model and not trainer._compiled
+
+    def broken(**batch):
+        raise ValueError("bad batch")
+
+    trainer._forward, trainer._compiled = broken, True
+    with pytest.raises(ValueError, match="bad batch"):
+        trainer._run(batch)
+
+
+def test_lean_engine_trains(corpus, tokenized, tmp_path):
+    from pos_freezing.sweep import train_strategy
+    from pos_freezing.synthetic import build_small_model
+
+    _, tokenizer, tag2id = corpus
+    train_tok, dev_tok = tokenized
+    row = train_strategy("Freeze First 2", "first_k", 2, lambda: build_small_model(tag2id, len(tokenizer)),
+                         train_tok, dev_tok, tokenizer, output_dir=str(tmp_path), engine="lean",
+                         training_args={"num_train_epochs": 2, "report_to": [], "use_cpu": True})
+    assert row["Engine"] == "lean" and len(row["History"]) == 2
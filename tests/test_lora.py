@@ -0,0 +1,41 @@
+import pytest
+import torch
+
+from pos_freezing.lora import LoRALinear, apply_lora, lora_state_dict, merge_lora
+
+
+def _inputs(tokenized):
+    train_tok, _ = tokenized
+    return torch.tensor([train_tok[0]["input_ids"]])
+
+
+def test_only_adapters_and_classifier_train(model):
+    adapters = apply_lora(model, rank=4, layers=[0, 2])
+    assert len(adapters) == 4
+    trainable = {name for name, p in model.named_parameters() if p.requires_grad}
+    assert trainable == {name for name in lora_state_dict(model)}
+    assert all("lora_" in name or name.startswith("classifier.") for name in trainable)
+    with pytest.raises(ValueError, match="already has an adapter"):
+        apply_lora(model, layers=[0])
+    with pytest.raises(ValueError, match="Unknown LoRA target"):
+        apply_lora(model, targets=("query",))
+
+
+def test_starts_from_the_base_function(model, tokenized):
+    input_ids = _inputs(tokenized)
+    with torch.no_grad():
+        expected = model(input_ids=input_ids).logits
+        apply_lora(model, rank=4)
+        torch.testing.assert_close(model(input_ids=input_ids).logits, expected)
+
+
+def test_merge_keeps_the_adapted_function(model, tokenized):
+    input_ids = _inputs(tokenized)
+    adapters = apply_lora(model, rank=4, targets=("q_lin", "v_lin", "lin1"))
+    with torch.no_grad():
+        for adapter in adapters:
+            adapter.lora_B.normal_(std=0.1)
+        adapted = model(input_ids=input_ids).logits
+        assert merge_lora(model) == len(adapters)
+        assert not any(isinstance(m, LoRALinear) for m in model.modules())
+        torch.testing.assert_close(model(input_ids=input_ids).logits, adapted, rtol=1e-4, atol=1e-5)
@@ -0,0 +1,42 @@
+import torch
+
+from pos_freezing.memory import MemoryTracker, tensor_bytes
+from pos_freezing.sweep import train_strategy
+
+TRAINING_ARGS = {"num_train_epochs": 1, "report_to": [], "use_cpu": True, "disable_tqdm": True,
+                 "save_strategy": "no"}
+
+
+def test_tensor_bytes_counts_shared_storage_once():
+    base = torch.zeros(100, dtype=torch.float32)
+    assert tensor_bytes([base, base[:10], base.view(10, 10)]) == 400
+    assert tensor_bytes([base, torch.zeros(10, dtype=torch.float64)]) == 480
+
+
+def test_tracker_records_every_category(model, tokenized):
+    train_tok, _ = tokenized
+    model.train()
+    optimizer = torch.optim.AdamW(model.parameters())
+    row = train_tok[0]
+    with MemoryTracker(model) as tracker:
+        model(input_ids=torch.tensor([row["input_ids"]]), labels=torch.tensor([row["labels"]])).loss.backward()
+        optimizer.step()
+        tracker.observe(optimizer)
+    params = tensor_bytes(model.parameters())
+    assert tracker.peak["params"] == params
+    assert tracker.peak["grads"] == params
+    assert tracker.peak["optimizer"] >= 2 * params
+    assert tracker.peak["activations"] > 0 and tracker.peak["data"] > 0
+    assert tracker.peak_rss > 0
+
+
+def test_track_memory_adds_columns(corpus, tokenized, tmp_path):
+    from pos_freezing.synthetic import build_small_model
+
+    _, tokenizer, tag2id = corpus
+    train_tok, dev_tok = tokenized
+    row = train_strategy("Freeze All", "all_encoder", 0, lambda: build_small_model(tag2id, len(tokenizer)),
+                         train_tok, dev_tok, tokenizer, output_dir=str(tmp_path), training_args=TRAINING_ARGS,
+                         track_memory=True)
+    assert row["Peak Memory (MB)"] > 0
+    assert row["Params (MB)"] > row["Grads (MB)"] > 0
@@ -0,0 +1,26 @@
+import numpy as np
+import pytest
+
+from pos_freezing.packed import _flat_column, write_packed
+
+
+@pytest.mark.parametrize("subset", [
+    lambda ds: ds.select([5, 3, 100, 7]),
+    lambda ds: ds.shuffle(seed=0),
+    lambda ds: ds.filter(lambda row: len(row["input_ids"]) == 2),
+])
+def test_flat_column_follows_index_mapping(dataset, subset):
+    ds = subset(dataset)
+    values, offsets = _flat_column(ds, "input_ids")
+    assert len(offsets) == len(ds) + 1
+    for i in range(len(ds)):
+        np.testing.assert_array_equal(values[offsets[i]:offsets[i + 1]], ds[i]["input_ids"])
+
+
+def test_write_packed_of_selected_rows(dataset, tmp_path):
+    ds = dataset.select([5, 3, 100, 7])
+    packed = write_packed(ds, str(tmp_path / "split"))
+    assert len(packed) == len(ds)
+    for i in range(len(ds)):
+        np.testing.assert_array_equal(packed[i]["input_ids"], ds[i]["input_ids"])
+        np.testing.assert_array_equal(packed[i]["labels"], ds[i]["labels"])
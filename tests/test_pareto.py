@@ -0,0 +1,35 @@
+import numpy as np
+import pytest
+
+from pos_freezing.pareto import dominated, pareto_front, pareto_ranks, pareto_table
+
+
+def _brute_force_dominated(points):
+    return np.array([any((q <= p).all() and (q < p).any() for q in points) for p in points])
+
+
+def test_dominance_matches_brute_force():
+    points = np.random.default_rng(0).integers(0, 5, size=(300, 3)).astype(np.float64)
+    np.testing.assert_array_equal(dominated(points, chunk_size=64), _brute_force_dominated(points))
+    # duplicates do not dominate each other
+    assert not dominated(np.array([[1.0, 1.0], [1.0, 1.0]])).any()
+
+
+def test_ranks_peel_fronts():
+    points = np.array([[0.0, 2.0], [2.0, 0.0], [1.0, 3.0], [3.0, 3.0]])
+    np.testing.assert_array_equal(pareto_ranks(points), [0, 0, 1, 2])
+
+
+def test_table_groups_and_missing_values():
+    rows = [
+        {"Strategy": "a", "Treebank": "EWT", "Dev Accuracy (%)": 95.0, "Training Time (s)": 100.0},
+        {"Strategy": "b", "Treebank": "EWT", "Dev Accuracy (%)": 94.0, "Training Time (s)": 50.0},
+        {"Strategy": "c", "Treebank": "EWT", "Dev Accuracy (%)": 93.0, "Training Time (s)": 60.0},
+        {"Strategy": "c", "Treebank": "NSC", "Dev Accuracy (%)": 80.0, "Training Time (s)": 60.0},
+        {"Strategy": "d", "Treebank": "NSC", "Dev Accuracy (%)": None, "Training Time (s)": 10.0},
+    ]
+    df = pareto_table(rows, group_by="Treebank")
+    assert df["Pareto Rank"].tolist() == [0, 0, 1, 0, -1]
+    assert [row["Strategy"] for row in pareto_front(rows, group_by="Treebank")] == ["b", "c", "a"]
+    with pytest.raises(ValueError):
+        pareto_table([{"Strategy": "a"}])
@@ -0,0 +1,41 @@
+import torch
+
+from pos_freezing.freezing import freeze_layers
+from pos_freezing.precision import autocast_for, parameter_bytes, precision_deltas, store_frozen_in_bf16
+
+
+def test_only_frozen_weights_go_to_bf16(model):
+    freeze_layers(model, "first_k", 2)
+    before = parameter_bytes(model)
+    saved = store_frozen_in_bf16(model)
+    assert saved > 0 and parameter_bytes(model) == before - saved
+    for name, param in model.named_parameters():
+        if param.dtype == torch.bfloat16:
+            assert not param.requires_grad and "LayerNorm" not in name and "layer_norm" not in name
+        if param.requires_grad:
+            assert param.dtype == torch.float32
+    assert store_frozen_in_bf16(model) == 0
+
+
+def test_bf16_model_trains_under_autocast(model, tokenized):
+    train_tok, _ = tokenized
+    freeze_layers(model, "first_k", 4)
+    store_frozen_in_bf16(model)
+    model.train()
+    row = train_tok[0]
+    with autocast_for(model):
+        loss = model(input_ids=torch.tensor([row["input_ids"]]), labels=torch.tensor([row["labels"]])).loss
+    loss.backward()
+    grads = [p.grad for p in model.parameters() if p.requires_grad]
+    assert all(g is not None and g.dtype == torch.float32 and torch.isfinite(g).all() for g in grads)
+
+
+def test_precision_deltas():
+    def row(precision, accuracy, train, inference, memory):
+        return {"Strategy": "Freeze All", "Precision": precision, "Dev Accuracy (%)": accuracy,
+                "Train Tokens/s": train, "Inference Tokens/s": inference, "Param Memory (MB)": memory}
+
+    table = precision_deltas([row("fp32", 90.0, 100, 200, 500.0), row("bf16", 89.5, 150, 300, 300.0)])
+    assert table.to_dict("records") == [{"Strategy": "Freeze All", "Accuracy Delta (pts)": -0.5,
+                                         "Train Speed-up (x)": 1.5, "Inference Speed-up (x)": 1.5,
+                                         "Param Memory Saved (MB)": 200.0}]
@@ -0,0 +1,53 @@
+import numpy as np
+import pytest
+
+from pos_freezing.prefetch import PrefetchPipeline, encode_batch
+from pos_freezing.synthetic import write_conllu
+
+
+def _upper(sentences):
+    return [([form.upper() for form in tokens], upos) for tokens, upos in sentences]
+
+
+def _drop_first(sentences):
+    return sentences[1:]
+
+
+@pytest.fixture
+def shards(corpus, tmp_path):
+    sentences, _, _ = corpus
+    paths = []
+    for i in range(3):
+        paths.append(str(tmp_path / f"shard{i}.conllu"))
+        write_conllu(sentences[i * 30:(i + 1) * 30], paths[-1])
+    return paths
+
+
+def test_batches_match_encode_batch(corpus, shards):
+    sentences, tokenizer, tag2id = corpus
+    with PrefetchPipeline(shards, tokenizer, tag2id, batch_size=8, workers=2, shuffle=False) as pipeline:
+        batches = list(pipeline.epoch_batches(0))
+        assert len(batches) == len(pipeline) == 3 * 4
+        stats = pipeline.stats()
+    assert stats["batches"] == len(pipeline)
+
+    expected = [encode_batch(sentences[i * 30:(i + 1) * 30][start:start + 8], tokenizer, tag2id)
+                for i in range(3) for start in range(0, 30, 8)]
+    # workers interleave shards, so match batches by content
+    for batch in batches:
+        match = [e for e in expected if np.array_equal(e["input_ids"], batch["input_ids"].numpy())]
+        assert len(match) == 1
+        np.testing.assert_array_equal(match[0]["labels"], batch["labels"].numpy())
+
+
+def test_count_preserving_transform(corpus, shards):
+    _, tokenizer, tag2id = corpus
+    with PrefetchPipeline(shards, tokenizer, tag2id, batch_size=8, workers=1, transform=_upper) as pipeline:
+        assert sum(1 for _ in pipeline.epoch_batches(0)) == len(pipeline)
+
+
+def test_transform_changing_sentence_count_fails(corpus, shards):
+    _, tokenizer, tag2id = corpus
+    with PrefetchPipeline(shards, tokenizer, tag2id, batch_size=8, workers=1, transform=_drop_first) as pipeline:
+        with pytest.raises(RuntimeError, match="transform returned 29 sentences for 30"):
+            list(pipeline.epoch_batches(0))
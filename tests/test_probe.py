@@ -0,0 +1,30 @@
+import os
+
+import numpy as np
+
+from pos_freezing.probe import hidden_states_key, run_probes, suggest_freeze
+
+
+def test_key_distinguishes_contiguous_slices(model, tokenized):
+    train_tok, _ = tokenized
+    assert hidden_states_key(model, train_tok.select(range(0, 40))) != \
+        hidden_states_key(model, train_tok.select(range(40, 80)))
+
+
+def test_run_probes_keeps_slices_apart(model, corpus, tokenized, tmp_path):
+    _, tokenizer, tag2id = corpus
+    train_tok, dev_tok = tokenized
+    first = run_probes(model, tokenizer, train_tok.select(range(0, 40)), dev_tok, len(tag2id), str(tmp_path))
+    second = run_probes(model, tokenizer, train_tok.select(range(40, 80)), dev_tok, len(tag2id), str(tmp_path))
+    assert len([name for name in os.listdir(tmp_path) if name.startswith("train.")]) == 4
+    assert not np.array_equal(first["train_accuracy"], second["train_accuracy"])
+    # a repeated call reuses the cache and gives the same result
+    again = run_probes(model, tokenizer, train_tok.select(range(0, 40)), dev_tok, len(tag2id), str(tmp_path))
+    np.testing.assert_array_equal(again["dev_accuracy"], first["dev_accuracy"])
+    assert len(first["dev_accuracy"]) == model.config.n_layers + 1
+
+
+def test_suggest_freeze():
+    assert suggest_freeze([0.5, 0.9, 0.95, 0.95]) == ("first_k", 2)
+    assert suggest_freeze([0.95, 0.9, 0.9]) == (None, 0)
+    assert suggest_freeze([0.5, 0.6, 0.95]) == ("all_encoder", 0)
@@ -0,0 +1,60 @@
+import json
+import os
+import warnings
+
+import torch
+
+from pos_freezing.profiling import ModuleProfiler
+from pos_freezing.sweep import train_strategy
+
+TRAINING_ARGS = {"num_train_epochs": 1, "report_to": [], "use_cpu": True, "disable_tqdm": True,
+                 "save_strategy": "no"}
+
+
+def _step(model, tokenized):
+    train_tok, _ = tokenized
+    row = train_tok[0]
+    outputs = model(input_ids=torch.tensor([row["input_ids"]]), labels=torch.tensor([row["labels"]]))
+    outputs.loss.backward()
+
+
+def test_counts_forward_and_backward_per_module(model, tokenized, tmp_path):
+    model.train()
+    with ModuleProfiler(model, track_allocations=True) as profiler:
+        _step(model, tokenized)
+        _step(model, tokenized)
+    rows = {row["Module"]: row for row in profiler.summary()}
+    assert len(rows) == model.config.n_layers + 2
+    for row in rows.values():
+        assert row["Forward Calls"] == 2 and row["Backward Calls"] == 2
+        assert row["Allocations"] > 0
+    # disabled hooks record nothing
+    _step(model, tokenized)
+    assert profiler.summary() == list(rows.values())
+
+    path = profiler.export_chrome_trace(str(tmp_path / "trace.json"))
+    with open(path, encoding="utf-8") as f:
+        events = json.load(f)["traceEvents"]
+    assert sum(event.get("cat") == "backward" for event in events) == 2 * len(rows)
+    profiler.detach()
+
+
+def test_warning_filter_only_while_attached(model):
+    before = list(warnings.filters)
+    profiler = ModuleProfiler(model).attach()
+    assert len(warnings.filters) == len(before) + 1
+    profiler.detach()
+    assert warnings.filters == before
+
+
+def test_profile_dir_adds_trace_to_row(corpus, tokenized, tmp_path):
+    from pos_freezing.synthetic import build_small_model
+
+    _, tokenizer, tag2id = corpus
+    train_tok, dev_tok = tokenized
+    row = train_strategy("Freeze First 2", "first_k", 2, lambda: build_small_model(tag2id, len(tokenizer)),
+                         train_tok, dev_tok, tokenizer, output_dir=str(tmp_path / "runs"),
+                         training_args=TRAINING_ARGS, profile_dir=str(tmp_path / "profiles"))
+    assert os.path.exists(row["Trace"])
+    assert set(row["Backward (ms/step)"]) == {"embeddings", "classifier"} | {f"layer.{i}" for i in range(6)}
+    assert row["Backward (ms/step)"]["classifier"] > 0
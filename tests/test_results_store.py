@@ -0,0 +1,39 @@
+import pytest
+
+from pos_freezing import results_store
+from pos_freezing.packed import write_packed
+from pos_freezing.results_store import dataset_digest
+
+
+def test_digest_distinguishes_subsets(dataset):
+    assert dataset_digest(dataset.select([0, 1])) != dataset_digest(dataset.select([5, 9]))
+    assert dataset_digest(dataset.shuffle(seed=0)) != dataset_digest(dataset)
+
+
+def test_digest_distinguishes_contiguous_slices(dataset):
+    # contiguous selects and unshuffled splits share the parent's Arrow buffers
+    assert dataset_digest(dataset.select(range(0, 10))) != dataset_digest(dataset.select(range(10, 20)))
+    halves = dataset.train_test_split(test_size=0.5, shuffle=False)
+    assert dataset_digest(halves["train"]) != dataset_digest(halves["test"])
+
+
+def test_digest_depends_on_content_only(dataset, tmp_path):
+    subset = dataset.select([5, 3, 100, 7])
+    rebuilt = type(dataset).from_dict(subset.to_dict())
+    assert dataset_digest(subset) == dataset_digest(rebuilt)
+    packed = write_packed(subset, str(tmp_path / "split"))
+    assert dataset_digest(packed) == dataset_digest(subset)
+
+
+def test_run_config_ignores_callback_identity():
+    pytest.importorskip("transformers")
+    data = {"train": "a", "dev": "b"}
+
+    class Callback:
+        pass
+
+    first = results_store.run_config("tb", "m", "Baseline", None, 0, "fp32", data, callbacks=[Callback()],
+                                     output_dir="x")
+    second = results_store.run_config("tb", "m", "Baseline", None, 0, "fp32", data, callbacks=[Callback()],
+                                      output_dir="y")
+    assert results_store.ResultsStore.key(first) == results_store.ResultsStore.key(second)
@@ -0,0 +1,63 @@
+import torch
+
+from pos_freezing.search import ASHA, prefix_depth, prefix_forward, rung_budgets, search, suffix_logits
+
+
+def test_rung_budgets():
+    assert rung_budgets(1, 5, 3) == [1, 3, 5]
+    assert rung_budgets(1, 9, 3) == [1, 3, 9]
+    assert rung_budgets(2, 2, 3) == [2]
+
+
+def test_prefix_depth():
+    assert prefix_depth(6, "first_k", 2, freeze_embeddings=False) is None
+    assert prefix_depth(6, "first_k", 2, freeze_embeddings=True) == 2
+    assert prefix_depth(6, "all_encoder", 0, freeze_embeddings=True) == 6
+    # alternating freezes the even blocks, so only block 0 is a fixed prefix
+    assert prefix_depth(6, "alternating", 0, freeze_embeddings=True) == 1
+    assert prefix_depth(6, "last_k", 2, freeze_embeddings=True) == 0
+
+
+def test_asha_promotes_top_third():
+    scheduler = ASHA([1, 3], eta=3, n_trials=3)
+    for trial_id in range(3):
+        assert scheduler.next_job() == (None, 0)
+        scheduler.report(trial_id, 0, [50.0, 70.0, 60.0][trial_id])
+    assert scheduler.next_job() == (1, 1)
+    assert scheduler.next_job() is None
+
+
+def test_prefix_and_suffix_compose_to_model(model, corpus, tokenized):
+    _, tokenizer, _ = corpus
+    train_tok, _ = tokenized
+    input_ids = torch.nn.utils.rnn.pad_sequence([torch.tensor(ids) for ids in train_tok[:4]["input_ids"]],
+                                                batch_first=True, padding_value=tokenizer.pad_token_id)
+    attention_mask = (input_ids != tokenizer.pad_token_id).long()
+    with torch.inference_mode():
+        expected = model(input_ids=input_ids, attention_mask=attention_mask).logits
+        for depth in (0, 2, model.config.n_layers):
+            hidden = prefix_forward(model, input_ids, attention_mask, depth)
+            logits = suffix_logits(model, hidden, attention_mask, depth)
+            torch.testing.assert_close(logits[attention_mask.bool()], expected[attention_mask.bool()])
+
+
+def test_search_runs_rungs_in_process(corpus, tokenized, tmp_path):
+    from pos_freezing.synthetic import build_small_model
+
+    _, tokenizer, tag2id = corpus
+    train_tok, dev_tok = tokenized
+    space = {
+        "strategy": [("Freeze First 2", "first_k", 2)],
+        "freeze_embeddings": [True],
+        "learning_rate": ("log", 1e-4, 1e-3),
+        "per_device_train_batch_size": [16],
+        "weight_decay": [0.0],
+    }
+    rows = search(lambda: build_small_model(tag2id, len(tokenizer)), train_tok, dev_tok, tokenizer,
+                  output_dir=str(tmp_path), n_trials=3, space=space, min_epochs=1, max_epochs=3, workers=1)
+    assert [row["Trial"] for row in rows] == [0, 1, 2]
+    assert sorted(row["Epochs"] for row in rows) == [1, 1, 3]
+    assert [row["Stopped"] for row in rows] == [row["Epochs"] < 3 for row in rows]
+    assert all(row["Prefix Cache"] == 2 for row in rows)
+    finished = next(row for row in rows if not row["Stopped"])
+    assert len(finished["History"]) == 3
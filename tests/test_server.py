@@ -0,0 +1,106 @@
+import asyncio
+import json
+import time
+
+import pytest
+
+from pos_freezing.server import MicroBatcher, Overloaded, Stopped, TaggingServer
+
+
+def _tag(sentences):
+    if any("bad" in sentence for sentence in sentences):
+        raise ValueError("cannot tag 'bad'")
+    return [["X"] * len(sentence) for sentence in sentences]
+
+
+def _slow_tag(sentences):
+    time.sleep(0.2)
+    return _tag(sentences)
+
+
+def test_concurrent_requests_share_batches():
+    async def main():
+        batcher = MicroBatcher(_tag, max_batch_size=8, max_wait_ms=20)
+        await batcher.start()
+        results = await asyncio.gather(*[batcher.submit([["a", "b"]]) for _ in range(8)])
+        await batcher.stop()
+        return results, batcher.stats()
+
+    results, stats = asyncio.run(main())
+    assert results == [[["X", "X"]]] * 8
+    assert stats["batches"] < 8
+
+
+def test_failing_sentence_does_not_fail_its_batch():
+    async def main():
+        batcher = MicroBatcher(_tag, max_batch_size=8, max_wait_ms=20)
+        await batcher.start()
+        results = await asyncio.gather(batcher.submit([["a"]]), batcher.submit([["bad"]]),
+                                       batcher.submit([["b", "c"]]), return_exceptions=True)
+        await batcher.stop()
+        return results, batcher.stats()
+
+    (first, failed, third), stats = asyncio.run(main())
+    assert first == [["X"]]
+    assert third == [["X", "X"]]
+    assert isinstance(failed, ValueError)
+    assert stats["errors"] == 1
+
+
+def test_stop_fails_queued_sentences():
+    async def main():
+        batcher = MicroBatcher(_slow_tag, max_batch_size=1, max_wait_ms=0, workers=1)
+        await batcher.start()
+        requests = [asyncio.ensure_future(batcher.submit([[str(i)]])) for i in range(4)]
+        await asyncio.sleep(0.05)  # the first batch is in flight, the rest wait
+        await asyncio.wait_for(batcher.stop(), timeout=5)
+        results = await asyncio.wait_for(asyncio.gather(*requests, return_exceptions=True), timeout=5)
+        with pytest.raises(Stopped):
+            await batcher.submit([["late"]])
+        return results, batcher.pending
+
+    results, pending = asyncio.run(main())
+    assert results[0] == [["X"]]
+    assert all(isinstance(result, Stopped) for result in results[1:])
+    assert pending == 0
+
+
+def test_admission_is_bounded():
+    async def main():
+        batcher = MicroBatcher(_slow_tag, max_batch_size=1, max_queue=2)
+        await batcher.start()
+        waiting = asyncio.ensure_future(batcher.submit([["a"], ["b"]]))
+        await asyncio.sleep(0)
+        with pytest.raises(Overloaded):
+            await batcher.submit([["c"]])
+        await waiting
+        await batcher.stop()
+
+    asyncio.run(main())
+
+
+def test_http_round_trip():
+    async def request(port, body):
+        reader, writer = await asyncio.open_connection("127.0.0.1", port)
+        data = json.dumps(body).encode("utf-8")
+        writer.write(b"POST /tag HTTP/1.1\r\nConnection: close\r\n"
+                     + f"Content-Length: {len(data)}\r\n\r\n".encode("latin-1") + data)
+        await writer.drain()
+        head, _, payload = (await reader.read()).partition(b"\r\n\r\n")
+        writer.close()
+        return int(head.split()[1]), json.loads(payload)
+
+    async def main():
+        server = TaggingServer(MicroBatcher(_tag), port=0)
+        await server.start()
+        try:
+            return (await request(server.port, {"tokens": ["a", "b"]}),
+                    await request(server.port, {"sentences": [["bad"]]}),
+                    await request(server.port, {"words": []}))
+        finally:
+            await server.stop()
+
+    ok, failed, malformed = asyncio.run(main())
+    assert ok == (200, {"upos": ["X", "X"]})
+    assert failed[0] == 500
+    assert malformed[0] == 400
@@ -0,0 +1,50 @@
+import numpy as np
+
+from pos_freezing.significance import multi_seed, paired_bootstrap, seed_table, significance_table
+
+TRAINING_ARGS = {"num_train_epochs": 1, "report_to": [], "use_cpu": True, "disable_tqdm": True,
+                 "save_strategy": "no"}
+
+
+def test_identical_systems_are_not_different():
+    correct = np.random.default_rng(0).random((3, 500)) < 0.8
+    offsets = np.arange(0, 501, 10)
+    stats = paired_bootstrap(correct, correct, offsets, n_resamples=500)
+    assert stats == {"diff": 0.0, "low": 0.0, "high": 0.0, "p_value": 1.0}
+
+
+def test_clear_difference_is_significant():
+    rng = np.random.default_rng(0)
+    better, worse = rng.random(2000) < 0.9, rng.random(2000) < 0.7
+    stats = paired_bootstrap(better, worse, n_resamples=2000)
+    assert np.isclose(stats["diff"], 100 * (better.mean() - worse.mean()))
+    assert 0 < stats["low"] < stats["diff"] < stats["high"] and stats["p_value"] < 0.01
+    # sentence resampling with one token per sentence is token resampling
+    same = paired_bootstrap(better, worse, np.arange(2001), n_resamples=2000)
+    assert same == stats
+
+
+def test_tables(corpus, tokenized, tmp_path):
+    from pos_freezing.synthetic import build_small_model
+
+    _, tokenizer, tag2id = corpus
+    train_tok, dev_tok = tokenized
+    strategies = [("Freeze All", "all_encoder", 0), ("Freeze First 2", "first_k", 2)]
+    rows, correctness = multi_seed(strategies, lambda: build_small_model(tag2id, len(tokenizer)), train_tok,
+                                   dev_tok, tokenizer, seeds=(1, 2), workers=1, output_dir=str(tmp_path),
+                                   training_args=TRAINING_ARGS)
+    assert [(row["Strategy"], row["Seed"]) for row in rows] == [(name, seed) for name, _, _ in strategies
+                                                                 for seed in (1, 2)]
+    assert correctness["Freeze All"]["correct"].shape[0] == 2
+    assert correctness["Freeze All"]["offsets"][-1] == correctness["Freeze All"]["correct"].shape[1]
+
+    table = seed_table(rows)
+    assert table["Seeds"].tolist() == [2, 2]
+    raw = [row["Dev Accuracy Raw (%)"] for row in rows if row["Strategy"] == "Freeze All"]
+    assert np.isclose(table.loc[0, "Dev Accuracy Raw (%) mean"], np.mean(raw), atol=1e-3)
+
+    significance = significance_table(correctness, reference="Freeze All", n_resamples=200)
+    assert significance["Strategy"].tolist() == ["Freeze First 2"]
+    row = significance.iloc[0]
+    assert row["CI Low"] <= row["Δ Accuracy (pts)"] <= row["CI High"]
+    assert row["Within Margin"] == (row["CI Low"] > -0.1)
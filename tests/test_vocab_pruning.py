@@ -0,0 +1,41 @@
+import numpy as np
+import pytest
+import torch
+
+from pos_freezing.data import tokenize_split
+from pos_freezing.vocab_pruning import prune_vocabulary, remap_input_ids, used_token_ids
+
+
+def test_pruned_model_matches_on_scanned_corpus(model, corpus):
+    sentences, tokenizer, tag2id = corpus
+    train_tok = tokenize_split(sentences[:40], tokenizer, tag2id)
+    with torch.inference_mode():
+        expected = [model(input_ids=torch.tensor([ids])).logits for ids in train_tok[:5]["input_ids"]]
+
+    model, pruned, old_to_new = prune_vocabulary(model, tokenizer, [train_tok], keep_characters=False)
+    assert len(pruned) == model.config.vocab_size < len(tokenizer)
+    assert model.distilbert.embeddings.word_embeddings.num_embeddings == len(pruned)
+
+    remapped = remap_input_ids(train_tok, old_to_new)
+    retokenized = tokenize_split(sentences[:40], pruned, tag2id)
+    assert remapped["input_ids"] == retokenized["input_ids"]
+    with torch.inference_mode():
+        for ids, logits in zip(remapped[:5]["input_ids"], expected):
+            torch.testing.assert_close(model(input_ids=torch.tensor([ids])).logits, logits)
+
+
+def test_unscanned_ids_are_rejected(corpus):
+    sentences, tokenizer, tag2id = corpus
+    first, rest = tokenize_split(sentences[:10], tokenizer, tag2id), tokenize_split(sentences[10:], tokenizer, tag2id)
+    keep = used_token_ids([first], tokenizer, keep_characters=False)
+    assert set(tokenizer.all_special_ids) <= set(keep.tolist())
+    old_to_new = np.full(len(tokenizer), -1, dtype=np.int64)
+    old_to_new[keep] = np.arange(len(keep))
+    with pytest.raises(ValueError, match="pruned"):
+        remap_input_ids(rest, old_to_new)
+    # the held-out words' pieces survive when listed
+    extra = [word.lower() for words, _ in sentences[10:] for word in words]
+    keep = used_token_ids([first], tokenizer, extra_words=extra, keep_characters=False)
+    old_to_new = np.full(len(tokenizer), -1, dtype=np.int64)
+    old_to_new[keep] = np.arange(len(keep))
+    assert len(remap_input_ids(rest, old_to_new)) == len(rest)